@@ -0,0 +1,89 @@
+"""Teste de carga do app (direto num worker ou através do proxy).
+
+Cada sessão simulada abre o websocket do Streamlit como um navegador faria e
+pede execuções do script com um caso aleatório diferente na URL
+(``?caso=<token>``, ver ``rif_link``), de modo que toda execução reconstrói
+os widgets e reavalia o caso. Mede a latência de cada execução (do pedido até
+``script_finished``) e a vazão total.
+
+Uso (a partir da raiz do repositório):
+    python deploy/carga.py --url http://localhost:8080 --sessoes 32 --execucoes 20
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rif_fuzz import gerar_caso  # noqa: E402
+from rif_link import codificar  # noqa: E402
+
+
+def _cookies(url):
+    """Cookies da página inicial (inclui o cookie de sessão fixa do proxy)."""
+    with urllib.request.urlopen(url) as resposta:
+        return "; ".join(c.split(";")[0] for c in resposta.headers.get_all("Set-Cookie") or [])
+
+
+async def _sessao(url, execucoes, semente, latencias, erros):
+    rng = random.Random(semente)
+    cookies = await asyncio.to_thread(_cookies, url)
+    endereco_ws = url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+    cabecalhos = {"Origin": url}
+    if cookies:
+        cabecalhos["Cookie"] = cookies
+    async with websockets.connect(endereco_ws, subprotocols=["streamlit"],
+                                  additional_headers=cabecalhos, max_size=None) as ws:
+        for _ in range(execucoes):
+            pedido = BackMsg()
+            pedido.rerun_script.query_string = f"caso={codificar(gerar_caso(rng))}"
+            inicio = time.perf_counter()
+            await ws.send(pedido.SerializeToString())
+            while True:
+                mensagem = ForwardMsg()
+                mensagem.ParseFromString(await ws.recv())
+                if mensagem.WhichOneof("type") == "script_finished":
+                    break
+            if mensagem.script_finished != ForwardMsg.FINISHED_SUCCESSFULLY:
+                erros.append(mensagem.script_finished)
+            latencias.append(time.perf_counter() - inicio)
+
+
+async def executar(url, sessoes, execucoes, semente=0):
+    latencias, erros = [], []
+    inicio = time.perf_counter()
+    await asyncio.gather(*(_sessao(url, execucoes, semente + i, latencias, erros)
+                           for i in range(sessoes)))
+    segundos = time.perf_counter() - inicio
+    return latencias, erros, segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do app RIF")
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--sessoes", type=int, default=16)
+    parser.add_argument("--execucoes", type=int, default=10, help="execuções do script por sessão")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    latencias, erros, segundos = asyncio.run(executar(args.url, args.sessoes, args.execucoes, args.semente))
+    latencias.sort()
+    print(f"{len(latencias)} execuções em {segundos:.1f} s ({len(latencias) / segundos:.1f} execuções/s), "
+          f"{len(erros)} com erro")
+    print(f"latência: mediana {1000 * statistics.median(latencias):.0f} ms, "
+          f"p95 {1000 * latencias[int(0.95 * (len(latencias) - 1))]:.0f} ms, "
+          f"máxima {1000 * latencias[-1]:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
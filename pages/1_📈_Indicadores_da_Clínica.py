@@ -0,0 +1,107 @@
+import streamlit as st
+import pandas as pd
+
+from rif_agregados import CATEGORIAS_ALERTA, FAIXAS, Agregados
+from rif_regras import REGRAS
+from rif_telemetria import ler_totais
+
+st.set_page_config(
+    page_title="RIF Protocol Assistant - Indicadores",
+    page_icon="📈",
+    layout="wide"
+)
+
+st.title("📈 Indicadores da Clínica")
+st.markdown("""
+Estatísticas de todos os casos salvos, lidas das tabelas agregadas que são
+atualizadas a cada caso salvo (nenhum caso é reavaliado ao abrir esta página).
+Cada paciente conta uma vez por mês, com o último caso salvo naquele mês.
+""")
+
+dados = Agregados.carregar().como_dicionario()
+
+avaliacoes = pd.DataFrame(list(dados["avaliacoes"].items()), columns=["mes", "avaliacoes"])
+alertas = pd.DataFrame(dados["alertas"], columns=["mes", "categoria", "n"])
+histogramas = pd.DataFrame(dados["histogramas"], columns=["mes", "analito", "faixa", "n"])
+
+if avaliacoes.empty:
+    st.info("Nenhum caso salvo ainda. Salve casos na aba **📝 Protocolo Personalizado**.")
+    st.stop()
+
+# Filtro de período
+anos = sorted(avaliacoes["mes"].str[:4].unique())
+ano = st.sidebar.selectbox("Ano", ["Todos"] + anos)
+if ano != "Todos":
+    avaliacoes = avaliacoes[avaliacoes["mes"].str.startswith(ano)]
+    alertas = alertas[alertas["mes"].str.startswith(ano)]
+    histogramas = histogramas[histogramas["mes"].str.startswith(ano)]
+
+total = int(avaliacoes["avaliacoes"].sum())
+st.metric("Pacientes avaliadas no período (soma mensal)", total)
+
+# ==================== PREVALÊNCIA DOS ALERTAS CRÍTICOS ====================
+st.header("🚨 Prevalência dos Alertas Críticos")
+
+prevalencia = (alertas.groupby("categoria")["n"].sum()
+               .reindex(list(CATEGORIAS_ALERTA), fill_value=0))
+tabela_prevalencia = pd.DataFrame({
+    "Pacientes": prevalencia,
+    "Prevalência (%)": (100 * prevalencia / total).round(1),
+})
+
+col1, col2 = st.columns(2)
+with col1:
+    st.dataframe(tabela_prevalencia)
+with col2:
+    st.bar_chart(tabela_prevalencia["Prevalência (%)"])
+
+# ==================== TENDÊNCIA MENSAL ====================
+st.header("📅 Tendência Mensal")
+
+por_mes = alertas.pivot_table(index="mes", columns="categoria", values="n",
+                              aggfunc="sum", fill_value=0)
+por_mes = por_mes.reindex(index=sorted(avaliacoes["mes"]), columns=list(CATEGORIAS_ALERTA),
+                          fill_value=0)
+avaliacoes_por_mes = avaliacoes.set_index("mes")["avaliacoes"]
+
+st.subheader("Pacientes avaliadas por mês")
+st.bar_chart(avaliacoes_por_mes)
+
+st.subheader("Prevalência mensal dos alertas (%)")
+st.line_chart((100 * por_mes.div(avaliacoes_por_mes, axis=0)).round(1))
+
+# ==================== DISTRIBUIÇÕES LABORATORIAIS ====================
+st.header("📊 Distribuições Laboratoriais")
+
+colunas = st.columns(len(FAIXAS))
+for coluna, (analito, (largura, _)) in zip(colunas, FAIXAS.items()):
+    with coluna:
+        st.subheader(analito)
+        distribuicao = (histogramas[histogramas["analito"] == analito]
+                        .groupby("faixa")["n"].sum().sort_index())
+        if distribuicao.empty:
+            st.markdown("Sem dados no período.")
+            continue
+        distribuicao.index = [f"{f:g}-{f + largura:g}" for f in distribuicao.index]
+        st.bar_chart(distribuicao)
+
+# ==================== DISPARO DAS REGRAS ====================
+st.header("⚙️ Disparo das Regras")
+st.markdown("""
+Quantas vezes cada regra disparou nas avaliações feitas na aba de protocolo
+(inclui casos não salvos). Os contadores são gravados periodicamente, então os
+números mais recentes podem levar alguns minutos para aparecer.
+""")
+
+telemetria = ler_totais()
+if telemetria["avaliacoes"] == 0:
+    st.markdown("Sem dados de telemetria ainda.")
+else:
+    disparos = pd.DataFrame([
+        {"Regra": REGRAS[regra][0] if regra in REGRAS else regra,
+         "Disparos": n,
+         "Avaliações (%)": round(100 * n / telemetria["avaliacoes"], 1)}
+        for regra, n in telemetria["regras"].items()
+    ]).sort_values("Disparos", ascending=False)
+    st.metric("Avaliações registradas", telemetria["avaliacoes"])
+    st.dataframe(disparos, hide_index=True)
@@ -0,0 +1,189 @@
+"""Catálogo estruturado das alterações anatômicas avaliadas na aba 4.
+
+Cada alteração do multiselect é um membro de ``Achado`` (o valor é o rótulo
+exibido na tela) e aponta para um ``RegistroAchado`` com a conduta associada.
+Cada achado também ocupa um bit fixo, de modo que um conjunto de alterações
+vira um inteiro (máscara) e os testes por grupo de achados (regras,
+medicações, cenários, vetor dos similares) viram operações de bits.
+"""
+
+from dataclasses import dataclass
+from enum import Enum
+
+
+class Achado(Enum):
+    NENHUMA = "Nenhuma alteração"
+    POLIPO_ENDOMETRIAL = "Pólipo endometrial"
+    POLIPO_ENDOCERVICAL = "Pólipo endocervical"
+    MIOMA_SUBMUCOSO = "Mioma submucoso (FIGO 0-1-2)"
+    MIOMA_INTRAMURAL_PROXIMO = "Mioma intramural >4cm próximo ao endométrio"
+    MIOMA_INTRAMURAL_DISTANTE = "Mioma intramural >4cm distante do endométrio"
+    SEPTO_UTERINO = "Septo uterino"
+    UTERO_BICORNO = "Útero bicorno"
+    SINEQUIA = "Sinéquia uterina (Asherman)"
+    ADENOMIOSE_FOCAL = "Adenomiose focal"
+    ADENOMIOSE_DIFUSA = "Adenomiose difusa"
+    HIDROSSALPINGE_UNILATERAL = "Hidrossalpinge unilateral"
+    HIDROSSALPINGE_BILATERAL = "Hidrossalpinge bilateral"
+    ENDOMETRIOMA = "Endometrioma ovariano"
+    ENDOMETRIOSE_PROFUNDA = "Endometriose profunda"
+    ESPESSAMENTO_IRREGULAR = "Espessamento endometrial irregular"
+
+
+# Gravidade define como o achado é exibido: "alta" -> st.error, "moderada" -> st.warning
+GRAVIDADE_ALTA = "alta"
+GRAVIDADE_MODERADA = "moderada"
+GRAVIDADE_NENHUMA = "nenhuma"
+
+
+@dataclass(frozen=True)
+class RegistroAchado:
+    cirurgia: str | None = None
+    tratamento_clinico: str | None = None
+    espera_dias: tuple[int, int] = (0, 0)  # (mínimo, máximo) antes da transferência
+    gravidade: str = GRAVIDADE_NENHUMA
+    alerta_critico: str | None = None
+    mensagem: str | None = None
+    detalhes: str | None = None
+
+
+_HIDROSSALPINGE = RegistroAchado(
+    cirurgia="Salpingectomia laparoscópica",
+    espera_dias=(30, 60),
+    gravidade=GRAVIDADE_ALTA,
+    alerta_critico="HIDROSSALPINGE - Salpingectomia OBRIGATÓRIA antes do ciclo",
+    mensagem="🔴 **HIDROSSALPINGE** - Salpingectomia obrigatória",
+    detalhes="""
+    **CRÍTICO**: Reduz taxa de implantação em 50%!
+
+    - Salpingectomia laparoscópica bilateral se bilateral
+    - Fluido tóxico para embriões
+    - OBRIGATÓRIO remover antes de FIV
+    - Aguardar 1-2 meses após cirurgia
+
+    **Ref**: ASRM - Salpingectomia aumenta taxa de gestação em 2x
+    """,
+)
+
+_ADENOMIOSE = RegistroAchado(
+    tratamento_clinico="Análogo GnRH pré-tratamento",
+    espera_dias=(60, 90),
+    gravidade=GRAVIDADE_MODERADA,
+    mensagem="⚠️ **Adenomiose** - Considerar pré-tratamento",
+    detalhes="""
+    **Protocolo para adenomiose:**
+    - Análogo GnRH (Leuprolide) por 2-3 meses antes da transferência
+    - OU Dienogest 2mg/dia por 2-3 meses
+    - Melhora receptividade endometrial
+    - Reduz inflamação local
+
+    **Ref**: Cochrane Review 2024
+    """,
+)
+
+_ENDOMETRIOSE = RegistroAchado(
+    gravidade=GRAVIDADE_MODERADA,
+    mensagem="⚠️ **Endometriose** - Avaliar necessidade de tratamento",
+    detalhes="""
+    **Conduta:**
+    - Endometrioma <3cm: não drenar (piora reserva ovariana)
+    - Endometrioma >4cm com sintomas: considerar cistectomia
+    - Endometriose profunda: tratar cirurgicamente se sintomática
+    - Considerar GnRH análogo 2-3 meses pré-FIV
+    """,
+)
+
+_SEM_CONDUTA = RegistroAchado()
+
+CATALOGO = {
+    Achado.NENHUMA: _SEM_CONDUTA,
+    Achado.POLIPO_ENDOMETRIAL: RegistroAchado(
+        cirurgia="Polipectomia histeroscópica",
+        espera_dias=(28, 56),
+        gravidade=GRAVIDADE_ALTA,
+        mensagem="🔴 **Pólipo endometrial** - Polipectomia mandatória",
+        detalhes="""
+        - Remover antes do próximo ciclo
+        - Aguardar 1-2 ciclos menstruais após procedimento
+        - Taxa de gestação aumenta 10-15% após remoção
+        """,
+    ),
+    Achado.POLIPO_ENDOCERVICAL: _SEM_CONDUTA,
+    Achado.MIOMA_SUBMUCOSO: RegistroAchado(
+        cirurgia="Miomectomia histeroscópica",
+        espera_dias=(56, 84),
+        gravidade=GRAVIDADE_ALTA,
+        mensagem="🔴 **Mioma submucoso** - Miomectomia mandatória",
+        detalhes="""
+        - FIGO 0-1-2: Impacto significativo na implantação
+        - Remoção histeroscópica
+        - Aguardar 2-3 ciclos após procedimento
+        """,
+    ),
+    Achado.MIOMA_INTRAMURAL_PROXIMO: RegistroAchado(
+        cirurgia="Miomectomia laparoscópica/aberta",
+        espera_dias=(90, 180),
+        gravidade=GRAVIDADE_MODERADA,
+        mensagem="⚠️ **Mioma intramural grande** - Considerar miomectomia",
+        detalhes="""
+        - Se >4cm e distorce cavidade: remover
+        - Aguardar 3-6 meses após cirurgia
+        - Avaliar risco cirúrgico vs. benefício
+        """,
+    ),
+    Achado.MIOMA_INTRAMURAL_DISTANTE: _SEM_CONDUTA,
+    Achado.SEPTO_UTERINO: RegistroAchado(
+        cirurgia="Septoplastia histeroscópica",
+        espera_dias=(56, 56),
+        gravidade=GRAVIDADE_ALTA,
+        mensagem="🔴 **Septo uterino** - Septoplastia recomendada",
+        detalhes="""
+        - Septoplastia histeroscópica
+        - Melhora taxa de implantação
+        - Aguardar 2 ciclos após procedimento
+        """,
+    ),
+    Achado.UTERO_BICORNO: _SEM_CONDUTA,
+    Achado.SINEQUIA: RegistroAchado(
+        cirurgia="Lise de sinéquias histeroscópica",
+        espera_dias=(60, 90),
+        gravidade=GRAVIDADE_ALTA,
+        mensagem="🔴 **Síndrome de Asherman** - Lise de sinéquias",
+        detalhes="""
+        - Histeroscopia operatória
+        - Estradiol alta dose após (2-3 meses)
+        - Pode necessitar múltiplos procedimentos
+        - Considerar balão intrauterino
+        """,
+    ),
+    Achado.ADENOMIOSE_FOCAL: _ADENOMIOSE,
+    Achado.ADENOMIOSE_DIFUSA: _ADENOMIOSE,
+    Achado.HIDROSSALPINGE_UNILATERAL: _HIDROSSALPINGE,
+    Achado.HIDROSSALPINGE_BILATERAL: _HIDROSSALPINGE,
+    Achado.ENDOMETRIOMA: _ENDOMETRIOSE,
+    Achado.ENDOMETRIOSE_PROFUNDA: _ENDOMETRIOSE,
+    Achado.ESPESSAMENTO_IRREGULAR: _SEM_CONDUTA,
+}
+
+# Opções do multiselect, na ordem de exibição
+OPCOES = [achado.value for achado in Achado]
+
+# Cada achado ocupa um bit fixo (ordem de declaração do enum)
+BIT = {achado: 1 << i for i, achado in enumerate(Achado)}
+
+
+MASCARA_ADENOMIOSE = BIT[Achado.ADENOMIOSE_FOCAL] | BIT[Achado.ADENOMIOSE_DIFUSA]
+MASCARA_HIDROSSALPINGE = BIT[Achado.HIDROSSALPINGE_UNILATERAL] | BIT[Achado.HIDROSSALPINGE_BILATERAL]
+
+
+def achados_de(alteracoes):
+    """Converte os rótulos do multiselect em membros de ``Achado``."""
+    return [Achado(alt) for alt in alteracoes]
+
+
+def mascara(alteracoes):
+    """Máscara de bits das alterações selecionadas (rótulos ou membros de ``Achado``)."""
+    total = 0
+    for alt in alteracoes:
+        total |= BIT[alt if isinstance(alt, Achado) else Achado(alt)]
+    return total
@@ -0,0 +1,142 @@
+"""Tabelas agregadas da clínica, mantidas de forma incremental.
+
+A cada caso salvo, ``Agregados.atualizar`` soma a avaliação a contadores por
+mês: número de pacientes avaliadas, alertas críticos por categoria e
+histogramas de TSH, vitamina D e HOMA-IR em faixas fixas (só com os exames
+informados no caso, nunca os padrões do formulário). Cada paciente conta
+uma vez por mês, com o último caso salvo no mês: a contribuição anterior dela
+(guardada em ``ultimos``) é subtraída antes de somar a nova, de modo que
+salvar o mesmo caso de novo não infla a prevalência. A página de indicadores
+só lê essas tabelas e faz os agrupamentos em pandas, sem reavaliar casos.
+"""
+
+import json
+import math
+import threading
+from collections import Counter
+from pathlib import Path
+
+from rif_casos import DIRETORIO_INDICES, gravar_json
+from rif_fhir import campos_informados
+from rif_regras import calcular_homa_ir
+
+CAMINHO_AGREGADOS = DIRETORIO_INDICES / "agregados.json"
+
+# Categoria -> trecho do texto do alerta crítico
+CATEGORIAS_ALERTA = {
+    "SAF": "SÍNDROME ANTIFOSFOLÍPIDE",
+    "Trombofilia": "TROMBOFILIA",
+    "Endometrite crônica": "ENDOMETRITE CRÔNICA",
+    "Hidrossalpinge": "HIDROSSALPINGE",
+    "Tireoide": "Disfunção tireoidiana",
+    "Resistência insulínica": "Resistência insulínica",
+}
+
+# Analito -> (largura da faixa, limite superior da última faixa)
+FAIXAS = {
+    "TSH": (0.5, 10.0),
+    "Vitamina D": (5.0, 100.0),
+    "HOMA-IR": (0.5, 15.0),
+}
+
+
+def _mes(dados_caso):
+    return dados_caso["data_avaliacao"][:7]
+
+
+def categorias_do_caso(alertas_criticos):
+    return [categoria for categoria, trecho in CATEGORIAS_ALERTA.items()
+            if any(trecho in alerta for alerta in alertas_criticos)]
+
+
+def valores_laboratoriais(dados_caso):
+    """Valores do caso para os histogramas, só dos exames informados."""
+    entradas = dados_caso["entradas"]
+    informados = set(campos_informados(dados_caso))
+    valores = {}
+    if "tsh" in informados:
+        valores["TSH"] = entradas["tsh"]
+    if "vitamina_d" in informados:
+        valores["Vitamina D"] = entradas["vitamina_d"]
+    if {"glicemia", "insulina"} <= informados:
+        homa_ir = calcular_homa_ir(entradas)
+        if homa_ir is not None:
+            valores["HOMA-IR"] = homa_ir
+    return valores
+
+
+def faixa(analito, valor):
+    """Limite inferior da faixa do histograma (valores acima do teto vão para a última)."""
+    largura, teto = FAIXAS[analito]
+    return min(math.floor(valor / largura) * largura, teto - largura)
+
+
+def _somar(contador, chave, n):
+    contador[chave] += n
+    if contador[chave] <= 0:
+        del contador[chave]
+
+
+class Agregados:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.avaliacoes = Counter()   # mes -> pacientes avaliadas
+        self.alertas = Counter()      # (mes, categoria) -> n
+        self.histogramas = Counter()  # (mes, analito, faixa) -> n
+        self.ultimos = {}             # (mes, id_paciente) -> (categorias, [(analito, faixa)])
+
+    def atualizar(self, dados_caso):
+        mes = _mes(dados_caso)
+        chave = (mes, dados_caso["id_paciente"])
+        categorias = categorias_do_caso(dados_caso["alertas_criticos"])
+        faixas = [(analito, faixa(analito, valor))
+                  for analito, valor in valores_laboratoriais(dados_caso).items()]
+        with self._lock:
+            anterior = self.ultimos.get(chave)
+            if anterior is None:
+                self.avaliacoes[mes] += 1
+            else:
+                for categoria in anterior[0]:
+                    _somar(self.alertas, (mes, categoria), -1)
+                for analito, inicio in anterior[1]:
+                    _somar(self.histogramas, (mes, analito, inicio), -1)
+            for categoria in categorias:
+                self.alertas[(mes, categoria)] += 1
+            for analito, inicio in faixas:
+                self.histogramas[(mes, analito, inicio)] += 1
+            self.ultimos[chave] = (categorias, faixas)
+
+    def como_dicionario(self):
+        with self._lock:
+            return {
+                "avaliacoes": dict(self.avaliacoes),
+                "alertas": [[m, c, n] for (m, c), n in self.alertas.items()],
+                "histogramas": [[m, a, f, n] for (m, a, f), n in self.histogramas.items()],
+                "ultimos": [[m, pid, categorias, [list(fx) for fx in faixas]]
+                            for (m, pid), (categorias, faixas) in self.ultimos.items()],
+            }
+
+    def salvar(self, caminho=CAMINHO_AGREGADOS):
+        gravar_json(caminho, self.como_dicionario())
+
+    @classmethod
+    def carregar(cls, caminho=CAMINHO_AGREGADOS):
+        agregados = cls()
+        if not Path(caminho).exists():
+            return agregados
+        with open(caminho, encoding="utf-8") as f:
+            dados = json.load(f)
+        agregados.avaliacoes.update(dados["avaliacoes"])
+        agregados.alertas.update({(m, c): n for m, c, n in dados["alertas"]})
+        agregados.histogramas.update({(m, a, f): n for m, a, f, n in dados["histogramas"]})
+        agregados.ultimos = {(m, pid): (categorias, [tuple(fx) for fx in faixas])
+                             for m, pid, categorias, faixas in dados.get("ultimos", [])}
+        return agregados
+
+    @classmethod
+    def reconstruir(cls, casos):
+        """Recalcula as tabelas a partir de todos os casos (ex.: ``iterar_casos()``)."""
+        agregados = cls()
+        for caso in casos:
+            agregados.atualizar(caso)
+        return agregados
@@ -2,6 +2,61 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import json
+import time
+
+from rif_achados import (
+    CATALOGO,
+    GRAVIDADE_ALTA,
+    GRAVIDADE_MODERADA,
+    OPCOES as OPCOES_ACHADOS,
+    achados_de,
+)
+from rif_agregados import Agregados
+from rif_auditoria import RegistroAuditoria, evento_avaliacao
+from rif_busca import FONTE_APP, IndiceBusca, trecho
+from rif_casos import bloqueio, id_paciente, salvar_caso, versao_arquivo
+from rif_campos import CAMPOS
+from rif_cenarios import CENARIOS, avaliar_cenarios, diferencas
+from rif_cronograma import intervencoes_do_caso, planejar
+from rif_exames import (
+    ANALITOS,
+    ANTICORPOS_SAF,
+    LIMIAR_SAF,
+    SEMANAS_PERSISTENCIA,
+    SeriesExames,
+    caminho_exames,
+    carregar as carregar_exames,
+    formatar_data,
+    registrar_no_historico,
+)
+from rif_exportacoes import FALHOU, FilaExportacoes
+from rif_fhir import OBSERVACOES_NUMERICAS
+from rif_link import codificar as codificar_link, decodificar as decodificar_link
+from rif_medicacoes import EVITAR, Fase, Suspensao, montar_regime
+from rif_pendencias import (
+    CAMINHO_INDICE as CAMINHO_PENDENCIAS,
+    INVESTIGACOES,
+    IndicePendencias,
+    investigacoes_pendentes,
+)
+from rif_prognostico import avaliar_prognostico
+from rif_regras import avaliar_caso, explicar
+from rif_similares import CAMINHO_MATRIZ, CAMINHO_RESUMOS, IndiceSimilares, vetor_caso
+from rif_telemetria import TelemetriaRegras
+from rif_transferencias import (
+    DESFECHOS,
+    DIAS_EMBRIAO,
+    GRAUS,
+    PGT,
+    PROTOCOLOS,
+    carregar as carregar_transferencias,
+    de_dataframe,
+    para_dataframe,
+    resumo as resumir_transferencias,
+    salvar as salvar_transferencias,
+    vazio as transferencias_vazias,
+)
+from rif_visitas import HistoricoVisitas, caminho_visitas, diferencas_visitas, registrar_visita
 
 # Configuração da página
 st.set_page_config(
@@ -10,6 +65,94 @@ st.set_page_config(
     layout="wide"
 )
 
+
+# Índices compartilhados entre todas as sessões do servidor. Com vários
+# processos (deploy/), cada um relê o índice quando outro o regrava: a versão
+# (mtime dos arquivos) faz parte da chave do cache.
+@st.cache_resource(max_entries=1)
+def carregar_indice_pendencias(versao):
+    with bloqueio("indices"):
+        return IndicePendencias.carregar()
+
+
+@st.cache_resource(max_entries=1)
+def carregar_indice_similares(versao):
+    with bloqueio("indices"):
+        return IndiceSimilares.carregar()
+
+
+def atualizar_indices(dados_caso):
+    """Relê, atualiza e grava os índices da clínica sob a trava entre processos."""
+    with bloqueio("indices"):
+        pendencias = IndicePendencias.carregar()
+        pendencias.atualizar(dados_caso["id_paciente"], dados_caso["nome"], dados_caso["entradas"])
+        pendencias.salvar()
+        similares = IndiceSimilares.carregar()
+        similares.adicionar_caso(dados_caso)
+        similares.salvar()
+        agregados = Agregados.carregar()
+        agregados.atualizar(dados_caso)
+        agregados.salvar()
+
+
+def retirar_da_worklist(id_paciente):
+    """Alta ou desistência: tira a paciente da worklist até o próximo caso salvo."""
+    with bloqueio("indices"):
+        pendencias = IndicePendencias.carregar()
+        pendencias.remover(id_paciente)
+        pendencias.salvar()
+
+
+@st.cache_resource(max_entries=64)
+def carregar_visitas(id_paciente, versao):
+    return HistoricoVisitas.carregar(id_paciente)
+
+
+# Índice de busca nas diretrizes: montado uma vez (refeito se o código do app mudar)
+@st.cache_resource(max_entries=1)
+def carregar_busca(versao):
+    return IndiceBusca.do_app()
+
+
+@st.cache_resource
+def carregar_auditoria():
+    return RegistroAuditoria()
+
+
+def registrar_auditoria(evento):
+    """Enfileira o evento no registro de auditoria e avisa se as gravações estão falhando."""
+    auditoria = carregar_auditoria()
+    auditoria.registrar(evento)
+    if auditoria.falha:
+        st.error(f"❌ O registro de auditoria não está conseguindo gravar em disco: {auditoria.falha}. "
+                 "Os eventos ficam na fila e a gravação é tentada de novo; avise o suporte.")
+
+
+@st.cache_resource
+def carregar_telemetria():
+    return TelemetriaRegras()
+
+
+@st.cache_resource
+def carregar_exportacoes():
+    return FilaExportacoes()
+
+
+# Link de caso (?caso=<token>): preenche todos os widgets de uma vez, antes de
+# qualquer um ser criado, e abre direto a aba do protocolo
+ABA_PROTOCOLO = "📝 Protocolo Personalizado"
+token_caso = st.query_params.get("caso")
+if token_caso and st.session_state.get("link_aplicado") != token_caso:
+    try:
+        st.session_state.update(decodificar_link(token_caso))
+        # Valores vindos do link não são exames informados nesta avaliação
+        st.session_state.pop("exames_informados", None)
+        st.session_state.pop("exames_execucao_anterior", None)
+    except ValueError as erro:
+        st.warning(f"⚠️ Link de caso inválido ou de outra versão do aplicativo ({erro}).")
+    st.session_state["link_aplicado"] = token_caso
+
+
 # Título e introdução
 st.title("🔬 Protocolo de Conduta para Falhas Repetidas de Implantação (RIF)")
 st.markdown("""
@@ -21,14 +164,19 @@ ou transferência de ≥10 embriões em múltiplos ciclos.
 
 # Sidebar para dados do paciente
 st.sidebar.header("📋 Dados da Paciente")
-nome_paciente = st.sidebar.text_input("Nome da paciente", "")
-idade = st.sidebar.number_input("Idade", 18, 50, 35)
-num_falhas = st.sidebar.number_input("Número de falhas", 3, 20, 3)
-imc = st.sidebar.number_input("IMC", 15.0, 50.0, 23.0)
+nome_paciente = st.sidebar.text_input("Nome da paciente", "", key="nome_paciente")
+prontuario_paciente = st.sidebar.text_input("Nº do prontuário", "", key="prontuario_paciente",
+                                            help="Identifica a paciente no histórico, nos exames e na auditoria")
+# Sem prontuário não há histórico a carregar nem caso a salvar
+id_paciente_atual = id_paciente(prontuario_paciente)
+idade = st.sidebar.number_input("Idade", 18, 50, 35, key="idade")
+num_falhas = st.sidebar.number_input("Número de falhas", 3, 20, 3, key="num_falhas")
+imc = st.sidebar.number_input("IMC", 15.0, 50.0, 23.0, key="imc")
 tipo_embrioes = st.sidebar.selectbox("Tipo de embriões transferidos", 
-                                      ["Blastocistos", "D3", "Ambos"])
+                                      ["Blastocistos", "D3", "Ambos"], key="tipo_embrioes")
 qualidade_embrionaria = st.sidebar.selectbox("Qualidade embrionária", 
-                                              ["Excelente (AA/AB)", "Boa (BA/BB)", "Regular"])
+                                              ["Excelente (AA/AB)", "Boa (BA/BB)", "Regular"],
+                                             key="qualidade_embrionaria")
 
 # Aviso de IMC
 if imc < 18.5:
@@ -36,6 +184,98 @@ if imc < 18.5:
 elif imc > 30:
     st.sidebar.warning("⚠️ IMC elevado. Redução de peso recomendada antes do ciclo.")
 
+# Worklist da clínica: investigações pendentes de todas as pacientes ativas
+indice_pendencias = carregar_indice_pendencias(versao_arquivo(CAMINHO_PENDENCIAS))
+with st.sidebar.expander("🗂️ Worklist da clínica"):
+    contagens_pendencias = indice_pendencias.contagens()
+    investigacao_worklist = st.selectbox(
+        "Investigação pendente", list(INVESTIGACOES),
+        format_func=lambda chave: f"{INVESTIGACOES[chave]} ({contagens_pendencias[chave]})")
+    # Ordenada pela pontuação de prognóstico (mais reservado primeiro)
+    pacientes_worklist = indice_pendencias.priorizar(investigacao_worklist)
+    if pacientes_worklist:
+        for _, nome, pontuacao in pacientes_worklist:
+            st.markdown(f"- {nome}" + (f" — {pontuacao:.0f} pts" if pontuacao is not None else ""))
+    else:
+        st.markdown("✅ Nenhuma paciente pendente")
+    if id_paciente_atual in indice_pendencias.por_paciente:
+        if st.button("🏁 Alta / desistência da paciente atual",
+                     help="Retira a paciente da worklist; um novo caso salvo a inclui de novo"):
+            retirar_da_worklist(id_paciente_atual)
+            st.rerun()
+
+# Busca nas diretrizes e protocolos de todas as abas
+consulta_busca = st.sidebar.text_input("🔎 Buscar nas diretrizes", key="busca_diretrizes",
+                                       placeholder="ex.: hidroxicloroquina, probióticos")
+if consulta_busca:
+    indice_busca = carregar_busca(versao_arquivo(FONTE_APP))
+    inicio_busca = time.perf_counter()
+    resultados_busca = indice_busca.buscar(consulta_busca)
+    st.sidebar.caption(f"{len(resultados_busca)} trechos em {1000 * (time.perf_counter() - inicio_busca):.2f} ms "
+                       f"({len(indice_busca)} blocos indexados)")
+    for bloco, encontrados in resultados_busca:
+        st.sidebar.markdown(f"**{bloco.aba}** › {bloco.secao or bloco.aba}\n\n{trecho(bloco, encontrados)}")
+
+# Histórico de transferências da paciente (armazenado em colunas)
+with st.expander("🗂️ Histórico de transferências embrionárias"):
+    historico_editado = st.data_editor(
+        para_dataframe(carregar_transferencias(id_paciente_atual) if id_paciente_atual
+                       else transferencias_vazias()),
+        key=f"transferencias_{id_paciente_atual}",
+        num_rows="dynamic",
+        hide_index=True,
+        column_config={
+            "Data": st.column_config.DateColumn("Data", required=True),
+            "Dia do embrião": st.column_config.SelectboxColumn(options=DIAS_EMBRIAO),
+            "Nº de embriões": st.column_config.NumberColumn(min_value=1, max_value=3, default=1,
+                                                            required=True),
+            "Grau": st.column_config.SelectboxColumn(options=GRAUS),
+            "PGT": st.column_config.SelectboxColumn(options=PGT, default="Não testado"),
+            "Endométrio (mm)": st.column_config.NumberColumn(min_value=0.0, max_value=20.0, step=0.5,
+                                                             required=True),
+            "Protocolo": st.column_config.SelectboxColumn(options=PROTOCOLOS),
+            "Desfecho": st.column_config.SelectboxColumn(options=DESFECHOS),
+        },
+    )
+    transferencias = de_dataframe(historico_editado)
+    resumo_transferencias = resumir_transferencias(transferencias)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Transferências", resumo_transferencias["transferencias"])
+    col2.metric("Embriões transferidos", resumo_transferencias["embrioes_transferidos"])
+    col3.metric("Falhas", resumo_transferencias["falhas"])
+    col4.metric("Falhas com euploides", resumo_transferencias["falhas_euploides"])
+    
+    if resumo_transferencias["criterio_rif"]:
+        st.error("🔴 **Critério de RIF atendido pelo histórico registrado**")
+    elif resumo_transferencias["transferencias"] > 0:
+        st.info("Histórico registrado ainda não atende à definição de RIF "
+                "(≥3 falhas com embriões de boa qualidade ou ≥10 embriões)")
+    if resumo_transferencias["falhas"] != num_falhas and resumo_transferencias["transferencias"] > 0:
+        st.warning(f"⚠️ Histórico registra {resumo_transferencias['falhas']} falhas; "
+                   f"barra lateral informa {num_falhas}")
+
+# Histórico de exames laboratoriais da paciente (séries por analito, ordenadas por data)
+with st.expander("🧪 Histórico de exames laboratoriais"):
+    exames_salvos = carregar_exames(id_paciente_atual) if id_paciente_atual else SeriesExames()
+    exames_editados = st.data_editor(
+        exames_salvos.para_dataframe(),
+        # a versão do arquivo na chave descarta as edições já gravadas
+        key=f"exames_{id_paciente_atual}_{versao_arquivo(caminho_exames(id_paciente_atual))}",
+        num_rows="dynamic",
+        hide_index=True,
+        column_config={
+            "Data": st.column_config.DateColumn("Data", required=True),
+            "Exame": st.column_config.SelectboxColumn(options=[rotulo for rotulo, _ in ANALITOS.values()],
+                                                      required=True),
+            "Valor": st.column_config.NumberColumn(min_value=0.0, required=True),
+        },
+    )
+    exames = SeriesExames.de_dataframe(exames_editados, exames_salvos.marcos)
+    st.caption(f"{len(exames)} medidas. Ao salvar o caso, os exames informados nesta avaliação "
+               "(valores digitados ou alterados nas abas) entram no histórico com a data da avaliação; "
+               "um resultado repetido igual ao anterior deve ser lançado aqui.")
+
 # Tabs principais
 tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
     "🧬 Avaliação Genética", 
@@ -43,12 +283,8 @@ tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
     "🔥 Fatores Inflamatórios/Imunológicos",
     "🏥 Fatores Anatômicos",
     "📊 Análise Laboratorial",
-    "📝 Protocolo Personalizado"
-])
-
-# Inicializar variáveis de recomendações
-recomendacoes = []
-alertas_criticos = []
+    ABA_PROTOCOLO
+], default=ABA_PROTOCOLO if token_caso else None)
 
 # ==================== TAB 1: AVALIAÇÃO GENÉTICA ====================
 with tab1:
@@ -59,17 +295,17 @@ with tab1:
     with col1:
         st.subheader("Testes Recomendados")
         
-        cariótipo_casal = st.checkbox("Cariótipo do casal realizado")
+        cariótipo_casal = st.checkbox("Cariótipo do casal realizado", key="cariotipo_casal")
         cariótipo_resultado = st.selectbox("Resultado do cariótipo", 
-                                           ["Não aplicável", "Normal", "Alterado"])
+                                           ["Não aplicável", "Normal", "Alterado"], key="cariotipo_resultado")
         
-        pgt_a = st.checkbox("PGT-A (Teste Genético Pré-implantacional)")
+        pgt_a = st.checkbox("PGT-A (Teste Genético Pré-implantacional)", key="pgt_a")
         pgt_a_resultado = st.selectbox("Resultado PGT-A", 
                                        ["Não aplicável", "Todos aneuploides", 
-                                        "Maioria aneuploides", "Maioria euploides"])
+                                        "Maioria aneuploides", "Maioria euploides"], key="pgt_a_resultado")
         
-        trombofilia = st.checkbox("Painel de Trombofilia Hereditária")
-        hla = st.checkbox("Tipagem HLA (DQ-alpha)")
+        trombofilia = st.checkbox("Painel de Trombofilia Hereditária", key="trombofilia")
+        hla = st.checkbox("Tipagem HLA (DQ-alpha)", key="hla")
         
         st.info("""
         **Indicações PGT-A em RIF:**
@@ -81,24 +317,22 @@ with tab1:
         **Ref**: ESHRE PGT Consortium 2023
         """)
         
-        if idade >= 37 and not pgt_a:
-            recomendacoes.append("PGT-A: Fortemente recomendado devido à idade materna ≥37 anos")
-        
-        if pgt_a_resultado in ["Todos aneuploides", "Maioria aneuploides"]:
-            alertas_criticos.append("Alta taxa de aneuploidias - investigar causas e considerar uso de DHEA/CoQ10")
+        if resumo_transferencias["indicacao_pgt_a"] and not pgt_a:
+            st.warning(f"⚠️ **{resumo_transferencias['falhas_nao_testados']} falhas com embriões "
+                       f"não testados no histórico** - PGT-A indicado")
     
     with col2:
         st.subheader("Mutações de Trombofilia")
         
         fator_v = st.selectbox("Fator V Leiden", 
-                               ["Não testado", "Normal", "Heterozigoto", "Homozigoto"])
+                               ["Não testado", "Normal", "Heterozigoto", "Homozigoto"], key="fator_v")
         protrombina = st.selectbox("Mutação Protrombina G20210A", 
-                                   ["Não testado", "Normal", "Heterozigoto", "Homozigoto"])
+                                   ["Não testado", "Normal", "Heterozigoto", "Homozigoto"], key="protrombina")
         mthfr = st.selectbox("MTHFR C677T", 
-                            ["Não testado", "Normal", "Heterozigoto", "Homozigoto"])
+                            ["Não testado", "Normal", "Heterozigoto", "Homozigoto"], key="mthfr")
         
         pai_ii = st.selectbox("PAI-1 4G/5G", 
-                              ["Não testado", "5G/5G", "4G/5G", "4G/4G"])
+                              ["Não testado", "5G/5G", "4G/5G", "4G/4G"], key="pai_ii")
         
         # Avaliar trombofilia
         trombofilia_presente = False
@@ -128,15 +362,14 @@ with tab1:
             
             **Ref**: ACOG Practice Bulletin 2023
             """)
-            recomendacoes.append("Anticoagulação profilática: Enoxaparina 40mg/dia + AAS 100mg/dia")
-            alertas_criticos.append("TROMBOFILIA DETECTADA - Anticoagulação obrigatória")
         
         st.subheader("Compatibilidade HLA")
+        hla_compartilhado = 0
         if hla:
-            hla_compartilhado = st.number_input("Alelos HLA-DQ compartilhados", 0, 4, 0)
+            hla_compartilhado = st.number_input("Alelos HLA-DQ compartilhados", 0, 4, 0,
+                                                key="hla_compartilhado")
             if hla_compartilhado >= 2:
                 st.warning("⚠️ Alta compatibilidade HLA pode afetar tolerância imunológica")
-                recomendacoes.append("Considerar imunoterapia (controverso - discutir com especialista)")
 
 # ==================== TAB 2: FATORES INFECCIOSOS ====================
 with tab2:
@@ -157,10 +390,11 @@ with tab2:
         
         histeroscopia = st.selectbox("Histeroscopia diagnóstica", 
                                      ["Não realizada", "Normal", "Micropolipos", 
-                                      "Hiperemia focal", "Edema estromal"])
+                                      "Hiperemia focal", "Edema estromal"], key="histeroscopia")
         biopsia_endometrial = st.selectbox("Biópsia endometrial com CD138", 
                                            ["Não realizada", "Negativa (<5 células)", 
-                                            "Positiva (5-10 células)", "Positiva (>10 células)"])
+                                            "Positiva (5-10 células)", "Positiva (>10 células)"],
+                                           key="biopsia_endometrial")
         
         endometrite_detectada = False
         if biopsia_endometrial in ["Positiva (5-10 células)", "Positiva (>10 células)"]:
@@ -191,22 +425,19 @@ with tab2:
             **Ref**: Kitaya et al., Reproductive Medicine 2024
             """)
             
-            alertas_criticos.append("ENDOMETRITE CRÔNICA - Tratamento obrigatório antes de novo ciclo")
-            recomendacoes.append("Antibioticoterapia completa + repetir biópsia antes de transferência")
         
         elif histeroscopia in ["Micropolipos", "Hiperemia focal", "Edema estromal"]:
             st.warning("⚠️ Achados sugestivos de endometrite - Biópsia com CD138 é mandatória")
-            recomendacoes.append("Realizar biópsia endometrial com imuno-histoquímica CD138")
     
     with col2:
         st.subheader("Infecções Genitais")
         
         ureaplasma = st.selectbox("Ureaplasma urealyticum", 
-                                  ["Não testado", "Negativo", "Positivo"])
+                                  ["Não testado", "Negativo", "Positivo"], key="ureaplasma")
         mycoplasma = st.selectbox("Mycoplasma hominis", 
-                                  ["Não testado", "Negativo", "Positivo"])
+                                  ["Não testado", "Negativo", "Positivo"], key="mycoplasma")
         chlamydia = st.selectbox("Chlamydia trachomatis (PCR)", 
-                                 ["Não testado", "Negativo", "Positivo"])
+                                 ["Não testado", "Negativo", "Positivo"], key="chlamydia")
         
         tratamento_necessario = []
         
@@ -236,24 +467,23 @@ with tab2:
             
             **Abstinência sexual** ou uso de preservativo durante tratamento
             """)
-            alertas_criticos.append(f"Infecção detectada: {', '.join(tratamento_necessario)} - Tratar casal")
-            recomendacoes.append("Tratamento antimicrobiano completo + teste de cura")
         
         st.subheader("Outras Avaliações")
         
         cultura_endometrial = st.selectbox("Cultura endometrial", 
-                                           ["Não realizada", "Negativa", "Positiva"])
+                                           ["Não realizada", "Negativa", "Positiva"],
+                                           key="cultura_endometrial")
+        germe = ""
         if cultura_endometrial == "Positiva":
-            germe = st.text_input("Germe isolado:")
+            germe = st.text_input("Germe isolado:", key="germe")
             if germe:
                 st.warning(f"Germe detectado: {germe} - Antibioticoterapia conforme antibiograma")
         
         microbioma = st.selectbox("Análise de microbioma endometrial (ALICE/EMMA)", 
                                   ["Não realizada", "Lactobacillus >90%", 
-                                   "Lactobacillus 50-90%", "Lactobacillus <50%"])
+                                   "Lactobacillus 50-90%", "Lactobacillus <50%"], key="microbioma")
         if microbioma == "Lactobacillus <50%":
             st.warning("⚠️ Disbiose endometrial - Considerar probióticos + antibióticos")
-            recomendacoes.append("Probióticos vaginais (Lactobacillus) por 30-60 dias")
 
 # ==================== TAB 3: FATORES IMUNOLÓGICOS ====================
 with tab3:
@@ -273,12 +503,17 @@ with tab3:
         **Ref**: Sydney Criteria 2024
         """)
         
-        anticardiolipina_igg = st.number_input("Anticardiolipina IgG (GPL)", 0.0, 200.0, 0.0)
-        anticardiolipina_igm = st.number_input("Anticardiolipina IgM (MPL)", 0.0, 200.0, 0.0)
+        anticardiolipina_igg = st.number_input("Anticardiolipina IgG (GPL)", 0.0, 200.0, 0.0,
+                                               key="anticardiolipina_igg")
+        anticardiolipina_igm = st.number_input("Anticardiolipina IgM (MPL)", 0.0, 200.0, 0.0,
+                                               key="anticardiolipina_igm")
         anticoagulante_lupico = st.selectbox("Anticoagulante Lúpico", 
-                                             ["Não testado", "Negativo", "Positivo"])
-        anti_b2gp1_igg = st.number_input("Anti-β2-glicoproteína I IgG (U/mL)", 0.0, 200.0, 0.0)
-        anti_b2gp1_igm = st.number_input("Anti-β2-glicoproteína I IgM (U/mL)", 0.0, 200.0, 0.0)
+                                             ["Não testado", "Negativo", "Positivo"],
+                                             key="anticoagulante_lupico")
+        anti_b2gp1_igg = st.number_input("Anti-β2-glicoproteína I IgG (U/mL)", 0.0, 200.0, 0.0,
+                                         key="anti_b2gp1_igg")
+        anti_b2gp1_igm = st.number_input("Anti-β2-glicoproteína I IgM (U/mL)", 0.0, 200.0, 0.0,
+                                         key="anti_b2gp1_igm")
         
         # Avaliar critérios SAF
         saf_criteria = []
@@ -293,6 +528,17 @@ with tab3:
         if anti_b2gp1_igm > 40:
             saf_criteria.append("Anti-β2GP1 IgM >40")
         
+        # Persistência no histórico: 2 positivos com ≥12 semanas de intervalo
+        for analito in ANTICORPOS_SAF:
+            rotulo = ANALITOS[analito][0]
+            par = exames.positivos_persistentes(analito)
+            if par:
+                st.error(f"🔴 **{rotulo} >{LIMIAR_SAF:.0f} persistente**: positivo em "
+                         f"{formatar_data(par[0])} e {formatar_data(par[1])}")
+            elif (exames.series[analito][1] > LIMIAR_SAF).any():
+                st.warning(f"⚠️ {rotulo} >{LIMIAR_SAF:.0f} no histórico sem confirmação após "
+                           f"≥{SEMANAS_PERSISTENCIA} semanas - repetir o exame")
+        
         if len(saf_criteria) > 0:
             st.error(f"🔴 **CRITÉRIOS PARA SAF PRESENTES** ({len(saf_criteria)} critérios)")
             for criterio in saf_criteria:
@@ -314,18 +560,16 @@ with tab3:
             
             **Ref**: ASRM Committee Opinion 2024
             """)
-            alertas_criticos.append("SÍNDROME ANTIFOSFOLÍPIDE - Anticoagulação + hidroxicloroquina")
-            recomendacoes.append("Protocolo SAF: AAS + Enoxaparina + Hidroxicloroquina")
         
         # Outros autoanticorpos
         st.subheader("Outros Autoanticorpos")
         fan = st.selectbox("FAN (Fator Antinuclear)", 
-                          ["Não testado", "Negativo", "1:80", "1:160", "1:320", ">1:320"])
-        anti_dna = st.selectbox("Anti-DNA dupla hélice", ["Não testado", "Negativo", "Positivo"])
+                          ["Não testado", "Negativo", "1:80", "1:160", "1:320", ">1:320"], key="fan")
+        anti_dna = st.selectbox("Anti-DNA dupla hélice", ["Não testado", "Negativo", "Positivo"],
+                                key="anti_dna")
         
         if fan in ["1:160", "1:320", ">1:320"] or anti_dna == "Positivo":
             st.warning("⚠️ Marcadores de autoimunidade - Avaliar com reumatologista")
-            recomendacoes.append("Avaliação reumatológica - possível doença autoimune sistêmica")
     
     with col2:
         st.subheader("Células NK (Natural Killer)")
@@ -342,12 +586,12 @@ with tab3:
         **Ref**: ESHRE Guideline 2023 - Não recomenda rotineiramente
         """)
         
-        nk_cells = st.number_input("Células NK periféricas (CD56+CD16+) %", 0.0, 50.0, 12.0)
+        nk_cells = st.number_input("Células NK periféricas (CD56+CD16+) %", 0.0, 50.0, 12.0, key="nk_cells")
         nk_endometrial = st.selectbox("NK endometriais (CD56+)", 
                                       ["Não testado", "Normal (<5%)", 
                                        "Levemente elevado (5-10%)", 
                                        "Moderadamente elevado (10-15%)", 
-                                       "Muito elevado (>15%)"])
+                                       "Muito elevado (>15%)"], key="nk_endometrial")
         
         nk_elevado = False
         if nk_cells > 18:
@@ -389,14 +633,26 @@ with tab3:
             
             **Considerar apenas em casos selecionados com falhas múltiplas**
             """)
-            recomendacoes.append("NK elevadas: Discutir prednisona (controverso) - Considerar apenas após múltiplas falhas")
         
         st.subheader("Função Tireoidiana")
-        tsh = st.number_input("TSH (mUI/L)", 0.0, 10.0, 2.5)
-        t4_livre = st.number_input("T4 livre (ng/dL)", 0.0, 3.0, 1.0)
+        tsh = st.number_input("TSH (mUI/L)", 0.0, 10.0, 2.5, key="tsh")
+        t4_livre = st.number_input("T4 livre (ng/dL)", 0.0, 3.0, 1.0, key="t4_livre")
         anti_tpo = st.selectbox("Anti-TPO (antitireoperoxidase)", 
-                                ["Não testado", "Negativo (<35)", "Positivo (35-100)", "Muito elevado (>100)"])
-        anti_tg = st.selectbox("Anti-tireoglobulina", ["Não testado", "Negativo", "Positivo"])
+                                ["Não testado", "Negativo (<35)", "Positivo (35-100)", "Muito elevado (>100)"],
+                                key="anti_tpo")
+        anti_tg = st.selectbox("Anti-tireoglobulina", ["Não testado", "Negativo", "Positivo"], key="anti_tg")
+        inicio_levotiroxina = st.date_input("Início da levotiroxina (se em uso)",
+                                            value=exames.marco("levotiroxina"), format="DD/MM/YYYY",
+                                            key=f"levotiroxina_{id_paciente_atual}")
+        exames.definir_marco("levotiroxina", inicio_levotiroxina)
+        if inicio_levotiroxina:
+            tendencia_tsh = exames.tendencia("tsh", inicio=inicio_levotiroxina)
+            if tendencia_tsh:
+                st.markdown(f"**TSH desde o início da levotiroxina**: {tendencia_tsh['primeira'][1]:.2f} → "
+                            f"{tendencia_tsh['ultima'][1]:.2f} mUI/L em {tendencia_tsh['medidas']} medidas "
+                            f"({tendencia_tsh['por_mes']:+.2f} mUI/L por mês)")
+            else:
+                st.markdown("Menos de 2 medidas de TSH desde o início da levotiroxina.")
         
         problema_tireoide = False
         if tsh > 2.5:
@@ -427,8 +683,6 @@ with tab3:
             
             **Ref**: ATA Guidelines 2024
             """)
-            alertas_criticos.append("Disfunção tireoidiana - Otimizar antes do ciclo (TSH <2.5)")
-            recomendacoes.append("Otimização tireoidiana: TSH alvo <2.5 mUI/L antes da transferência")
 
 # ==================== TAB 4: FATORES ANATÔMICOS ====================
 with tab4:
@@ -439,144 +693,58 @@ with tab4:
     with col1:
         st.subheader("Exames de Imagem Realizados")
         
-        ultrassom = st.checkbox("Ultrassom transvaginal 3D")
-        histeroscopia_realizada = st.checkbox("Histeroscopia diagnóstica")
-        histerossalpingografia = st.checkbox("Histerossalpingografia")
-        ressonancia = st.checkbox("Ressonância magnética pélvica")
+        ultrassom = st.checkbox("Ultrassom transvaginal 3D", key="ultrassom")
+        histeroscopia_realizada = st.checkbox("Histeroscopia diagnóstica", key="histeroscopia_realizada")
+        histerossalpingografia = st.checkbox("Histerossalpingografia", key="histerossalpingografia")
+        ressonancia = st.checkbox("Ressonância magnética pélvica", key="ressonancia")
         
         st.subheader("Alterações Anatômicas Detectadas")
         
         alteracoes = st.multiselect(
             "Selecione todas as alterações encontradas:",
-            ["Nenhuma alteração",
-             "Pólipo endometrial",
-             "Pólipo endocervical",
-             "Mioma submucoso (FIGO 0-1-2)",
-             "Mioma intramural >4cm próximo ao endométrio",
-             "Mioma intramural >4cm distante do endométrio",
-             "Septo uterino",
-             "Útero bicorno",
-             "Sinéquia uterina (Asherman)",
-             "Adenomiose focal",
-             "Adenomiose difusa",
-             "Hidrossalpinge unilateral",
-             "Hidrossalpinge bilateral",
-             "Endometrioma ovariano",
-             "Endometriose profunda",
-             "Espessamento endometrial irregular"]
+            OPCOES_ACHADOS,
+            key="alteracoes"
         )
         
-        # Avaliar cada alteração
+        # Avaliar cada alteração pelo catálogo estruturado
         cirurgia_necessaria = []
         tratamento_clinico = []
         
-        for alt in alteracoes:
-            if alt == "Pólipo endometrial":
-                cirurgia_necessaria.append("Polipectomia histeroscópica")
-                st.error("🔴 **Pólipo endometrial** - Polipectomia mandatória")
-                st.markdown("""
-                - Remover antes do próximo ciclo
-                - Aguardar 1-2 ciclos menstruais após procedimento
-                - Taxa de gestação aumenta 10-15% após remoção
-                """)
-            
-            elif alt == "Mioma submucoso (FIGO 0-1-2)":
-                cirurgia_necessaria.append("Miomectomia histeroscópica")
-                st.error("🔴 **Mioma submucoso** - Miomectomia mandatória")
-                st.markdown("""
-                - FIGO 0-1-2: Impacto significativo na implantação
-                - Remoção histeroscópica
-                - Aguardar 2-3 ciclos após procedimento
-                """)
-            
-            elif alt == "Mioma intramural >4cm próximo ao endométrio":
-                cirurgia_necessaria.append("Miomectomia laparoscópica/aberta")
-                st.warning("⚠️ **Mioma intramural grande** - Considerar miomectomia")
-                st.markdown("""
-                - Se >4cm e distorce cavidade: remover
-                - Aguardar 3-6 meses após cirurgia
-                - Avaliar risco cirúrgico vs. benefício
-                """)
-            
-            elif alt == "Septo uterino":
-                cirurgia_necessaria.append("Septoplastia histeroscópica")
-                st.error("🔴 **Septo uterino** - Septoplastia recomendada")
-                st.markdown("""
-                - Septoplastia histeroscópica
-                - Melhora taxa de implantação
-                - Aguardar 2 ciclos após procedimento
-                """)
-            
-            elif alt == "Sinéquia uterina (Asherman)":
-                cirurgia_necessaria.append("Lise de sinéquias histeroscópica")
-                st.error("🔴 **Síndrome de Asherman** - Lise de sinéquias")
-                st.markdown("""
-                - Histeroscopia operatória
-                - Estradiol alta dose após (2-3 meses)
-                - Pode necessitar múltiplos procedimentos
-                - Considerar balão intrauterino
-                """)
-            
-            elif "Hidrossalpinge" in alt:
-                cirurgia_necessaria.append("Salpingectomia laparoscópica")
-                st.error("🔴 **HIDROSSALPINGE** - Salpingectomia obrigatória")
-                st.markdown("""
-                **CRÍTICO**: Reduz taxa de implantação em 50%!
-                
-                - Salpingectomia laparoscópica bilateral se bilateral
-                - Fluido tóxico para embriões
-                - OBRIGATÓRIO remover antes de FIV
-                - Aguardar 1-2 meses após cirurgia
-                
-                **Ref**: ASRM - Salpingectomia aumenta taxa de gestação em 2x
-                """)
-                alertas_criticos.append("HIDROSSALPINGE - Salpingectomia OBRIGATÓRIA antes do ciclo")
-            
-            elif "Adenomiose" in alt:
-                tratamento_clinico.append("Análogo GnRH pré-tratamento")
-                st.warning("⚠️ **Adenomiose** - Considerar pré-tratamento")
-                st.markdown("""
-                **Protocolo para adenomiose:**
-                - Análogo GnRH (Leuprolide) por 2-3 meses antes da transferência
-                - OU Dienogest 2mg/dia por 2-3 meses
-                - Melhora receptividade endometrial
-                - Reduz inflamação local
-                
-                **Ref**: Cochrane Review 2024
-                """)
+        for achado in achados_de(alteracoes):
+            registro = CATALOGO[achado]
+            if registro.cirurgia and registro.cirurgia not in cirurgia_necessaria:
+                cirurgia_necessaria.append(registro.cirurgia)
+            if registro.tratamento_clinico and registro.tratamento_clinico not in tratamento_clinico:
+                tratamento_clinico.append(registro.tratamento_clinico)
             
-            elif "Endometriose" in alt or "Endometrioma" in alt:
-                st.warning("⚠️ **Endometriose** - Avaliar necessidade de tratamento")
-                st.markdown("""
-                **Conduta:**
-                - Endometrioma <3cm: não drenar (piora reserva ovariana)
-                - Endometrioma >4cm com sintomas: considerar cistectomia
-                - Endometriose profunda: tratar cirurgicamente se sintomática
-                - Considerar GnRH análogo 2-3 meses pré-FIV
-                """)
+            if registro.gravidade == GRAVIDADE_ALTA:
+                st.error(registro.mensagem)
+            elif registro.gravidade == GRAVIDADE_MODERADA:
+                st.warning(registro.mensagem)
+            if registro.detalhes:
+                st.markdown(registro.detalhes)
         
         # Resumo de cirurgias necessárias
         if len(cirurgia_necessaria) > 0:
             st.error("### 🔪 **CIRURGIAS NECESSÁRIAS ANTES DO PRÓXIMO CICLO:**")
             for cirurgia in cirurgia_necessaria:
                 st.markdown(f"- {cirurgia}")
-                recomendacoes.append(f"Cirurgia: {cirurgia}")
         
         if len(tratamento_clinico) > 0:
             st.warning("### 💊 **TRATAMENTO CLÍNICO RECOMENDADO:**")
             for tratamento in tratamento_clinico:
                 st.markdown(f"- {tratamento}")
-                recomendacoes.append(f"Tratamento: {tratamento}")
     
     with col2:
         st.subheader("Avaliação Endometrial")
         
         espessura_endometrial = st.number_input("Espessura endometrial máxima (mm)", 
-                                                0.0, 20.0, 9.0, step=0.5)
+                                                0.0, 20.0, 9.0, step=0.5, key="espessura_endometrial")
         padrao_endometrial = st.selectbox("Padrão endometrial no ultrassom", 
-                                          ["Trilaminar (ideal)", "Homogêneo", "Irregular/heterogêneo"])
+                                          ["Trilaminar (ideal)", "Homogêneo", "Irregular/heterogêneo"],
+                                          key="padrao_endometrial")
         fluxo_endometrial = st.selectbox("Fluxo sanguíneo endometrial (Doppler)", 
-                                         ["Não avaliado", "Adequado", "Reduzido"])
+                                         ["Não avaliado", "Adequado", "Reduzido"], key="fluxo_endometrial")
         
         # Avaliar espessura endometrial
         if espessura_endometrial < 7:
@@ -608,13 +776,10 @@ with tab4:
             
             **Ref**: Fertility & Sterility 2024
             """)
-            alertas_criticos.append("Endométrio fino - Protocolo de otimização necessário")
-            recomendacoes.append("Endométrio fino: Aumentar estradiol + suplementos vasodilatadores")
         
         elif espessura_endometrial >= 7 and espessura_endometrial < 9:
             st.warning(f"⚠️ **Endométrio limítrofe: {espessura_endometrial}mm** (ideal ≥9mm)")
             st.markdown("- Considerar otimização com estradiol vaginal adicional")
-            recomendacoes.append("Endométrio limítrofe: Adicionar estradiol vaginal")
         
         else:
             st.success(f"✅ **Endométrio adequado: {espessura_endometrial}mm**")
@@ -625,7 +790,8 @@ with tab4:
         st.subheader("Janela de Implantação")
         
         era_test = st.selectbox("ERA Test (Endometrial Receptivity Array)", 
-                                ["Não realizado", "Receptivo", "Pré-receptivo", "Pós-receptivo"])
+                                ["Não realizado", "Receptivo", "Pré-receptivo", "Pós-receptivo"],
+                                key="era_test")
         
         st.info("""
         **ERA Test**: Análise molecular da janela de implantação
@@ -640,6 +806,10 @@ with tab4:
         **Ref**: Fertility & Sterility 2023
         """)
         
+        if resumo_transferencias["indicacao_era"] and era_test == "Não realizado":
+            st.warning(f"⚠️ **{resumo_transferencias['falhas_euploides']} falhas com embriões "
+                       f"euploides no histórico** - ERA Test indicado")
+        
         if era_test == "Pré-receptivo":
             st.error("🔴 **Janela de implantação DESLOCADA: Pré-receptivo**")
             st.markdown("""
@@ -652,8 +822,6 @@ with tab4:
             
             **Melhora taxa de implantação em 20-25%**
             """)
-            alertas_criticos.append("ERA: Janela pré-receptiva - Transferir 12-24h mais tarde")
-            recomendacoes.append("ERA Test: Ajustar timing da transferência (+12-24h)")
         
         elif era_test == "Pós-receptivo":
             st.error("🔴 **Janela de implantação DESLOCADA: Pós-receptivo**")
@@ -667,8 +835,6 @@ with tab4:
             
             **Melhora taxa de implantação em 20-25%**
             """)
-            alertas_criticos.append("ERA: Janela pós-receptiva - Transferir 12-24h mais cedo")
-            recomendacoes.append("ERA Test: Ajustar timing da transferência (-12-24h)")
         
         elif era_test == "Receptivo":
             st.success("✅ **Janela de implantação normal** - Manter protocolo atual")
@@ -677,24 +843,43 @@ with tab4:
 with tab5:
     st.header("📊 Análise Laboratorial Complementar")
     
+    # Tendências do histórico de exames (séries reduzidas para o gráfico)
+    analitos_com_medidas = [analito for analito in ANALITOS if len(exames.series[analito][0])]
+    with st.expander(f"📈 Tendências dos exames ({len(exames)} medidas no histórico)"):
+        if not analitos_com_medidas:
+            st.markdown("Nenhuma medida registrada. Adicione exames no histórico acima ou salve o caso.")
+        else:
+            analito_tendencia = st.selectbox("Exame", analitos_com_medidas,
+                                             format_func=lambda analito: ANALITOS[analito][0],
+                                             key="tendencia_analito")
+            rotulo, unidade = ANALITOS[analito_tendencia]
+            datas, valores = exames.reduzir(analito_tendencia)
+            st.line_chart(pd.DataFrame({f"{rotulo} ({unidade})": valores}, index=pd.to_datetime(datas)))
+            tendencia = exames.tendencia(analito_tendencia)
+            if tendencia:
+                st.caption(f"{tendencia['medidas']} medidas de {formatar_data(tendencia['primeira'][0])} a "
+                           f"{formatar_data(tendencia['ultima'][0])}; variação {tendencia['variacao']:+.2f} "
+                           f"{unidade} ({tendencia['por_mes']:+.2f} {unidade} por mês)")
+            if len(datas) < len(exames.series[analito_tendencia][0]):
+                st.caption(f"Gráfico com {len(datas)} de {len(exames.series[analito_tendencia][0])} pontos "
+                           "(mínimos e máximos de cada período preservados).")
+    
     col1, col2, col3 = st.columns(3)
     
     with col1:
         st.subheader("Perfil Hormonal")
         
-        vitamina_d = st.number_input("Vitamina D (ng/mL)", 0.0, 100.0, 30.0)
-        prolactina = st.number_input("Prolactina (ng/mL)", 0.0, 100.0, 15.0)
-        progesterona = st.number_input("Progesterona fase lútea (ng/mL)", 0.0, 50.0, 10.0)
-        estradiol = st.number_input("Estradiol (pg/mL)", 0, 500, 200)
+        vitamina_d = st.number_input("Vitamina D (ng/mL)", 0.0, 100.0, 30.0, key="vitamina_d")
+        prolactina = st.number_input("Prolactina (ng/mL)", 0.0, 100.0, 15.0, key="prolactina")
+        progesterona = st.number_input("Progesterona fase lútea (ng/mL)", 0.0, 50.0, 10.0, key="progesterona")
+        estradiol = st.number_input("Estradiol (pg/mL)", 0, 500, 200, key="estradiol")
         
         if vitamina_d < 20:
             st.error(f"🔴 **Deficiência de Vitamina D: {vitamina_d} ng/mL**")
             st.markdown("- **Suplementar 4000-6000 UI/dia** até atingir >30 ng/mL")
-            recomendacoes.append(f"Vitamina D baixa ({vitamina_d}): Suplementar 4000-6000 UI/dia")
         elif vitamina_d < 30:
             st.warning(f"⚠️ **Vitamina D insuficiente: {vitamina_d} ng/mL**")
             st.markdown("- **Suplementar 2000-4000 UI/dia** (alvo >30 ng/mL)")
-            recomendacoes.append(f"Vitamina D insuficiente ({vitamina_d}): Suplementar 2000-4000 UI/dia")
         else:
             st.success(f"✅ Vitamina D adequada: {vitamina_d} ng/mL")
         
@@ -705,20 +890,17 @@ with tab5:
             - Considerar **Cabergolina** 0.25-0.5mg 2x/semana
             - RM de sela túrcica se >100 ng/mL
             """)
-            alertas_criticos.append("Hiperprolactinemia - Investigar e tratar antes do ciclo")
-            recomendacoes.append("Hiperprolactinemia: Cabergolina + investigação")
         
         if progesterona < 10:
             st.warning(f"⚠️ Progesterona baixa: {progesterona} ng/mL")
             st.markdown("- Considerar aumentar suporte de progesterona")
-            recomendacoes.append("Suporte de progesterona: Considerar dose mais alta ou via adicional")
     
     with col2:
         st.subheader("Perfil Metabólico")
         
-        glicemia = st.number_input("Glicemia de jejum (mg/dL)", 0, 200, 90)
-        hba1c = st.number_input("Hemoglobina glicada (%)", 0.0, 15.0, 5.5)
-        insulina = st.number_input("Insulina de jejum (µU/mL)", 0.0, 50.0, 10.0)
+        glicemia = st.number_input("Glicemia de jejum (mg/dL)", 0, 200, 90, key="glicemia")
+        hba1c = st.number_input("Hemoglobina glicada (%)", 0.0, 15.0, 5.5, key="hba1c")
+        insulina = st.number_input("Insulina de jejum (µU/mL)", 0.0, 50.0, 10.0, key="insulina")
         
         # Calcular HOMA-IR
         if glicemia > 0 and insulina > 0:
@@ -738,17 +920,13 @@ with tab5:
                 
                 **Melhora qualidade oocitária e taxa de implantação**
                 """)
-                alertas_criticos.append("Resistência insulínica - Metformina + modificação estilo de vida")
-                recomendacoes.append("Resistência insulínica: Metformina 1500-2000mg/dia + inositol")
             elif homa_ir > 1.9:
                 st.warning(f"⚠️ Resistência insulínica limítrofe (HOMA-IR: {homa_ir:.2f})")
-                recomendacoes.append("HOMA-IR limítrofe: Considerar metformina + inositol")
         
         if glicemia >= 100 and glicemia < 126:
             st.warning("⚠️ Glicemia de jejum alterada (pré-diabetes)")
         elif glicemia >= 126:
             st.error("🔴 Diabetes - Encaminhar para endocrinologista")
-            alertas_criticos.append("DIABETES - Controle glicêmico obrigatório antes do ciclo")
         
         if hba1c >= 5.7 and hba1c < 6.5:
             st.warning("⚠️ HbA1c elevada (pré-diabetes)")
@@ -758,17 +936,15 @@ with tab5:
     with col3:
         st.subheader("Marcadores Inflamatórios")
         
-        pcr = st.number_input("Proteína C Reativa (mg/L)", 0.0, 50.0, 3.0)
-        vhs = st.number_input("VHS (mm/h)", 0, 100, 10)
-        homocisteina = st.number_input("Homocisteína (µmol/L)", 0.0, 50.0, 10.0)
+        pcr = st.number_input("Proteína C Reativa (mg/L)", 0.0, 50.0, 3.0, key="pcr")
+        vhs = st.number_input("VHS (mm/h)", 0, 100, 10, key="vhs")
+        homocisteina = st.number_input("Homocisteína (µmol/L)", 0.0, 50.0, 10.0, key="homocisteina")
         
         if pcr > 10:
             st.error(f"🔴 **PCR muito elevada: {pcr} mg/L** - Processo inflamatório ativo")
             st.markdown("- Investigar foco infeccioso/inflamatório antes do ciclo")
-            alertas_criticos.append("PCR elevada - Investigar processo inflamatório antes do ciclo")
         elif pcr > 3:
             st.warning(f"⚠️ PCR elevada: {pcr} mg/L")
-            recomendacoes.append("PCR elevada: Investigar causas de inflamação")
         
         if homocisteina > 15:
             st.warning(f"⚠️ **Homocisteína elevada: {homocisteina} µmol/L**")
@@ -778,11 +954,11 @@ with tab5:
             - **Vitamina B6** 50mg/dia
             - Reavaliar em 2-3 meses
             """)
-            recomendacoes.append("Homocisteína elevada: Vitaminas B (folato, B12, B6)")
         
         st.subheader("Estresse Oxidativo")
         
-        considerar_antioxidantes = st.checkbox("Considerar suplementação antioxidante")
+        considerar_antioxidantes = st.checkbox("Considerar suplementação antioxidante",
+                                               key="considerar_antioxidantes")
         
         if considerar_antioxidantes or idade >= 37:
             st.info("""
@@ -806,8 +982,6 @@ with tab5:
             
             **Ref**: Fertility & Sterility 2024
             """)
-            if idade >= 37:
-                recomendacoes.append("Idade ≥37 anos: Protocolo antioxidante completo (CoQ10, melatonina, DHEA)")
 
     # Seção adicional: Perfil Espermático
     st.subheader("📊 Avaliação do Fator Masculino")
@@ -819,11 +993,12 @@ with tab5:
                                     ["Não realizado", "Normal (OMS 2021)", 
                                      "Oligozoospermia leve", "Oligozoospermia moderada/grave",
                                      "Astenozoospermia", "Teratozoospermia", 
-                                     "Oligoastenoteratozoospermia"])
+                                     "Oligoastenoteratozoospermia"], key="espermograma")
         
         fragmentacao_dna = st.selectbox("Fragmentação de DNA espermático", 
                                         ["Não realizado", "<15% (excelente)", 
-                                         "15-25% (bom)", "25-30% (limítrofe)", ">30% (alto)"])
+                                         "15-25% (bom)", "25-30% (limítrofe)", ">30% (alto)"],
+                                        key="fragmentacao_dna")
         
         if fragmentacao_dna in ["25-30% (limítrofe)", ">30% (alto)"]:
             st.error("🔴 **Fragmentação de DNA espermático elevada**")
@@ -849,8 +1024,6 @@ with tab5:
             
             **Ref**: Andrology 2024
             """)
-            alertas_criticos.append("Fragmentação DNA espermático elevada - Antioxidantes 3 meses")
-            recomendacoes.append("Fator masculino: Antioxidantes + técnicas de seleção espermática avançada")
     
     with col2:
         if espermograma != "Não realizado" and espermograma != "Normal (OMS 2021)":
@@ -862,12 +1035,226 @@ with tab5:
             - Ultrassom de bolsa escrotal
             - Avaliação urológica
             """)
-            recomendacoes.append("Espermograma alterado: Avaliação urológica completa")
+
+# ==================== CENÁRIOS "E SE...?" ====================
+# Fragmento: comparar cenários reexecuta só este painel, não a página inteira
+@st.fragment
+def painel_cenarios(entradas):
+    with st.form("cenarios"):
+        escolhidos = st.multiselect("Cenários a comparar com o caso atual", list(CENARIOS))
+        comparar = st.form_submit_button("Comparar cenários")
+    if not comparar or not escolhidos:
+        return
+    
+    avaliados = avaliar_cenarios(entradas, {nome: CENARIOS[nome] for nome in escolhidos})
+    base = avaliados[0][1]
+    for coluna, (nome, resultado) in zip(st.columns(len(avaliados)), avaliados):
+        with coluna:
+            st.markdown(f"#### {nome}")
+            for chave, titulo in [("alertas_criticos", "🚨 Alertas críticos"),
+                                  ("recomendacoes", "⚠️ Recomendações")]:
+                st.markdown(f"**{titulo} ({len(resultado[chave])})**")
+                dif = diferencas(base, resultado, chave)
+                for item in resultado[chave]:
+                    st.markdown(f"- 🆕 **{item}**" if item in dif["novos"] else f"- {item}")
+                for item in dif["resolvidos"]:
+                    st.markdown(f"- ✅ ~~{item}~~")
+
+FORMULARIO_ATUAL = "Formulário atual"
+
+
+def painel_visitas(historico, atual):
+    """Compara duas visitas salvas (ou uma visita e o formulário atual)."""
+    datas = historico.datas()
+    opcoes = [*datas, FORMULARIO_ATUAL]
+    with st.expander(f"🗓️ Histórico de visitas ({len(historico)} salvas)"):
+        col_de, col_ate = st.columns(2)
+        de = col_de.selectbox("Comparar", opcoes, index=len(opcoes) - 2, key="visita_de")
+        ate = col_ate.selectbox("com", opcoes, index=len(opcoes) - 1, key="visita_ate")
+
+        def indice(opcao):
+            return None if opcao == FORMULARIO_ATUAL else datas.index(opcao)
+
+        i, j = indice(de), indice(ate)
+        if i is not None and j is not None:
+            diferencas = historico.comparar(i, j)
+        else:
+            diferencas = diferencas_visitas(atual if i is None else historico.visita(i),
+                                            atual if j is None else historico.visita(j))
+        alteradas = {campo: valores for campo, valores in diferencas["entradas"].items()
+                     if campo != "nome_paciente"}
+        if alteradas:
+            st.dataframe(pd.DataFrame([
+                {"Campo": CAMPOS[campo].rotulo if campo in CAMPOS else campo,
+                 "Antes": str(formatar_valor(antes)), "Depois": str(formatar_valor(depois))}
+                for campo, (antes, depois) in alteradas.items()
+            ]), hide_index=True)
+        else:
+            st.markdown("Nenhuma entrada alterada.")
+        for chave, titulo in [("alertas_criticos_novos", "🚨 Alertas críticos novos"),
+                              ("alertas_criticos_resolvidos", "✅ Alertas críticos resolvidos"),
+                              ("recomendacoes_novos", "⚠️ Recomendações novas"),
+                              ("recomendacoes_resolvidos", "✅ Recomendações que saíram")]:
+            if diferencas[chave]:
+                st.markdown(f"**{titulo}**")
+                for item in diferencas[chave]:
+                    st.markdown(f"- {item}")
+
+
+def formatar_valor(valor):
+    if isinstance(valor, bool):
+        return "Sim" if valor else "Não"
+    if isinstance(valor, list):
+        return ", ".join(valor) or "Nenhuma"
+    return valor
+
+# ==================== EXPORTAÇÕES ====================
+def pedir_exportacao(tipo, parametros, nome_arquivo):
+    """Enfileira a exportação e guarda a tarefa na sessão (as mais recentes primeiro)."""
+    fila = carregar_exportacoes()
+    tarefa = fila.pedir(tipo, parametros, nome_arquivo)
+    anteriores = [fila.tarefa(i) for i in st.session_state.get("exportacoes", [])]
+    ids = [tarefa.id] + [t.id for t in anteriores if t and t.chave != tarefa.chave]
+    st.session_state["exportacoes"] = ids[:5]
+
+
+def painel_exportacoes():
+    fila = carregar_exportacoes()
+    acompanhando = any(not t.terminada for t in map(fila.tarefa, st.session_state.get("exportacoes", [])) if t)
+    
+    # Enquanto houver tarefa em andamento, só este painel se reexecuta a cada segundo
+    @st.fragment(run_every=1.0 if acompanhando else None)
+    def mostrar():
+        tarefas = [t for t in map(fila.tarefa, st.session_state.get("exportacoes", [])) if t]
+        if acompanhando and all(t.terminada for t in tarefas):
+            st.rerun()  # página inteira, para parar a atualização periódica
+        for tarefa in tarefas:
+            descricao = f"**{tarefa.exportador.descricao}** — `{tarefa.nome_arquivo}`"
+            if tarefa.estado == FALHOU:
+                st.error(f"{descricao}: falhou ({tarefa.erro})")
+            elif not tarefa.terminada:
+                st.progress(tarefa.progresso, text=f"{descricao} ({tarefa.estado}, {tarefa.progresso:.0%})")
+            else:
+                conteudo = fila.ler(tarefa)
+                if conteudo is None:
+                    st.warning(f"{descricao}: arquivo removido do cache; peça a exportação novamente.")
+                    continue
+                st.download_button(
+                    label=f"📥 {tarefa.exportador.descricao}",
+                    data=conteudo,
+                    file_name=tarefa.nome_arquivo,
+                    mime=tarefa.exportador.mime,
+                    on_click="ignore",
+                    key=f"baixar_{tarefa.id}",
+                )
+    
+    mostrar()
+
+def linhas_prescricoes(prescricoes, alternativas=()):
+    """Checklist markdown das prescrições (e grupos de alternativas) de uma fase do regime."""
+    if not prescricoes and not alternativas:
+        return "- Nenhuma medicação iniciada nesta fase"
+
+    def texto(p):
+        return f"**{p.medicamento.value}** {p.dose} ({p.via})" + (f" - {p.observacao}" if p.observacao else "")
+
+    linhas = [f"- [ ] {texto(p)}" for p in prescricoes]
+    linhas += ["- [ ] Uma das opções: " + " **ou** ".join(texto(p) for p in grupo.opcoes)
+               for grupo in alternativas]
+    return "\n".join(linhas)
 
 # ==================== TAB 6: PROTOCOLO PERSONALIZADO ====================
 with tab6:
     st.header("📝 Protocolo Personalizado para o Próximo Ciclo")
     
+    # Consolidar todas as entradas do caso
+    entradas = {
+        "nome_paciente": nome_paciente,
+        "idade": idade,
+        "num_falhas": num_falhas,
+        "imc": imc,
+        "tipo_embrioes": tipo_embrioes,
+        "qualidade_embrionaria": qualidade_embrionaria,
+        "cariotipo_casal": cariótipo_casal,
+        "cariotipo_resultado": cariótipo_resultado,
+        "pgt_a": pgt_a,
+        "pgt_a_resultado": pgt_a_resultado,
+        "trombofilia": trombofilia,
+        "hla": hla,
+        "hla_compartilhado": hla_compartilhado,
+        "fator_v": fator_v,
+        "protrombina": protrombina,
+        "mthfr": mthfr,
+        "pai_ii": pai_ii,
+        "histeroscopia": histeroscopia,
+        "biopsia_endometrial": biopsia_endometrial,
+        "ureaplasma": ureaplasma,
+        "mycoplasma": mycoplasma,
+        "chlamydia": chlamydia,
+        "cultura_endometrial": cultura_endometrial,
+        "germe": germe,
+        "microbioma": microbioma,
+        "anticardiolipina_igg": anticardiolipina_igg,
+        "anticardiolipina_igm": anticardiolipina_igm,
+        "anticoagulante_lupico": anticoagulante_lupico,
+        "anti_b2gp1_igg": anti_b2gp1_igg,
+        "anti_b2gp1_igm": anti_b2gp1_igm,
+        "fan": fan,
+        "anti_dna": anti_dna,
+        "nk_cells": nk_cells,
+        "nk_endometrial": nk_endometrial,
+        "tsh": tsh,
+        "t4_livre": t4_livre,
+        "anti_tpo": anti_tpo,
+        "anti_tg": anti_tg,
+        "ultrassom": ultrassom,
+        "histeroscopia_realizada": histeroscopia_realizada,
+        "histerossalpingografia": histerossalpingografia,
+        "ressonancia": ressonancia,
+        "alteracoes": alteracoes,
+        "espessura_endometrial": espessura_endometrial,
+        "padrao_endometrial": padrao_endometrial,
+        "fluxo_endometrial": fluxo_endometrial,
+        "era_test": era_test,
+        "vitamina_d": vitamina_d,
+        "prolactina": prolactina,
+        "progesterona": progesterona,
+        "estradiol": estradiol,
+        "glicemia": glicemia,
+        "hba1c": hba1c,
+        "insulina": insulina,
+        "pcr": pcr,
+        "vhs": vhs,
+        "homocisteina": homocisteina,
+        "considerar_antioxidantes": considerar_antioxidantes,
+        "espermograma": espermograma,
+        "fragmentacao_dna": fragmentacao_dna,
+    }
+    
+    # Exames informados: campos numéricos que o usuário alterou desde o último caso
+    # salvo. Cada alteração de widget gera uma nova execução, então basta comparar
+    # com os valores da execução anterior; o que o formulário só manteve não é medida.
+    valores_exames = {campo: entradas[campo] for campo in OBSERVACOES_NUMERICAS}
+    execucao_anterior = st.session_state.get("exames_execucao_anterior")
+    exames_informados = st.session_state.setdefault("exames_informados", set())
+    if execucao_anterior is not None:
+        exames_informados.update(campo for campo, valor in valores_exames.items()
+                                 if valor != execucao_anterior[campo])
+    st.session_state["exames_execucao_anterior"] = valores_exames
+    
+    # Avaliar o caso (fonte única dos alertas e recomendações)
+    resultado = avaliar_caso(entradas)
+    alertas_criticos = resultado["alertas_criticos"]
+    recomendacoes = resultado["recomendacoes"]
+    regime = montar_regime(entradas, resultado)
+    
+    # Telemetria: cada combinação de entradas conta uma vez por sessão
+    # (reexecuções do script sem mudança nas entradas não contam)
+    assinatura_entradas = json.dumps(entradas, sort_keys=True, ensure_ascii=False)
+    if st.session_state.get("telemetria_ultima_avaliacao") != assinatura_entradas:
+        st.session_state["telemetria_ultima_avaliacao"] = assinatura_entradas
+        carregar_telemetria().registrar(entradas, resultado)
+    
     st.markdown(f"""
     ## Resumo do Caso
     
@@ -879,6 +1266,58 @@ with tab6:
     **Qualidade**: {qualidade_embrionaria}  
     """)
     
+    if resumo_transferencias["transferencias"] > 0:
+        st.markdown(f"""
+    **Histórico registrado**: {resumo_transferencias["transferencias"]} transferências, 
+    {resumo_transferencias["embrioes_transferidos"]} embriões, 
+    {resumo_transferencias["falhas_euploides"]} falhas com euploides  
+    **Critério RIF (histórico)**: {"Atendido" if resumo_transferencias["criterio_rif"] else "Não atendido"}
+    """)
+    
+    # PONTUAÇÃO DE PROGNÓSTICO
+    prognostico = avaliar_prognostico(entradas)
+    col_pontuacao, col_componentes = st.columns([1, 3])
+    with col_pontuacao:
+        st.metric("Pontuação de prognóstico RIF", f"{prognostico['pontuacao']:.0f}/100",
+                  help="Média ponderada dos fatores desfavoráveis; maior = prognóstico mais "
+                       "reservado e maior prioridade na worklist. Ordena casos, não estima "
+                       "probabilidade de gestação.")
+        st.markdown(f"**Faixa**: {prognostico['faixa']}")
+    with col_componentes:
+        contribuicoes = {rotulo: pontos for rotulo, pontos in prognostico["componentes"].items() if pontos > 0}
+        if contribuicoes:
+            st.bar_chart(pd.Series(contribuicoes, name="Pontos"), horizontal=True)
+        else:
+            st.markdown("✅ Nenhum fator desfavorável pontuado.")
+    
+    # PACIENTES SEMELHANTES NO ARQUIVO
+    indice_similares = carregar_indice_similares(versao_arquivo(CAMINHO_MATRIZ, CAMINHO_RESUMOS))
+    with st.expander(f"🔎 Pacientes com perfil semelhante ({len(indice_similares)} no arquivo)"):
+        semelhantes = indice_similares.buscar(vetor_caso(entradas), k=5,
+                                              excluir=id_paciente_atual)
+        if semelhantes:
+            st.dataframe(pd.DataFrame([
+                {"Paciente": indice_similares.resumos[pid]["nome"],
+                 "Idade": indice_similares.resumos[pid]["idade"],
+                 "Falhas": indice_similares.resumos[pid]["num_falhas"],
+                 "IMC": indice_similares.resumos[pid]["imc"],
+                 "Alertas críticos": indice_similares.resumos[pid]["alertas_criticos"],
+                 "Avaliação": indice_similares.resumos[pid]["data_avaliacao"],
+                 "Distância": round(distancia, 3)}
+                for pid, distancia in semelhantes
+            ]), hide_index=True)
+        else:
+            st.markdown("Nenhum caso arquivado para comparação.")
+    
+    # HISTÓRICO DE VISITAS DA PACIENTE
+    if id_paciente_atual:
+        historico = carregar_visitas(id_paciente_atual, versao_arquivo(caminho_visitas(id_paciente_atual)))
+    else:
+        historico = HistoricoVisitas(None)
+    if len(historico):
+        painel_visitas(historico, {"entradas": entradas, "alertas_criticos": alertas_criticos,
+                                   "recomendacoes": recomendacoes})
+    
     # ALERTAS CRÍTICOS
     if len(alertas_criticos) > 0:
         st.error("## 🚨 ALERTAS CRÍTICOS - AÇÃO OBRIGATÓRIA")
@@ -893,6 +1332,36 @@ with tab6:
             st.markdown(f"**{i}.** {rec}")
         st.markdown("---")
     
+    # EXPLICAÇÃO (a partir do traço da avaliação acima, sem reavaliar)
+    with st.expander("🔍 Por que estes alertas e recomendações?"):
+        passos = explicar(entradas, resultado["traco"])
+        if not passos:
+            st.markdown("Nenhuma regra disparada para este caso.")
+        for passo in passos:
+            st.markdown(f"**{passo['descricao']}**" + (f" — {passo['detalhe']}" if passo["detalhe"] else ""))
+            st.markdown("; ".join(f"{CAMPOS[campo].rotulo}: `{formatar_valor(valor)}`"
+                                  for campo, valor in passo["entradas"].items()))
+            for alerta in passo["alertas_criticos"]:
+                st.markdown(f"- 🚨 {alerta}")
+            for rec in passo["recomendacoes"]:
+                st.markdown(f"- ⚠️ {rec}")
+    
+    # CENÁRIOS
+    with st.expander("🧪 Cenários: e se...?"):
+        painel_cenarios(entradas)
+    
+    # REGIME MEDICAMENTOSO CONSOLIDADO
+    with st.expander(f"💊 Regime medicamentoso ({len(regime.prescricoes)} medicações"
+                     + (f" + {len(regime.alternativas)} escolha entre alternativas" if regime.alternativas else "")
+                     + f", {len(regime.alertas)} alertas)"):
+        st.dataframe(pd.DataFrame(regime.como_linhas()), hide_index=True)
+        for alerta in regime.alertas:
+            medicamentos = " + ".join(m.value for m in alerta.medicamentos)
+            if alerta.gravidade == EVITAR:
+                st.error(f"🔴 **{medicamentos}**: {alerta.texto}")
+            else:
+                st.warning(f"⚠️ **{medicamentos}**: {alerta.texto}")
+    
     # PROTOCOLO STEP-BY-STEP
     st.success("## ✅ PROTOCOLO PASSO A PASSO PARA O PRÓXIMO CICLO")
     
@@ -902,27 +1371,11 @@ with tab6:
     #### **Investigações pendentes:**
     """)
     
-    investigacoes_pendentes = []
-    if not cariótipo_casal:
-        investigacoes_pendentes.append("- [ ] Cariótipo do casal")
-    if not pgt_a and idade >= 37:
-        investigacoes_pendentes.append("- [ ] Considerar PGT-A nos próximos embriões")
-    if not trombofilia:
-        investigacoes_pendentes.append("- [ ] Painel completo de trombofilia")
-    if biopsia_endometrial == "Não realizada":
-        investigacoes_pendentes.append("- [ ] Biópsia endometrial com CD138 (endometrite crônica)")
-    if histeroscopia == "Não realizada":
-        investigacoes_pendentes.append("- [ ] Histeroscopia diagnóstica")
-    if era_test == "Não realizado" and num_falhas >= 3:
-        investigacoes_pendentes.append("- [ ] Considerar ERA Test (janela de implantação)")
-    if ureaplasma == "Não testado":
-        investigacoes_pendentes.append("- [ ] Pesquisa Ureaplasma/Mycoplasma (casal)")
-    if fragmentacao_dna == "Não realizado":
-        investigacoes_pendentes.append("- [ ] Fragmentação de DNA espermático")
-    
-    if len(investigacoes_pendentes) > 0:
-        for inv in investigacoes_pendentes:
-            st.markdown(inv)
+    pendencias = investigacoes_pendentes(entradas)
+    
+    if len(pendencias) > 0:
+        for chave in pendencias:
+            st.markdown(f"- [ ] {INVESTIGACOES[chave]}")
     else:
         st.markdown("✅ Todas as investigações essenciais realizadas")
     
@@ -936,28 +1389,20 @@ with tab6:
         st.markdown("✅ Nenhuma intervenção crítica pendente")
     
     st.markdown("""
-    #### **Suplementação pré-ciclo (iniciar agora):**
-    
-    **Para a mulher:**
-    - [ ] Ácido fólico 5mg/dia (ou metilfolato se MTHFR+)
-    - [ ] Vitamina D 2000-4000 UI/dia (se <30 ng/mL)
-    - [ ] Ômega-3 (DHA) 1-2g/dia
-    - [ ] Multivitamínico pré-natal
+    #### **Cronograma até a transferência:**
     """)
     
-    if idade >= 35:
-        st.markdown("""
-    - [ ] CoQ10 200-600mg/dia
-    - [ ] Melatonina 3mg à noite
-    - [ ] Considerar DHEA 25-75mg/dia (avaliar com médico)
-        """)
+    cronograma = planejar(intervencoes_do_caso(entradas), datetime.now().date())
+    st.dataframe(pd.DataFrame(cronograma.como_linhas()), hide_index=True)
+    st.markdown(f"📅 **Data mais precoce para transferência segura:** "
+                f"{cronograma.data_transferencia.strftime('%d/%m/%Y')}")
     
-    if vitamina_d < 30:
-        st.markdown("- [ ] **Vitamina D**: dose terapêutica até normalizar")
+    st.markdown("""
+    #### **Medicações e suplementação pré-ciclo (iniciar agora):**
     
-    if homa_ir > 2.5:
-        st.markdown("- [ ] **Metformina** 1500-2000mg/dia")
-        st.markdown("- [ ] **Myo-inositol 2g + D-chiro-inositol 50mg** 2x/dia")
+    **Para a mulher:**
+    """)
+    st.markdown(linhas_prescricoes(regime.da_fase(Fase.PRE_CICLO), regime.alternativas_da_fase(Fase.PRE_CICLO)))
     
     st.markdown("""
     **Para o homem (se fator masculino presente):**
@@ -979,32 +1424,13 @@ with tab6:
     
     # Protocolo básico
     st.markdown("""
-    - [ ] Estradiol (dose ajustada para atingir endométrio ≥8mm)
     - [ ] Monitoramento ultrassonográfico seriado
     - [ ] Meta: Endométrio trilaminar ≥8-9mm
     """)
-    
     if espessura_endometrial < 7:
-        st.markdown("""
-    - [ ] **Protocolo endométrio fino:**
-      - Estradiol oral dose alta (6-8mg/dia)
-      - Estradiol vaginal adicional 2mg 12/12h
-      - Vitamina E 800 UI/dia
-      - L-arginina 6g/dia
-      - Pentoxifilina 800mg/dia
-      - AAS 100mg/dia
-        """)
-    
-    # Medicações específicas baseadas nos achados
-    if trombofilia_presente or len([c for c in saf_criteria if c]) > 0:
-        st.markdown("""
-    - [ ] **AAS 100mg/dia** (iniciar com preparo endometrial)
-        """)
-    
-    if "Adenomiose" in str(alteracoes):
-        st.markdown("""
-    - [ ] **Considerar GnRH análogo** 2-3 meses antes (Leuprolide)
-        """)
+        st.markdown("- [ ] **Protocolo endométrio fino** (medicações abaixo)")
+    st.markdown(linhas_prescricoes(regime.da_fase(Fase.PREPARO_ENDOMETRIAL),
+                                   regime.alternativas_da_fase(Fase.PREPARO_ENDOMETRIAL)))
     
     st.markdown("""
     ---
@@ -1013,22 +1439,12 @@ with tab6:
     #### **Dia da transferência:**
     """)
     
-    if trombofilia_presente or len(saf_criteria) > 0:
-        st.markdown("""
-    - [ ] Iniciar **Enoxaparina 40mg/dia SC** (no dia da transferência)
-    - [ ] Manter **AAS 100mg/dia**
-        """)
-    
-    if len([c for c in saf_criteria if c]) > 0 and anticoagulante_lupico == "Positivo":
-        st.markdown("""
-    - [ ] **Hidroxicloroquina 400mg/dia** (se não iniciado antes)
-        """)
-    
-    if nk_elevado and num_falhas >= 4:
-        st.markdown("""
-    - [ ] **Considerar Prednisona 5-10mg/dia** (controverso - discutir riscos/benefícios)
-    - [ ] Ou **Intralipid 20% 100mL IV** antes da transferência (controverso)
-        """)
+    st.markdown(linhas_prescricoes(regime.da_fase(Fase.TRANSFERENCIA),
+                                   regime.alternativas_da_fase(Fase.TRANSFERENCIA)))
+    mantidas = [p.medicamento.value for p in regime.prescricoes
+                if p.inicio < Fase.TRANSFERENCIA and p.suspensao > Suspensao.TRANSFERENCIA]
+    if mantidas:
+        st.markdown(f"- [ ] Manter: {', '.join(dict.fromkeys(mantidas))}")
     
     if era_test == "Pré-receptivo":
         st.markdown("""
@@ -1039,20 +1455,6 @@ with tab6:
     - [ ] **Ajustar timing:** Transferir 12-24h MAIS CEDO que o habitual
         """)
     
-    st.markdown("""
-    #### **Suporte de fase lútea:**
-    
-    - [ ] Progesterona micronizada 600-800mg/dia (vaginal)
-    - [ ] OU Progesterona injetável 50-100mg/dia IM
-    - [ ] OU Combinação das vias
-    - [ ] Estradiol 2-6mg/dia (manter)
-    """)
-    
-    if progesterona < 10:
-        st.markdown("""
-    - [ ] **Aumentar dose de progesterona** ou adicionar via adicional
-        """)
-    
     st.markdown("""
     ---
     ### **FASE 4: PÓS-TRANSFERÊNCIA**
@@ -1067,11 +1469,15 @@ with tab6:
     - [ ] Evitar relações sexuais por 2 semanas
     """)
     
+    st.markdown("#### **Duração das medicações (se gestação positiva):**")
+    st.markdown("\n".join(f"- **{p.medicamento.value}** ({p.via}): {p.suspensao.descricao}"
+                          for p in sorted(regime.prescricoes, key=lambda p: -p.suspensao)))
+    for grupo in regime.alternativas:
+        st.markdown("- " + " / ".join(f"**{p.medicamento.value}** ({p.via}), se escolhida: "
+                                      f"{p.suspensao.descricao}" for p in grupo.opcoes))
+    
     if trombofilia_presente or len(saf_criteria) > 0:
-        st.markdown("""
-    - [ ] **Manter anticoagulação até 12 semanas se gestação positiva**
-    - [ ] Seguimento com hematologista/reumatologista
-        """)
+        st.markdown("- [ ] Seguimento com hematologista/reumatologista")
     
     if problema_tireoide:
         st.markdown("""
@@ -1132,6 +1538,8 @@ with tab6:
     # BOTÃO PARA GERAR RELATÓRIO
     st.markdown("---")
     if st.button("📄 Gerar Relatório Completo (PDF)", type="primary"):
+        registrar_auditoria(evento_avaliacao(
+            "relatorio", id_paciente_atual or "", entradas, alertas_criticos, recomendacoes))
         st.info("""
         **Funcionalidade de geração de PDF será implementada em versão futura.**
         
@@ -1141,24 +1549,67 @@ with tab6:
         3. Ou fazer screenshots das seções relevantes
         """)
     
+    # LINK PARA O CASO
+    with st.expander("🔗 Link para este caso"):
+        incluir_nome = st.checkbox("Incluir o nome da paciente no link", key="link_incluir_nome")
+        endereco = (st.context.url or "").split("?")[0]
+        st.code(f"{endereco}?caso={codificar_link(entradas, incluir_nome)}", language=None)
+        st.caption("O link reproduz todas as respostas do formulário e abre nesta aba. "
+                   "O histórico de transferências não vai no link.")
+    
     # BOTÃO PARA SALVAR DADOS
-    if st.button("💾 Salvar Dados do Caso"):
+    st.caption("Exames informados nesta avaliação: " + (", ".join(
+        OBSERVACOES_NUMERICAS[campo][1] for campo in OBSERVACOES_NUMERICAS if campo in exames_informados)
+        or "nenhum") + ". Só eles entram no histórico de exames e na exportação FHIR.")
+    salvar_clicado = st.button("💾 Salvar Dados do Caso")
+    if salvar_clicado and not (nome_paciente.strip() and id_paciente_atual):
+        st.error("❌ Informe o nome e o nº do prontuário da paciente na barra lateral para salvar o caso.")
+    elif salvar_clicado:
         dados_caso = {
+            "id_paciente": id_paciente_atual,
+            "prontuario": prontuario_paciente.strip(),
             "nome": nome_paciente,
             "idade": idade,
             "num_falhas": num_falhas,
             "imc": imc,
             "data_avaliacao": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "alertas_criticos": alertas_criticos,
-            "recomendacoes": recomendacoes
+            "recomendacoes": recomendacoes,
+            "entradas": entradas,
+            "exames_informados": [campo for campo in OBSERVACOES_NUMERICAS if campo in exames_informados],
+            "resumo_transferencias": resumo_transferencias
         }
         
-        st.download_button(
-            label="📥 Download JSON",
-            data=json.dumps(dados_caso, indent=2, ensure_ascii=False),
-            file_name=f"caso_rif_{nome_paciente.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.json",
-            mime="application/json"
-        )
+        # Arquivar o caso e atualizar os índices da clínica
+        salvar_caso(dados_caso)
+        registrar_visita(dados_caso)
+        salvar_transferencias(dados_caso["id_paciente"], transferencias)
+        exames = registrar_no_historico(dados_caso["id_paciente"], exames_salvos, exames, dados_caso)
+        registrar_auditoria(evento_avaliacao(
+            "salvar", dados_caso["id_paciente"], entradas, alertas_criticos, recomendacoes))
+        atualizar_indices(dados_caso)
+        
+        # O JSON é gerado pela fila de exportações e baixado no painel abaixo
+        pedir_exportacao(
+            "caso_json", {"dados_caso": dados_caso},
+            f"caso_rif_{nome_paciente.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.json")
+        exames_informados.clear()
+        st.success("✅ Caso salvo.")
+    
+    # EXPORTAÇÕES EM SEGUNDO PLANO
+    st.markdown("### 📦 Exportações")
+    col_pacote, col_fhir = st.columns(2)
+    with col_pacote:
+        if st.button("🗂️ Pacote da paciente (zip)", disabled=not id_paciente_atual):
+            pedir_exportacao(
+                "pacote_paciente", {"id_paciente": id_paciente_atual},
+                f"pacote_rif_{id_paciente_atual}_{datetime.now().strftime('%Y%m%d')}.zip")
+    with col_fhir:
+        if st.button("🏥 FHIR de todos os casos (zip)"):
+            pedir_exportacao("fhir_clinica", {}, f"fhir_rif_{datetime.now().strftime('%Y%m%d')}.zip")
+    st.caption("As exportações rodam em segundo plano; exportações repetidas sobre os mesmos "
+               "dados saem direto do cache em disco.")
+    painel_exportacoes()
 
 # FOOTER
 st.markdown("---")
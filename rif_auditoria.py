@@ -0,0 +1,288 @@
+"""Registro de auditoria das avaliações (somente anexação).
+
+Cada protocolo gerado vira uma linha JSON num segmento
+``<RIF_DADOS_DIR>/auditoria/segmento_NNNNNN.jsonl``; ao passar de
+``TAMANHO_SEGMENTO`` um novo segmento é aberto. A gravação é feita por uma
+thread de fundo: ``registrar`` só enfileira, e a thread agrupa os eventos que
+chegarem dentro de ``INTERVALO_LOTE`` numa única escrita seguida de um único
+``fsync``, sem atrasar a execução do script.
+
+O índice (``indice.tsv``: segmento, posição, paciente, data) é gravado depois
+do segmento; na abertura, uma linha final incompleta (queda no meio da
+escrita) é descartada e eventos que ficaram fora do índice são reindexados.
+
+Vários processos podem registrar no mesmo diretório: cada lote é gravado sob
+``bloqueio("auditoria")``, e as leituras primeiro incorporam as linhas que
+outros processos acrescentaram ao índice.
+
+Um lote que falha na gravação (disco cheio, erro de E/S) é desfeito no
+arquivo, fica com a thread e é regravado a cada ``ESPERA_MAXIMA`` segundos no
+máximo; enquanto isso, ``falha`` descreve o erro para o app mostrar. Na saída
+do processo (``atexit``) os eventos ainda na fila são gravados.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from rif_casos import DIRETORIO_DADOS, bloqueio
+from rif_regras import VERSAO_REGRAS
+
+DIRETORIO_AUDITORIA = DIRETORIO_DADOS / "auditoria"
+TAMANHO_SEGMENTO = 16 * 1024 * 1024
+INTERVALO_LOTE = 0.2
+MAXIMO_LOTE = 512
+ESPERA_MAXIMA = 30.0  # entre tentativas de regravar um lote que falhou
+ESPERA_SAIDA = 5.0    # na saída, quanto esperar a thread esvaziar a fila
+
+log = logging.getLogger(__name__)
+
+
+def evento_avaliacao(tipo, id_paciente, entradas, alertas_criticos, recomendacoes):
+    return {
+        "evento": tipo,
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "id_paciente": id_paciente,
+        "versao_regras": VERSAO_REGRAS,
+        "entradas": entradas,
+        "alertas_criticos": alertas_criticos,
+        "recomendacoes": recomendacoes,
+    }
+
+
+def _nome_segmento(numero):
+    return f"segmento_{numero:06d}.jsonl"
+
+
+def _anexar(caminho, dados):
+    """Acrescenta ``dados`` ao arquivo com fsync; em erro, desfaz o que foi escrito."""
+    with open(caminho, "ab", buffering=0) as f:
+        inicio = f.tell()
+        try:
+            escritos = 0
+            while escritos < len(dados):
+                escritos += f.write(dados[escritos:])
+            os.fsync(f.fileno())
+        except OSError:
+            # Sem linha pela metade antes da próxima tentativa
+            os.ftruncate(f.fileno(), inicio)
+            raise
+    return inicio
+
+
+def _fsync_diretorio(diretorio):
+    fd = os.open(diretorio, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class RegistroAuditoria:
+    def __init__(self, diretorio=DIRETORIO_AUDITORIA, tamanho_segmento=TAMANHO_SEGMENTO):
+        self.diretorio = diretorio
+        self.tamanho_segmento = tamanho_segmento
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self._caminho_indice = self.diretorio / "indice.tsv"
+        self._lock_indice = threading.Lock()
+        self.por_paciente = defaultdict(list)  # id -> [(segmento, posição)]
+        self.por_data = defaultdict(list)      # "AAAA-MM-DD" -> [(segmento, posição)]
+        self._posicao_indice = 0               # bytes do indice.tsv já incorporados
+
+        with bloqueio("auditoria"):
+            segmentos = self._segmentos()
+            ultimo = segmentos[-1] if segmentos else 1
+            self._reparar_cauda(self.diretorio / _nome_segmento(ultimo))
+            self._reparar_cauda(self._caminho_indice)
+            self._carregar_indice()
+
+        self.falha = None  # descrição do último erro de gravação, até um lote ser gravado
+        self._fila = queue.Queue()
+        self._thread = threading.Thread(target=self._gravar_continuamente, daemon=True)
+        self._thread.start()
+        atexit.register(self.fechar)
+
+    # ---------- gravação ----------
+    def registrar(self, evento):
+        """Enfileira o evento; a gravação em disco acontece em lote na thread de fundo."""
+        self._fila.put(evento)
+
+    def aguardar(self):
+        """Bloqueia até que todos os eventos enfileirados estejam em disco."""
+        self._fila.join()
+
+    def fechar(self, espera=ESPERA_SAIDA):
+        """Grava os eventos ainda pendentes (registrado em ``atexit``)."""
+        limite = time.monotonic() + espera
+        while self._fila.unfinished_tasks and self._thread.is_alive() and time.monotonic() < limite:
+            time.sleep(INTERVALO_LOTE / 4)
+        # O que a thread não chegou a pegar é gravado aqui (a trava serializa com ela)
+        lote = []
+        while True:
+            try:
+                lote.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        if lote:
+            self._gravar_com_nova_tentativa(lote, tentativas=3)
+
+    def _gravar_continuamente(self):
+        while True:
+            lote = [self._fila.get()]
+            try:
+                while len(lote) < MAXIMO_LOTE:
+                    lote.append(self._fila.get(timeout=INTERVALO_LOTE))
+            except queue.Empty:
+                pass
+            self._gravar_com_nova_tentativa(lote)
+
+    def _gravar_com_nova_tentativa(self, lote, tentativas=None):
+        """Grava o lote, tentando de novo após erros de E/S; a thread nunca termina por erro."""
+        espera = INTERVALO_LOTE
+        try:
+            while True:
+                try:
+                    self._gravar_lote(lote)
+                    self.falha = None
+                    return
+                except OSError as erro:
+                    self.falha = (f"{type(erro).__name__}: {erro} ({len(lote)} eventos aguardando "
+                                  f"gravação, mais {self._fila.qsize()} na fila)")
+                    log.exception("Falha ao gravar lote de auditoria; nova tentativa em %.1f s", espera)
+                except Exception as erro:
+                    # Erro que repetir não resolve (ex.: evento não serializável): o lote é descartado
+                    self.falha = f"{type(erro).__name__}: {erro} ({len(lote)} eventos não gravados)"
+                    log.exception("Lote de auditoria descartado")
+                    return
+                if tentativas is not None:
+                    tentativas -= 1
+                    if tentativas <= 0:
+                        return
+                time.sleep(espera)
+                espera = min(2 * espera, ESPERA_MAXIMA)
+        finally:
+            for _ in lote:
+                self._fila.task_done()
+
+    def _gravar_lote(self, lote):
+        with bloqueio("auditoria"):
+            # Outro processo pode ter aberto um segmento novo desde o último lote
+            segmentos = self._segmentos()
+            segmento = segmentos[-1] if segmentos else 1
+            caminho = self.diretorio / _nome_segmento(segmento)
+            if caminho.exists() and caminho.stat().st_size >= self.tamanho_segmento:
+                segmento += 1
+                caminho = self.diretorio / _nome_segmento(segmento)
+
+            linhas = [(json.dumps(evento, ensure_ascii=False) + "\n").encode("utf-8") for evento in lote]
+            posicao = _anexar(caminho, b"".join(linhas))
+
+            entradas_indice = []
+            for evento, linha in zip(lote, linhas):
+                entradas_indice.append((segmento, posicao, evento["id_paciente"], evento["data"][:10]))
+                posicao += len(linha)
+            # Daqui em diante os eventos já estão no segmento: regravar o lote os
+            # duplicaria. O que ficar fora do índice é reindexado na próxima abertura.
+            try:
+                _fsync_diretorio(self.diretorio)
+                _anexar(self._caminho_indice, "".join(
+                    f"{s}\t{p}\t{pid}\t{d}\n" for s, p, pid, d in entradas_indice).encode("utf-8"))
+            except OSError:
+                log.exception("Falha ao atualizar o índice da auditoria")
+
+    # ---------- índice e recuperação ----------
+    def _segmentos(self):
+        return sorted(int(p.stem.split("_")[1]) for p in self.diretorio.glob("segmento_*.jsonl"))
+
+    @staticmethod
+    def _reparar_cauda(caminho):
+        """Descarta uma última linha incompleta deixada por uma queda."""
+        if not caminho.exists():
+            return
+        with open(caminho, "rb+") as f:
+            dados = f.read()
+            if dados and not dados.endswith(b"\n"):
+                f.truncate(dados.rfind(b"\n") + 1)
+                os.fsync(f.fileno())
+
+    def _atualizar_indice(self):
+        """Incorpora as linhas completas acrescentadas ao indice.tsv (por qualquer processo)."""
+        if not self._caminho_indice.exists():
+            return []
+        with self._lock_indice:
+            with open(self._caminho_indice, "rb") as f:
+                f.seek(self._posicao_indice)
+                novo = f.read()
+            completo = novo[:novo.rfind(b"\n") + 1]
+            self._posicao_indice += len(completo)
+            entradas_indice = []
+            for linha in completo.decode("utf-8").splitlines():
+                partes = linha.split("\t")
+                entradas_indice.append((int(partes[0]), int(partes[1]), partes[2], partes[3]))
+            for segmento, posicao, pid, data in entradas_indice:
+                self.por_paciente[pid].append((segmento, posicao))
+                self.por_data[data].append((segmento, posicao))
+        return entradas_indice
+
+    def _carregar_indice(self):
+        entradas_indice = self._atualizar_indice()
+        ultimo = max(((s, p) for s, p, _, _ in entradas_indice), default=(0, -1))
+
+        # Eventos gravados no segmento mas ausentes do índice
+        faltando = [(s, p, e["id_paciente"], e["data"][:10])
+                    for s, p, e in self._varrer(ultimo) if (s, p) > ultimo]
+        if faltando:
+            with open(self._caminho_indice, "a", encoding="utf-8") as f:
+                f.writelines(f"{s}\t{p}\t{pid}\t{d}\n" for s, p, pid, d in faltando)
+            self._atualizar_indice()
+
+    def _varrer(self, a_partir_de=(0, -1)):
+        for segmento in self._segmentos():
+            if segmento < a_partir_de[0]:
+                continue
+            with open(self.diretorio / _nome_segmento(segmento), "rb") as f:
+                if segmento == a_partir_de[0] and a_partir_de[1] >= 0:
+                    f.seek(a_partir_de[1])
+                posicao = f.tell()
+                for linha in f:
+                    yield segmento, posicao, json.loads(linha)
+                    posicao += len(linha)
+
+    # ---------- leitura ----------
+    def ler_sequencial(self):
+        """Todos os eventos em ordem de gravação."""
+        for _, _, evento in self._varrer():
+            yield evento
+
+    def _ler_posicoes(self, posicoes):
+        arquivos = {}
+        try:
+            for segmento, posicao in sorted(posicoes):
+                if segmento not in arquivos:
+                    arquivos[segmento] = open(self.diretorio / _nome_segmento(segmento), "rb")
+                f = arquivos[segmento]
+                f.seek(posicao)
+                yield json.loads(f.readline())
+        finally:
+            for f in arquivos.values():
+                f.close()
+
+    def ler_paciente(self, id_paciente):
+        self._atualizar_indice()
+        with self._lock_indice:
+            posicoes = list(self.por_paciente.get(id_paciente, []))
+        return list(self._ler_posicoes(posicoes))
+
+    def ler_periodo(self, data_inicio, data_fim):
+        """Eventos com data (AAAA-MM-DD) entre ``data_inicio`` e ``data_fim``, inclusive."""
+        self._atualizar_indice()
+        with self._lock_indice:
+            posicoes = [p for data, lista in self.por_data.items()
+                        if data_inicio <= data <= data_fim for p in lista]
+        return list(self._ler_posicoes(posicoes))
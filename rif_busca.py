@@ -0,0 +1,232 @@
+"""Busca textual nas diretrizes e protocolos embutidos no app.
+
+Os blocos de texto do app (``st.markdown``/``st.info``/``st.warning``/... com
+texto literal) são extraídos do código-fonte de ``rif_app.py`` com ``ast``,
+inclusive os que só aparecem sob alguma condição (ex.: o protocolo de
+endometrite crônica), junto com a aba e a seção (último ``st.header`` ou
+``st.subheader``) em que estão. As prescrições de cada indicação do regime
+medicamentoso (``rif_medicacoes.INDICACOES``), que a aba 6 monta a partir de
+dados, entram como blocos próprios.
+
+O índice invertido termo -> {bloco: frequência} é montado uma vez e
+compartilhado entre as sessões. Os termos ignoram acentos e caixa
+e o plural simples ("Probióticos" e "PROBIOTICO" viram "probiotico"), as
+palavras vazias do português ficam fora, e o último termo da consulta (a partir de
+``PREFIXO_MINIMO`` letras) vale também como prefixo ("hidroxicl" encontra
+"hidroxicloroquina"). Os blocos que contêm mais termos da consulta vêm
+primeiro e, entre eles, a ordem é por tf-idf com saturação da frequência.
+
+Uso:
+    python rif_busca.py "hidroxicloroquina dose"
+"""
+
+import argparse
+import ast
+import math
+import re
+import textwrap
+import time
+import unicodedata
+from bisect import bisect_left
+from dataclasses import dataclass
+from pathlib import Path
+
+from rif_medicacoes import INDICACOES, Alternativas
+
+FONTE_APP = Path(__file__).resolve().parent / "rif_app.py"
+METODOS_TEXTO = {"markdown", "info", "warning", "error", "success"}
+FORA_DAS_ABAS = "Geral"
+ABA_REGIME = "💊 Regime medicamentoso"
+MAXIMO_RESULTADOS = 8
+PREFIXO_MINIMO = 3  # último termo mais curto que isso só vale por inteiro
+PESO_PREFIXO = 0.5  # termo encontrado só como prefixo conta menos que o exato
+SATURACAO = 1.2  # repetições de um termo no mesmo bloco rendem cada vez menos (BM25)
+
+PALAVRAS_VAZIAS = frozenset("""
+a ao aos as ate com como da das de do dos e em entre na nas no nos o os ou para
+pela pelas pelo pelos por que se sem sob sobre um uma umas uns ja nao mais
+""".split())
+
+
+def normalizar(palavra):
+    """Minúsculas e sem acentos (mantém letras não latinas, como β)."""
+    decomposta = unicodedata.normalize("NFKD", palavra)
+    return "".join(c for c in decomposta if not unicodedata.combining(c)).casefold()
+
+
+def termo(palavra):
+    """Forma indexada de uma palavra: normalizada e sem o "s" final do plural."""
+    palavra = normalizar(palavra)
+    return palavra[:-1] if len(palavra) > 4 and palavra.endswith("s") else palavra
+
+
+def termos(texto):
+    """Termos indexáveis de um texto, na ordem em que aparecem."""
+    return [t for t in map(termo, re.findall(r"\w+", texto)) if t not in PALAVRAS_VAZIAS]
+
+
+@dataclass(frozen=True)
+class Bloco:
+    aba: str
+    secao: str
+    texto: str
+    linha: int = None  # linha em rif_app.py (None para os blocos do regime)
+
+
+def _texto_literal(no, constantes):
+    """Texto de um argumento literal (f-strings viram texto com '…' no lugar das expressões)."""
+    if isinstance(no, ast.Constant) and isinstance(no.value, str):
+        return no.value
+    if isinstance(no, ast.Name) and no.id in constantes:
+        return constantes[no.id]
+    if isinstance(no, ast.JoinedStr):
+        return "".join(parte.value if isinstance(parte, ast.Constant) else "…" for parte in no.values)
+    return None
+
+
+class _Extrator(ast.NodeVisitor):
+    def __init__(self, constantes):
+        self.constantes = constantes
+        self.abas = {}  # nome da variável -> rótulo da aba
+        self.aba, self.secao = FORA_DAS_ABAS, ""
+        self.blocos = []
+
+    def visit_Assign(self, no):
+        # tab1, tab2, ... = st.tabs([...])
+        if (isinstance(no.value, ast.Call) and getattr(no.value.func, "attr", None) == "tabs"
+                and isinstance(no.targets[0], ast.Tuple) and no.value.args):
+            rotulos = [_texto_literal(e, self.constantes) for e in no.value.args[0].elts]
+            self.abas.update({alvo.id: rotulo for alvo, rotulo in zip(no.targets[0].elts, rotulos)})
+        self.generic_visit(no)
+
+    def visit_With(self, no):
+        nomes = [item.context_expr.id for item in no.items if isinstance(item.context_expr, ast.Name)]
+        aba = next((self.abas[nome] for nome in nomes if nome in self.abas), None)
+        if aba is None:
+            self.generic_visit(no)
+            return
+        anterior = self.aba, self.secao
+        self.aba, self.secao = aba, ""
+        self.generic_visit(no)
+        self.aba, self.secao = anterior
+
+    def visit_Call(self, no):
+        metodo = getattr(no.func, "attr", None)
+        texto = _texto_literal(no.args[0], self.constantes) if no.args else None
+        if texto is not None and metodo in ("header", "subheader"):
+            self.secao = texto
+        elif texto is not None and metodo in METODOS_TEXTO:
+            texto = textwrap.dedent(texto).strip()
+            if len(termos(texto)) >= 2:
+                self.blocos.append(Bloco(self.aba, self.secao, texto, no.lineno))
+        self.generic_visit(no)
+
+
+def extrair_blocos(fonte=FONTE_APP):
+    arvore = ast.parse(Path(fonte).read_text(encoding="utf-8"))
+    constantes = {alvo.id: no.value.value for no in arvore.body if isinstance(no, ast.Assign)
+                  for alvo in no.targets
+                  if isinstance(alvo, ast.Name) and isinstance(no.value, ast.Constant)
+                  and isinstance(no.value.value, str)}
+    extrator = _Extrator(constantes)
+    extrator.visit(arvore)
+    return extrator.blocos
+
+
+def _texto_prescricao(p):
+    return (f"**{p.medicamento.value}** {p.dose} ({p.via}), {p.inicio.descricao.lower()}, "
+            f"{p.suspensao.descricao}" + (f" - {p.observacao}" if p.observacao else ""))
+
+
+def blocos_regime():
+    """Um bloco por indicação do regime: as prescrições com dose, via, início e suspensão."""
+    return [Bloco(ABA_REGIME, descricao, "\n".join(
+                "- " + (" ou ".join(map(_texto_prescricao, item.opcoes)) if isinstance(item, Alternativas)
+                        else _texto_prescricao(item))
+                for item in prescricoes))
+            for _, descricao, _, prescricoes in INDICACOES]
+
+
+class IndiceBusca:
+    def __init__(self, blocos):
+        self.blocos = list(blocos)
+        self.postagens = {}  # termo -> {índice do bloco: frequência}
+        for i, bloco in enumerate(self.blocos):
+            for t in termos(f"{bloco.secao}\n{bloco.texto}"):
+                frequencias = self.postagens.setdefault(t, {})
+                frequencias[i] = frequencias.get(i, 0) + 1
+        self.vocabulario = sorted(self.postagens)
+        self.idf = {t: math.log(1 + len(self.blocos) / len(frequencias))
+                    for t, frequencias in self.postagens.items()}
+
+    @classmethod
+    def do_app(cls, fonte=FONTE_APP):
+        return cls(extrair_blocos(fonte) + blocos_regime())
+
+    def __len__(self):
+        return len(self.blocos)
+
+    def _com_prefixo(self, prefixo):
+        inicio = bisect_left(self.vocabulario, prefixo)
+        fim = inicio
+        while fim < len(self.vocabulario) and self.vocabulario[fim].startswith(prefixo):
+            fim += 1
+        return self.vocabulario[inicio:fim]
+
+    def buscar(self, consulta, limite=MAXIMO_RESULTADOS):
+        """[(bloco, termos encontrados)] dos blocos com algum termo, melhores primeiro."""
+        pedidos = termos(consulta)
+        if not pedidos:
+            return []
+        # Cada termo da consulta vira os termos do índice que o satisfazem, com peso
+        alternativas = [{t: 1.0} if t in self.postagens else {} for t in pedidos]
+        if len(pedidos[-1]) >= PREFIXO_MINIMO:
+            alternativas[-1] = {t: 1.0 if t == pedidos[-1] else PESO_PREFIXO
+                                for t in self._com_prefixo(pedidos[-1])}
+        pontuacao, cobertos, encontrados = {}, {}, {}
+        for opcoes in alternativas:
+            pontos = {}
+            for t, peso in opcoes.items():
+                for i, frequencia in self.postagens[t].items():
+                    saturada = frequencia * (SATURACAO + 1) / (frequencia + SATURACAO)
+                    pontos[i] = pontos.get(i, 0.0) + peso * saturada * self.idf[t]
+                    encontrados.setdefault(i, set()).add(t)
+            for i, p in pontos.items():
+                pontuacao[i] = pontuacao.get(i, 0.0) + p
+                cobertos[i] = cobertos.get(i, 0) + 1
+        melhores = sorted(pontuacao, key=lambda i: (-cobertos[i], -pontuacao[i], i))[:limite]
+        return [(self.blocos[i], encontrados[i]) for i in melhores]
+
+
+def trecho(bloco, encontrados, linhas=3):
+    """Linhas do bloco com termos encontrados, com as palavras destacadas (markdown)."""
+    def destacar(correspondencia):
+        palavra = correspondencia.group(0)
+        return f":orange-background[{palavra}]" if termo(palavra) in encontrados else palavra
+
+    linhas_bloco = [linha.lstrip("#").strip() for linha in bloco.texto.splitlines() if linha.strip()]
+    # Sem termo nas linhas, o termo estava no título da seção
+    escolhidas = [linha for linha in linhas_bloco if encontrados & set(termos(linha))] or linhas_bloco
+    return "\n\n".join(re.sub(r"\w+", destacar, linha) for linha in escolhidas[:linhas])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca nas diretrizes e protocolos do app RIF")
+    parser.add_argument("consulta")
+    parser.add_argument("--limite", type=int, default=MAXIMO_RESULTADOS)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    indice = IndiceBusca.do_app()
+    montagem = time.perf_counter() - inicio
+    print(f"{len(indice)} blocos, {len(indice.vocabulario)} termos (montado em {1000 * montagem:.0f} ms)")
+    inicio = time.perf_counter()
+    resultados = indice.buscar(args.consulta, args.limite)
+    print(f"{len(resultados)} resultados em {1000 * (time.perf_counter() - inicio):.2f} ms")
+    for bloco, encontrados in resultados:
+        print(f"\n[{bloco.aba} › {bloco.secao}]" + (f" (linha {bloco.linha})" if bloco.linha else ""))
+        print(textwrap.indent(trecho(bloco, encontrados), "  "))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Esquema dos campos do formulário (barra lateral e abas 1-5).
+
+Para cada variável de ``entradas`` guarda o rótulo do widget, o tipo e as
+opções ou limites numéricos, na ordem em que aparecem na tela. Serve a quem
+precisa gerar ou validar entradas fora do Streamlit (fuzzing, testes de carga,
+importações).
+"""
+
+from dataclasses import dataclass, field
+
+from rif_achados import OPCOES as OPCOES_ACHADOS
+
+TEXTO = "texto"
+INTEIRO = "inteiro"
+DECIMAL = "decimal"
+BOOLEANO = "booleano"
+OPCAO = "opcao"
+MULTIPLO = "multiplo"
+
+
+@dataclass(frozen=True)
+class Campo:
+    rotulo: str
+    tipo: str
+    opcoes: list = field(default_factory=list)
+    minimo: float | None = None
+    maximo: float | None = None
+    padrao: object = None
+    passo: float | None = None
+
+    def valor_padrao(self):
+        if self.tipo == OPCAO:
+            return self.opcoes[0]
+        if self.tipo == MULTIPLO:
+            return []
+        return self.padrao
+
+
+# Widgets condicionais (hla_compartilhado, germe) ficam com o padrão quando ocultos
+CAMPOS = {
+    "nome_paciente": Campo("Nome da paciente", TEXTO, padrao=""),
+    "idade": Campo("Idade", INTEIRO, minimo=18, maximo=50, padrao=35),
+    "num_falhas": Campo("Número de falhas", INTEIRO, minimo=3, maximo=20, padrao=3),
+    "imc": Campo("IMC", DECIMAL, minimo=15.0, maximo=50.0, padrao=23.0),
+    "tipo_embrioes": Campo("Tipo de embriões transferidos", OPCAO, opcoes=["Blastocistos", "D3", "Ambos"]),
+    "qualidade_embrionaria": Campo("Qualidade embrionária", OPCAO, opcoes=["Excelente (AA/AB)", "Boa (BA/BB)", "Regular"]),
+    "cariotipo_casal": Campo("Cariótipo do casal realizado", BOOLEANO, padrao=False),
+    "cariotipo_resultado": Campo("Resultado do cariótipo", OPCAO, opcoes=["Não aplicável", "Normal", "Alterado"]),
+    "pgt_a": Campo("PGT-A (Teste Genético Pré-implantacional)", BOOLEANO, padrao=False),
+    "pgt_a_resultado": Campo("Resultado PGT-A", OPCAO, opcoes=["Não aplicável", "Todos aneuploides", "Maioria aneuploides", "Maioria euploides"]),
+    "trombofilia": Campo("Painel de Trombofilia Hereditária", BOOLEANO, padrao=False),
+    "hla": Campo("Tipagem HLA (DQ-alpha)", BOOLEANO, padrao=False),
+    "hla_compartilhado": Campo("Alelos HLA-DQ compartilhados", INTEIRO, minimo=0, maximo=4, padrao=0),
+    "fator_v": Campo("Fator V Leiden", OPCAO, opcoes=["Não testado", "Normal", "Heterozigoto", "Homozigoto"]),
+    "protrombina": Campo("Mutação Protrombina G20210A", OPCAO, opcoes=["Não testado", "Normal", "Heterozigoto", "Homozigoto"]),
+    "mthfr": Campo("MTHFR C677T", OPCAO, opcoes=["Não testado", "Normal", "Heterozigoto", "Homozigoto"]),
+    "pai_ii": Campo("PAI-1 4G/5G", OPCAO, opcoes=["Não testado", "5G/5G", "4G/5G", "4G/4G"]),
+    "histeroscopia": Campo("Histeroscopia diagnóstica", OPCAO, opcoes=["Não realizada", "Normal", "Micropolipos", "Hiperemia focal", "Edema estromal"]),
+    "biopsia_endometrial": Campo("Biópsia endometrial com CD138", OPCAO, opcoes=["Não realizada", "Negativa (<5 células)", "Positiva (5-10 células)", "Positiva (>10 células)"]),
+    "ureaplasma": Campo("Ureaplasma urealyticum", OPCAO, opcoes=["Não testado", "Negativo", "Positivo"]),
+    "mycoplasma": Campo("Mycoplasma hominis", OPCAO, opcoes=["Não testado", "Negativo", "Positivo"]),
+    "chlamydia": Campo("Chlamydia trachomatis (PCR)", OPCAO, opcoes=["Não testado", "Negativo", "Positivo"]),
+    "cultura_endometrial": Campo("Cultura endometrial", OPCAO, opcoes=["Não realizada", "Negativa", "Positiva"]),
+    "germe": Campo("Germe isolado:", TEXTO, padrao=""),
+    "microbioma": Campo("Análise de microbioma endometrial (ALICE/EMMA)", OPCAO, opcoes=["Não realizada", "Lactobacillus >90%", "Lactobacillus 50-90%", "Lactobacillus <50%"]),
+    "anticardiolipina_igg": Campo("Anticardiolipina IgG (GPL)", DECIMAL, minimo=0.0, maximo=200.0, padrao=0.0),
+    "anticardiolipina_igm": Campo("Anticardiolipina IgM (MPL)", DECIMAL, minimo=0.0, maximo=200.0, padrao=0.0),
+    "anticoagulante_lupico": Campo("Anticoagulante Lúpico", OPCAO, opcoes=["Não testado", "Negativo", "Positivo"]),
+    "anti_b2gp1_igg": Campo("Anti-β2-glicoproteína I IgG (U/mL)", DECIMAL, minimo=0.0, maximo=200.0, padrao=0.0),
+    "anti_b2gp1_igm": Campo("Anti-β2-glicoproteína I IgM (U/mL)", DECIMAL, minimo=0.0, maximo=200.0, padrao=0.0),
+    "fan": Campo("FAN (Fator Antinuclear)", OPCAO, opcoes=["Não testado", "Negativo", "1:80", "1:160", "1:320", ">1:320"]),
+    "anti_dna": Campo("Anti-DNA dupla hélice", OPCAO, opcoes=["Não testado", "Negativo", "Positivo"]),
+    "nk_cells": Campo("Células NK periféricas (CD56+CD16+) %", DECIMAL, minimo=0.0, maximo=50.0, padrao=12.0),
+    "nk_endometrial": Campo("NK endometriais (CD56+)", OPCAO, opcoes=["Não testado", "Normal (<5%)", "Levemente elevado (5-10%)", "Moderadamente elevado (10-15%)", "Muito elevado (>15%)"]),
+    "tsh": Campo("TSH (mUI/L)", DECIMAL, minimo=0.0, maximo=10.0, padrao=2.5),
+    "t4_livre": Campo("T4 livre (ng/dL)", DECIMAL, minimo=0.0, maximo=3.0, padrao=1.0),
+    "anti_tpo": Campo("Anti-TPO (antitireoperoxidase)", OPCAO, opcoes=["Não testado", "Negativo (<35)", "Positivo (35-100)", "Muito elevado (>100)"]),
+    "anti_tg": Campo("Anti-tireoglobulina", OPCAO, opcoes=["Não testado", "Negativo", "Positivo"]),
+    "ultrassom": Campo("Ultrassom transvaginal 3D", BOOLEANO, padrao=False),
+    "histeroscopia_realizada": Campo("Histeroscopia diagnóstica", BOOLEANO, padrao=False),
+    "histerossalpingografia": Campo("Histerossalpingografia", BOOLEANO, padrao=False),
+    "ressonancia": Campo("Ressonância magnética pélvica", BOOLEANO, padrao=False),
+    "alteracoes": Campo("Selecione todas as alterações encontradas:", MULTIPLO, opcoes=OPCOES_ACHADOS, padrao=[]),
+    "espessura_endometrial": Campo("Espessura endometrial máxima (mm)", DECIMAL, minimo=0.0, maximo=20.0, padrao=9.0, passo=0.5),
+    "padrao_endometrial": Campo("Padrão endometrial no ultrassom", OPCAO, opcoes=["Trilaminar (ideal)", "Homogêneo", "Irregular/heterogêneo"]),
+    "fluxo_endometrial": Campo("Fluxo sanguíneo endometrial (Doppler)", OPCAO, opcoes=["Não avaliado", "Adequado", "Reduzido"]),
+    "era_test": Campo("ERA Test (Endometrial Receptivity Array)", OPCAO, opcoes=["Não realizado", "Receptivo", "Pré-receptivo", "Pós-receptivo"]),
+    "vitamina_d": Campo("Vitamina D (ng/mL)", DECIMAL, minimo=0.0, maximo=100.0, padrao=30.0),
+    "prolactina": Campo("Prolactina (ng/mL)", DECIMAL, minimo=0.0, maximo=100.0, padrao=15.0),
+    "progesterona": Campo("Progesterona fase lútea (ng/mL)", DECIMAL, minimo=0.0, maximo=50.0, padrao=10.0),
+    "estradiol": Campo("Estradiol (pg/mL)", INTEIRO, minimo=0, maximo=500, padrao=200),
+    "glicemia": Campo("Glicemia de jejum (mg/dL)", INTEIRO, minimo=0, maximo=200, padrao=90),
+    "hba1c": Campo("Hemoglobina glicada (%)", DECIMAL, minimo=0.0, maximo=15.0, padrao=5.5),
+    "insulina": Campo("Insulina de jejum (µU/mL)", DECIMAL, minimo=0.0, maximo=50.0, padrao=10.0),
+    "pcr": Campo("Proteína C Reativa (mg/L)", DECIMAL, minimo=0.0, maximo=50.0, padrao=3.0),
+    "vhs": Campo("VHS (mm/h)", INTEIRO, minimo=0, maximo=100, padrao=10),
+    "homocisteina": Campo("Homocisteína (µmol/L)", DECIMAL, minimo=0.0, maximo=50.0, padrao=10.0),
+    "considerar_antioxidantes": Campo("Considerar suplementação antioxidante", BOOLEANO, padrao=False),
+    "espermograma": Campo("Espermograma", OPCAO, opcoes=["Não realizado", "Normal (OMS 2021)", "Oligozoospermia leve", "Oligozoospermia moderada/grave", "Astenozoospermia", "Teratozoospermia", "Oligoastenoteratozoospermia"]),
+    "fragmentacao_dna": Campo("Fragmentação de DNA espermático", OPCAO, opcoes=["Não realizado", "<15% (excelente)", "15-25% (bom)", "25-30% (limítrofe)", ">30% (alto)"]),
+}
+
+
+def entradas_padrao():
+    """Entradas com todos os widgets no valor inicial."""
+    return {nome: campo.valor_padrao() for nome, campo in CAMPOS.items()}
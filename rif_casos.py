@@ -0,0 +1,122 @@
+"""Arquivo local dos casos salvos.
+
+Cada clique em "Salvar Dados do Caso" grava um JSON em
+``<RIF_DADOS_DIR>/casos/AAAA/MM/<id_paciente>_<timestamp>.json``, em que
+``id_paciente`` vem do nº de prontuário informado na barra lateral. Os índices
+derivados (pendências, etc.) ficam em ``<RIF_DADOS_DIR>/indices``.
+
+Vários processos do app podem usar o mesmo diretório: arquivos são gravados de
+forma atômica e leituras-modificações-gravações de arquivos compartilhados
+ficam dentro de ``bloqueio(nome)``.
+"""
+
+import json
+import os
+import re
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DIRETORIO_DADOS = Path(os.environ.get("RIF_DADOS_DIR", "dados_rif"))
+DIRETORIO_CASOS = DIRETORIO_DADOS / "casos"
+DIRETORIO_INDICES = DIRETORIO_DADOS / "indices"
+
+DIRETORIO_TRAVAS = DIRETORIO_DADOS / "travas"
+
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+
+def id_paciente(prontuario):
+    """Identificador estável da paciente a partir do nº de prontuário, ou None se vazio.
+
+    O nome não serve de chave: homônimas teriam o mesmo identificador e
+    misturariam histórico, auditoria e exames.
+    """
+    texto = unicodedata.normalize("NFKD", prontuario or "").encode("ascii", "ignore").decode()
+    texto = re.sub(r"[^a-z0-9]+", "_", texto.lower()).strip("_")
+    return texto or None
+
+
+def gravar_json(caminho, dados):
+    """Grava JSON de forma atômica (arquivo temporário + rename)."""
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name(f"{caminho.name}.{os.getpid()}.tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, indent=2, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def gravar_npz(caminho, colunas):
+    """Grava matrizes NumPy num ``.npz`` de forma atômica (temporário por processo + rename)."""
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name(f"{caminho.name}.{os.getpid()}.tmp")
+    # por arquivo aberto, para ``np.savez`` não acrescentar ".npz" ao nome
+    with open(temporario, "wb") as f:
+        np.savez(f, **colunas)
+    os.replace(temporario, caminho)
+
+
+@contextmanager
+def bloqueio(nome):
+    """Trava exclusiva entre processos e threads, por nome (ex.: "indices")."""
+    DIRETORIO_TRAVAS.mkdir(parents=True, exist_ok=True)
+    with open(DIRETORIO_TRAVAS / f"{nome}.lock", "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def versao_arquivo(*caminhos):
+    """Instantes de modificação dos arquivos (0 se não existir), para invalidar caches."""
+    versoes = []
+    for caminho in caminhos:
+        try:
+            versoes.append(Path(caminho).stat().st_mtime_ns)
+        except FileNotFoundError:
+            versoes.append(0)
+    return tuple(versoes)
+
+
+def salvar_caso(dados_caso):
+    """Grava o caso no arquivo e devolve o caminho do JSON."""
+    data = datetime.strptime(dados_caso["data_avaliacao"], FORMATO_DATA)
+    caminho = (DIRETORIO_CASOS / f"{data:%Y}" / f"{data:%m}"
+               / f"{dados_caso['id_paciente']}_{data:%Y%m%d%H%M%S}.json")
+    gravar_json(caminho, dados_caso)
+    return caminho
+
+
+def iterar_casos():
+    """Percorre todos os casos salvos em ordem cronológica de gravação."""
+    for caminho in sorted(DIRETORIO_CASOS.glob("*/*/*.json")):
+        with open(caminho, encoding="utf-8") as f:
+            yield json.load(f)
+
+
+def ultimos_casos():
+    """Caso mais recente de cada paciente: {id_paciente: dados_caso}."""
+    ultimos = {}
+    for caso in iterar_casos():
+        ultimos[caso["id_paciente"]] = caso
+    return ultimos
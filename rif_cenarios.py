@@ -0,0 +1,57 @@
+"""Cenários "e se...?" sobre o caso em avaliação.
+
+Cada cenário é um conjunto de sobrescritas das entradas; o valor pode ser fixo
+ou uma função das entradas originais. Todas as variantes (mais o caso atual)
+são avaliadas numa única chamada a ``avaliar_lote``.
+"""
+
+from rif_achados import MASCARA_HIDROSSALPINGE, BIT, achados_de
+from rif_regras import avaliar_lote
+
+NOME_CASO_ATUAL = "Caso atual"
+
+
+def _sem_hidrossalpinge(e):
+    return [a.value for a in achados_de(e["alteracoes"]) if not BIT[a] & MASCARA_HIDROSSALPINGE]
+
+
+def _infeccao_tratada(campo):
+    return lambda e: "Negativo" if e[campo] == "Positivo" else e[campo]
+
+
+CENARIOS = {
+    "Tireoide tratada (TSH 2.0)": {"tsh": 2.0},
+    "CD138 de controle negativa": {"biopsia_endometrial": "Negativa (<5 células)"},
+    "Adicionar PGT-A": {"pgt_a": True},
+    "Vitamina D normalizada (35 ng/mL)": {"vitamina_d": 35.0},
+    "Resistência insulínica controlada (insulina 5)": {"insulina": 5.0},
+    "Infecções genitais tratadas": {campo: _infeccao_tratada(campo)
+                                    for campo in ("ureaplasma", "mycoplasma", "chlamydia")},
+    "Salpingectomia realizada": {"alteracoes": _sem_hidrossalpinge},
+}
+
+
+def montar_variante(entradas, sobrescritas):
+    variante = dict(entradas)
+    for campo, valor in sobrescritas.items():
+        variante[campo] = valor(entradas) if callable(valor) else valor
+    return variante
+
+
+def avaliar_cenarios(entradas, cenarios):
+    """Avalia o caso atual e os ``cenarios`` ({nome: sobrescritas}) de uma vez.
+
+    Devolve [(nome, resultado)], com o caso atual na primeira posição.
+    """
+    nomes = [NOME_CASO_ATUAL] + list(cenarios)
+    variantes = [entradas] + [montar_variante(entradas, s) for s in cenarios.values()]
+    return list(zip(nomes, avaliar_lote(variantes)))
+
+
+def diferencas(base, resultado, chave):
+    """Itens de ``resultado[chave]`` novos e resolvidos em relação a ``base``."""
+    antes, depois = base[chave], resultado[chave]
+    return {
+        "novos": [item for item in depois if item not in antes],
+        "resolvidos": [item for item in antes if item not in depois],
+    }
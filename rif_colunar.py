@@ -0,0 +1,169 @@
+"""Arquivo colunar (Parquet) dos casos para auditoria e pesquisa.
+
+A exportação lê o arquivo JSON mês a mês e grava uma partição Parquet por mês
+em ``<RIF_DADOS_DIR>/colunar/ano=AAAA/mes=MM/casos.parquet``, com uma coluna
+por campo de entrada e as listas ``alertas_criticos``/``recomendacoes`` como
+colunas ``list<string>``. O esquema de cada partição vem de ``ESQUEMA`` (campos
+de ``rif_campos.CAMPOS``), não do primeiro caso do mês: casos antigos sem um
+campo novo ficam com nulo nele. Só os meses alterados desde a última
+exportação são regravados.
+
+A leitura usa ``pyarrow.dataset`` sobre um sistema de arquivos com mmap,
+projeta apenas as colunas pedidas e descarta partições pelo filtro de ano/mês.
+
+Uso:
+    python rif_colunar.py exportar
+    python rif_colunar.py alertas HIDROSSALPINGE --ano 2025
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from rif_campos import BOOLEANO, CAMPOS, DECIMAL, INTEIRO, MULTIPLO
+from rif_casos import DIRETORIO_CASOS, DIRETORIO_DADOS, FORMATO_DATA
+
+DIRETORIO_COLUNAR = DIRETORIO_DADOS / "colunar"
+NOME_PARTICAO = "casos.parquet"
+
+TIPOS_ARROW = {
+    INTEIRO: pa.int64(),
+    DECIMAL: pa.float64(),
+    BOOLEANO: pa.bool_(),
+    MULTIPLO: pa.list_(pa.string()),
+}
+
+# Metadados + um campo por entrada do formulário + listas de saída
+ESQUEMA = pa.schema(
+    [("id_paciente", pa.string()), ("nome", pa.string()), ("data_avaliacao", pa.string())]
+    + [(nome, TIPOS_ARROW.get(campo.tipo, pa.string())) for nome, campo in CAMPOS.items()]
+    + [("alertas_criticos", pa.list_(pa.string())), ("recomendacoes", pa.list_(pa.string()))]
+)
+
+
+class ExportacaoAusente(FileNotFoundError):
+    """Nenhuma partição Parquet no diretório pedido."""
+
+
+def linha_caso(caso):
+    """Achata um caso salvo numa linha: metadados + entradas + listas de saída."""
+    linha = {
+        "id_paciente": caso["id_paciente"],
+        "nome": caso["nome"],
+        "data_avaliacao": caso["data_avaliacao"],
+    }
+    linha.update(caso["entradas"])
+    linha["alertas_criticos"] = caso["alertas_criticos"]
+    linha["recomendacoes"] = caso["recomendacoes"]
+    return linha
+
+
+def tabela_mes(diretorio_mes):
+    linhas = []
+    for caminho in sorted(Path(diretorio_mes).glob("*.json")):
+        with open(caminho, encoding="utf-8") as f:
+            linhas.append(linha_caso(json.load(f)))
+    tabela = pa.Table.from_pylist(linhas, schema=ESQUEMA)
+    datas = pc.strptime(tabela["data_avaliacao"], format=FORMATO_DATA, unit="s")
+    return tabela.set_column(tabela.schema.get_field_index("data_avaliacao"), "data_avaliacao", datas)
+
+
+def exportar(destino=DIRETORIO_COLUNAR, apenas_alterados=True):
+    """Exporta o arquivo JSON para Parquet particionado; devolve as partições gravadas."""
+    destino = Path(destino)
+    gravadas = []
+    for diretorio_mes in sorted(DIRETORIO_CASOS.glob("*/*")):
+        ano, mes = diretorio_mes.parent.name, diretorio_mes.name
+        particao = destino / f"ano={ano}" / f"mes={mes}" / NOME_PARTICAO
+        arquivos = list(diretorio_mes.glob("*.json"))
+        if not arquivos:
+            continue
+        if apenas_alterados and particao.exists():
+            modificado = max(p.stat().st_mtime for p in arquivos)
+            if modificado <= particao.stat().st_mtime:
+                continue
+        particao.parent.mkdir(parents=True, exist_ok=True)
+        temporario = particao.with_name(f"{NOME_PARTICAO}.{os.getpid()}.tmp")
+        pq.write_table(tabela_mes(diretorio_mes), temporario, compression="zstd")
+        temporario.replace(particao)
+        gravadas.append(particao)
+    return gravadas
+
+
+def abrir(origem=DIRETORIO_COLUNAR):
+    """Dataset particionado por ano/mês, lido via memory map.
+
+    O esquema é a união dos esquemas das partições, para que campos
+    acrescentados ao formulário depois apareçam como nulos nos meses antigos.
+    Sem nenhuma partição (``exportar`` ainda não rodou), levanta
+    ``ExportacaoAusente``.
+    """
+    argumentos = dict(
+        format="parquet",
+        partitioning="hive",
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+    )
+    origem = Path(origem).resolve()
+    if not any(origem.glob(f"ano=*/mes=*/{NOME_PARTICAO}")):
+        raise ExportacaoAusente(f"nenhuma exportação Parquet em {origem}; "
+                                "rode `python rif_colunar.py exportar` primeiro")
+    origem = str(origem)
+    dataset = ds.dataset(origem, **argumentos)
+    esquema = pa.unify_schemas([f.physical_schema for f in dataset.get_fragments()]
+                               + [dataset.partitioning.schema])
+    return ds.dataset(origem, schema=esquema, **argumentos)
+
+
+def ler(colunas, ano=None, mes=None, origem=DIRETORIO_COLUNAR):
+    """Lê só ``colunas``, opcionalmente restrito a um ano/mês."""
+    filtro = None
+    if ano is not None:
+        filtro = ds.field("ano") == int(ano)
+    if mes is not None:
+        filtro_mes = ds.field("mes") == int(mes)
+        filtro = filtro_mes if filtro is None else filtro & filtro_mes
+    return abrir(origem).to_table(columns=colunas, filter=filtro)
+
+
+def contar_casos_com(coluna, termo, ano=None, mes=None, origem=DIRETORIO_COLUNAR):
+    """Número de casos cuja lista ``coluna`` tem algum item contendo ``termo``."""
+    tabela = ler([coluna], ano=ano, mes=mes, origem=origem)
+    listas = tabela[coluna].combine_chunks()
+    itens = pc.list_flatten(listas)
+    casa = pc.match_substring(itens, termo, ignore_case=True)
+    casos = pc.filter(pc.list_parent_indices(listas), casa)
+    return len(pc.unique(casos))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arquivo colunar dos casos RIF")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    exp = sub.add_parser("exportar", help="exporta o arquivo JSON para Parquet")
+    exp.add_argument("--destino", default=str(DIRETORIO_COLUNAR))
+    exp.add_argument("--tudo", action="store_true", help="regrava todas as partições")
+    alr = sub.add_parser("alertas", help="conta casos com um alerta crítico")
+    alr.add_argument("termo")
+    alr.add_argument("--ano", type=int)
+    alr.add_argument("--mes", type=int)
+    args = parser.parse_args()
+
+    if args.comando == "exportar":
+        for particao in exportar(args.destino, apenas_alterados=not args.tudo):
+            print(particao)
+    else:
+        try:
+            total = contar_casos_com("alertas_criticos", args.termo, ano=args.ano, mes=args.mes)
+        except ExportacaoAusente as erro:
+            parser.exit(1, f"{erro}\n")
+        print(total)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Cronograma de tratamento até a transferência embrionária.
+
+Transforma as intervenções indicadas para um caso em etapas com duração e
+dependências, e calcula a data mais precoce em que a transferência é segura.
+As esperas usam o limite superior de cada intervalo do protocolo (ex.:
+"aguardar 1-2 ciclos" -> 2 ciclos). ``planejar_lote`` agenda muitas pacientes
+de uma vez respeitando a capacidade diária do centro cirúrgico e de
+transferências.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from rif_achados import CATALOGO, achados_de
+from rif_regras import BIOPSIA_POSITIVA, FRAGMENTACAO_ELEVADA, calcular_homa_ir
+
+DIAS_CICLO = 28
+DIAS_MES = 30
+DIAS_PREPARO_ENDOMETRIAL = 20
+
+RECURSO_CIRURGIA = "centro_cirurgico"
+RECURSO_TRANSFERENCIA = "transferencia"
+
+
+@dataclass(frozen=True)
+class Etapa:
+    chave: str
+    descricao: str
+    duracao_dias: int
+    depende_de: tuple[str, ...] = ()
+    recurso: str | None = None
+
+
+@dataclass(frozen=True)
+class EtapaAgendada:
+    etapa: Etapa
+    inicio: object  # datetime.date
+    fim: object
+
+
+@dataclass(frozen=True)
+class Cronograma:
+    etapas: list
+    data_transferencia: object
+
+    def como_linhas(self):
+        return [
+            {"Etapa": e.etapa.descricao, "Início": e.inicio, "Fim": e.fim,
+             "Duração (dias)": e.etapa.duracao_dias}
+            for e in self.etapas
+        ]
+
+
+def intervencoes_do_caso(entradas):
+    """Etapas de tratamento indicadas pelas entradas de um caso avaliado."""
+    etapas = []
+    pre_cirurgia = []
+
+    # Endometrite crônica: antibióticos -> probióticos -> biópsia de controle
+    if entradas["biopsia_endometrial"] in BIOPSIA_POSITIVA:
+        etapas += [
+            Etapa("antibioticos_endometrite", "Antibioticoterapia (endometrite crônica)", 14),
+            Etapa("probioticos_endometrite", "Probióticos vaginais", 30,
+                  ("antibioticos_endometrite",)),
+            Etapa("biopsia_controle", "Histeroscopia + biópsia CD138 de controle", 7,
+                  ("probioticos_endometrite",)),
+        ]
+        pre_cirurgia.append("antibioticos_endometrite")
+
+    # Infecções genitais: tratamento do casal + teste de cura 30 dias após
+    infeccoes = [entradas[k] for k in ("ureaplasma", "mycoplasma", "chlamydia")]
+    if "Positivo" in infeccoes:
+        dias_tratamento = 21 if entradas["chlamydia"] == "Positivo" else 14
+        etapas += [
+            Etapa("tratamento_infeccao", "Tratamento antimicrobiano do casal", dias_tratamento),
+            Etapa("teste_cura_infeccao", "Teste de cura", 30, ("tratamento_infeccao",)),
+        ]
+        pre_cirurgia.append("tratamento_infeccao")
+
+    # Cirurgias: agrupadas em um único tempo cirúrgico, espera pela maior recuperação
+    registros = [CATALOGO[a] for a in achados_de(entradas["alteracoes"])]
+    cirurgias = [r for r in registros if r.cirurgia]
+    if cirurgias:
+        etapas += [
+            Etapa("cirurgia", " + ".join(r.cirurgia for r in cirurgias), 1,
+                  tuple(pre_cirurgia), RECURSO_CIRURGIA),
+            Etapa("recuperacao_cirurgica", "Recuperação pós-operatória",
+                  max(r.espera_dias[1] for r in cirurgias), ("cirurgia",)),
+        ]
+
+    # Análogo GnRH (adenomiose): após a cirurgia, se houver
+    clinicos = [r for r in registros if r.tratamento_clinico]
+    if clinicos:
+        depende = ("cirurgia",) if cirurgias else ()
+        etapas.append(Etapa("gnrh", clinicos[0].tratamento_clinico,
+                            max(r.espera_dias[1] for r in clinicos), depende))
+
+    homa_ir = calcular_homa_ir(entradas)
+    if homa_ir is not None and homa_ir > 2.5:
+        etapas.append(Etapa("metformina", "Metformina (mínimo 2 meses)", 2 * DIAS_MES))
+
+    if entradas["fragmentacao_dna"] in FRAGMENTACAO_ELEVADA:
+        etapas.append(Etapa("antioxidantes_masculinos", "Antioxidantes (parceiro)", 3 * DIAS_MES))
+
+    etapas.append(Etapa("preparo_endometrial", "Preparo endometrial", DIAS_PREPARO_ENDOMETRIAL,
+                        tuple(e.chave for e in etapas)))
+    etapas.append(Etapa("transferencia", "Transferência embrionária", 0,
+                        ("preparo_endometrial",), RECURSO_TRANSFERENCIA))
+    return etapas
+
+
+def _ordem_topologica(etapas):
+    por_chave = {e.chave: e for e in etapas}
+    pendentes = {e.chave: set(e.depende_de) for e in etapas}
+    for chave, deps in pendentes.items():
+        faltando = deps - por_chave.keys()
+        if faltando:
+            raise ValueError(f"Etapa '{chave}' depende de etapas inexistentes: {sorted(faltando)}")
+
+    ordem = []
+    while pendentes:
+        prontas = [c for c, deps in pendentes.items() if not deps]
+        if not prontas:
+            raise ValueError(f"Dependência circular entre etapas: {sorted(pendentes)}")
+        for chave in prontas:
+            ordem.append(por_chave[chave])
+            del pendentes[chave]
+        for deps in pendentes.values():
+            deps.difference_update(prontas)
+    return ordem
+
+
+def planejar(etapas, data_inicio, reservar=None):
+    """Agenda as etapas a partir de ``data_inicio``.
+
+    ``reservar(recurso, data)`` é chamado para etapas que ocupam um recurso e
+    devolve a primeira data disponível a partir de ``data``.
+    """
+    fim = {}
+    agendadas = []
+    data_transferencia = None
+    for etapa in _ordem_topologica(etapas):
+        inicio = max([data_inicio] + [fim[d] for d in etapa.depende_de])
+        if reservar is not None and etapa.recurso:
+            inicio = reservar(etapa.recurso, inicio)
+        fim[etapa.chave] = inicio + timedelta(days=etapa.duracao_dias)
+        agendadas.append(EtapaAgendada(etapa, inicio, fim[etapa.chave]))
+        if etapa.chave == "transferencia":
+            data_transferencia = inicio
+    return Cronograma(agendadas, data_transferencia)
+
+
+def planejar_lote(casos, data_inicio, cirurgias_por_dia=4, transferencias_por_dia=6):
+    """Agenda várias pacientes compartilhando a capacidade diária.
+
+    ``casos`` é um dicionário {id_paciente: entradas}; a ordem de iteração é a
+    prioridade de alocação das vagas.
+    """
+    capacidade = {RECURSO_CIRURGIA: cirurgias_por_dia, RECURSO_TRANSFERENCIA: transferencias_por_dia}
+    ocupacao = defaultdict(int)
+
+    def reservar(recurso, dia):
+        while ocupacao[(recurso, dia)] >= capacidade[recurso]:
+            dia += timedelta(days=1)
+        ocupacao[(recurso, dia)] += 1
+        return dia
+
+    return {pid: planejar(intervencoes_do_caso(entradas), data_inicio, reservar)
+            for pid, entradas in casos.items()}
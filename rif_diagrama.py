@@ -0,0 +1,185 @@
+"""Diagrama de decisão compilado para as condições sobre campos categóricos.
+
+Cada condição (ex.: "fator V ou protrombina alterados") lê um ou mais campos
+de selectbox e liga um bit. ``compilar`` junta todas num único diagrama de
+decisão multivalorado, ordenado e reduzido, sobre os códigos inteiros das
+opções (posição em ``rif_campos.CAMPOS[campo].opcoes``):
+
+- cada nó testa um campo e tem um arco por opção;
+- cada arco carrega os bits das condições decididas naquele campo, de modo que
+  condições independentes não multiplicam o número de nós;
+- nós equivalentes são compartilhados (tabela única) e nós cujos arcos são
+  todos iguais são eliminados; bits comuns a todos os arcos sobem para o pai.
+
+Um caso é avaliado por uma caminhada da raiz até o terminal, juntando (OU) os
+bits dos arcos percorridos. Uma coorte vira uma matriz de códigos e é avaliada
+com indexação de arrays, um nível do diagrama por vez.
+
+Uso (tamanho do diagrama e desempenho):
+    python rif_diagrama.py -n 1000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from rif_campos import CAMPOS
+
+TERMINAL = 0
+
+
+class Diagrama:
+    def __init__(self, campos, nomes, variavel, filhos, bits, raiz, bits_raiz):
+        self.campos = campos  # ordem das variáveis (colunas da matriz de códigos)
+        self.nomes = nomes  # nome da condição de cada bit
+        self.bit = {nome: 1 << i for i, nome in enumerate(nomes)}
+        self.variavel = variavel  # nó -> coluna testada (-1 no terminal)
+        self.filhos = filhos  # (nós, máximo de opções) -> nó seguinte
+        self.bits = bits  # (nós, máximo de opções) -> bits ligados pelo arco
+        self.raiz = raiz
+        self.bits_raiz = bits_raiz
+        self._codigo = {campo: {opcao: i for i, opcao in enumerate(CAMPOS[campo].opcoes)}
+                        for campo in campos}
+        # Para a caminhada de um caso: campo de cada nó e arcos indexados pela própria
+        # opção (indexar ndarray elemento a elemento é lento)
+        self._campo_no = [campos[v] if v >= 0 else None for v in variavel.tolist()]
+        self._arcos = [{opcao: (int(bits[no, i]), int(filhos[no, i]))
+                        for i, opcao in enumerate(CAMPOS[campo].opcoes)} if campo else None
+                       for no, campo in enumerate(self._campo_no)]
+
+    def __len__(self):
+        """Nós internos."""
+        return len(self.variavel) - 1
+
+    def codigos(self, e):
+        return [self._codigo[campo][e[campo]] for campo in self.campos]
+
+    def matriz_codigos(self, lista_entradas):
+        """Matriz (n, len(campos)) de códigos de uma lista de dicionários de entradas."""
+        linhas = [self.codigos(e) for e in lista_entradas]
+        return np.array(linhas, dtype=np.int8).reshape(len(linhas), len(self.campos))
+
+    def avaliar(self, e):
+        """Bits das condições verdadeiras para um dicionário de entradas."""
+        campo_no, arcos = self._campo_no, self._arcos
+        no, bits = self.raiz, self.bits_raiz
+        while no != TERMINAL:
+            bits_arco, no = arcos[no][e[campo_no[no]]]
+            bits |= bits_arco
+        return bits
+
+    def avaliar_coorte(self, codigos):
+        """Bits (uint32) de cada linha de uma matriz de códigos."""
+        codigos = np.asarray(codigos)
+        n = len(codigos)
+        nos = np.full(n, self.raiz, dtype=np.int32)
+        bits = np.full(n, self.bits_raiz, dtype=np.uint32)
+        ativos = np.flatnonzero(nos != TERMINAL)
+        while len(ativos):
+            atuais = nos[ativos]
+            opcoes = codigos[ativos, self.variavel[atuais]]
+            bits[ativos] |= self.bits[atuais, opcoes]
+            nos[ativos] = self.filhos[atuais, opcoes]
+            ativos = ativos[nos[ativos] != TERMINAL]
+        return bits
+
+    def mascara_coorte(self, bits, nome):
+        """Vetor booleano: a condição ``nome`` é verdadeira em cada linha."""
+        return (bits & self.bit[nome]) != 0
+
+
+def compilar(condicoes, campos):
+    """Compila {nome: (campos lidos, predicado(*valores))} na ordem de variáveis ``campos``.
+
+    Campos relacionados devem ficar próximos em ``campos``: enquanto uma
+    condição não termina de ser lida, os códigos já vistos dela distinguem nós.
+    """
+    nomes = list(condicoes)
+    if len(nomes) > 32:
+        raise ValueError("no máximo 32 condições por diagrama")
+    nivel = {campo: i for i, campo in enumerate(campos)}
+    # condições decididas em cada nível (quando o último campo delas é lido)
+    decididas = [[] for _ in campos]
+    for i, nome in enumerate(nomes):
+        lidos, predicado = condicoes[nome]
+        decididas[max(nivel[c] for c in lidos)].append((1 << i, lidos, predicado))
+    # campos já lidos que ainda importam depois de cada nível
+    pendentes = [set() for _ in range(len(campos) + 1)]
+    for lidos, _ in condicoes.values():
+        primeiro, ultimo = min(nivel[c] for c in lidos), max(nivel[c] for c in lidos)
+        for k in range(primeiro + 1, ultimo + 1):
+            pendentes[k].update(c for c in lidos if nivel[c] < k)
+
+    unicos = {}  # (variável, arcos) -> nó
+    variavel, arcos_por_no = [-1], [()]
+    memo = {}
+
+    def construir(k, estado):
+        """Arco (nó, bits) equivalente à função a partir do nível ``k``."""
+        if k == len(campos):
+            return TERMINAL, 0
+        chave = (k, estado)
+        if chave in memo:
+            return memo[chave]
+        campo = campos[k]
+        vistos = dict(estado)
+        arcos = []
+        for codigo, opcao in enumerate(CAMPOS[campo].opcoes):
+            vistos[campo] = opcao
+            bits = 0
+            for bit, lidos, predicado in decididas[k]:
+                if predicado(*(vistos[c] for c in lidos)):
+                    bits |= bit
+            proximo = tuple(sorted((c, v) for c, v in vistos.items() if c in pendentes[k + 1]))
+            filho, bits_filho = construir(k + 1, proximo)
+            arcos.append((filho, bits | bits_filho))
+        if len(set(arcos)) == 1:
+            resultado = arcos[0]
+        else:
+            comuns = arcos[0][1]
+            for _, bits in arcos:
+                comuns &= bits
+            arcos = tuple((filho, bits & ~comuns) for filho, bits in arcos)
+            no = unicos.get((k, arcos))
+            if no is None:
+                no = unicos[(k, arcos)] = len(variavel)
+                variavel.append(k)
+                arcos_por_no.append(arcos)
+            resultado = (no, comuns)
+        memo[chave] = resultado
+        return resultado
+
+    raiz, bits_raiz = construir(0, ())
+    largura = max(len(CAMPOS[c].opcoes) for c in campos)
+    filhos = np.zeros((len(variavel), largura), dtype=np.int32)
+    bits = np.zeros((len(variavel), largura), dtype=np.uint32)
+    for no, arcos in enumerate(arcos_por_no):
+        for codigo, (filho, bits_arco) in enumerate(arcos):
+            filhos[no, codigo] = filho
+            bits[no, codigo] = bits_arco
+    return Diagrama(list(campos), nomes, np.array(variavel, dtype=np.int32), filhos, bits, raiz, bits_raiz)
+
+
+def main():
+    from rif_regras import DIAGRAMA_CATEGORICO as diagrama
+
+    parser = argparse.ArgumentParser(description="Diagrama de decisão das condições categóricas RIF")
+    parser.add_argument("-n", type=int, default=1_000_000, help="casos sintéticos")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{len(diagrama.nomes)} condições sobre {len(diagrama.campos)} campos: {len(diagrama)} nós")
+    rng = np.random.default_rng(args.semente)
+    codigos = np.column_stack([rng.integers(0, len(CAMPOS[c].opcoes), args.n, dtype=np.int8)
+                               for c in diagrama.campos])
+    inicio = time.perf_counter()
+    bits = diagrama.avaliar_coorte(codigos)
+    segundos = time.perf_counter() - inicio
+    print(f"coorte: {args.n} casos em {1000 * segundos:.0f} ms ({args.n / segundos / 1e6:.1f} milhões/s)")
+    for nome in diagrama.nomes:
+        print(f"  {nome}: {diagrama.mascara_coorte(bits, nome).mean():.1%}")
+
+
+if __name__ == "__main__":
+    main()
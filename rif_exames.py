@@ -0,0 +1,248 @@
+"""Séries temporais dos exames laboratoriais por paciente.
+
+Cada paciente tem um arquivo ``<RIF_DADOS_DIR>/exames/<id>.npz`` com, para
+cada analito de ``ANALITOS``, um vetor de datas (``datetime64[D]``) em ordem
+crescente e o vetor de valores correspondente, além dos marcos clínicos
+(ex.: início da levotiroxina). Como as datas estão ordenadas, as janelas de
+tempo saem de ``np.searchsorted`` e as consultas (persistência de anticorpos
+com ≥12 semanas de intervalo, tendência do TSH desde um marco) são operações
+vetoriais sobre as fatias, sem varrer o histórico.
+
+Cada caso salvo registra, na data da avaliação, só os exames informados nela
+(``rif_fhir.campos_informados``: campos preenchidos ou alterados desde o
+último caso salvo, como na exportação FHIR). Um valor que o formulário apenas
+manteve, seja o padrão do widget ou o resultado de uma visita anterior, não
+vira medida nova; uma medida repetida com o mesmo resultado entra pelo editor
+do histórico. Uma medida do mesmo analito na mesma data substitui a anterior.
+
+Ao salvar o caso, ``registrar_no_historico`` relê o arquivo sob
+``bloqueio("exames")`` e aplica só o que a sessão mudou em relação ao
+histórico que carregou no editor, preservando medidas gravadas por outro
+processo nesse meio-tempo.
+"""
+
+import numpy as np
+import pandas as pd
+
+from rif_casos import DIRETORIO_DADOS, FORMATO_DATA, bloqueio, gravar_npz
+from rif_fhir import campos_informados
+
+DIRETORIO_EXAMES = DIRETORIO_DADOS / "exames"
+
+# analito (campo das entradas) -> (rótulo, unidade)
+ANALITOS = {
+    "tsh": ("TSH", "mUI/L"),
+    "t4_livre": ("T4 livre", "ng/dL"),
+    "vitamina_d": ("Vitamina D", "ng/mL"),
+    "prolactina": ("Prolactina", "ng/mL"),
+    "glicemia": ("Glicemia de jejum", "mg/dL"),
+    "insulina": ("Insulina de jejum", "µU/mL"),
+    "hba1c": ("Hemoglobina glicada", "%"),
+    "pcr": ("Proteína C reativa", "mg/L"),
+    "homocisteina": ("Homocisteína", "µmol/L"),
+    "anticardiolipina_igg": ("Anticardiolipina IgG", "GPL"),
+    "anticardiolipina_igm": ("Anticardiolipina IgM", "MPL"),
+    "anti_b2gp1_igg": ("Anti-β2GP1 IgG", "U/mL"),
+    "anti_b2gp1_igm": ("Anti-β2GP1 IgM", "U/mL"),
+}
+ROTULO_ANALITO = {rotulo: analito for analito, (rotulo, _) in ANALITOS.items()}
+
+# Anticorpos dos critérios de SAF: positivo acima do mesmo limiar de ``rif_regras``
+ANTICORPOS_SAF = ["anticardiolipina_igg", "anticardiolipina_igm", "anti_b2gp1_igg", "anti_b2gp1_igm"]
+LIMIAR_SAF = 40.0
+SEMANAS_PERSISTENCIA = 12
+
+MARCOS = {"levotiroxina": "Início da levotiroxina"}
+PONTOS_GRAFICO = 200
+
+
+def _data(valor):
+    return np.datetime64(pd.Timestamp(valor).date(), "D")
+
+
+def formatar_data(data):
+    return pd.Timestamp(data).strftime("%d/%m/%Y")
+
+
+def caminho_exames(id_paciente):
+    return DIRETORIO_EXAMES / f"{id_paciente}.npz"
+
+
+class SeriesExames:
+    def __init__(self, series=None, marcos=None):
+        vazio = (np.array([], dtype="datetime64[D]"), np.array([], dtype=np.float64))
+        self.series = {analito: vazio for analito in ANALITOS}
+        self.series.update(series or {})
+        self.marcos = dict(marcos or {})  # nome -> datetime64[D]
+
+    # ---------- gravação ----------
+    def registrar(self, analito, data, valor):
+        """Insere a medida na posição ordenada (substitui a do mesmo dia)."""
+        datas, valores = self.series[analito]
+        data = _data(data)
+        i = np.searchsorted(datas, data)
+        if i < len(datas) and datas[i] == data:
+            valores = valores.copy()
+            valores[i] = valor
+        else:
+            datas, valores = np.insert(datas, i, data), np.insert(valores, i, valor)
+        self.series[analito] = (datas, valores)
+
+    def registrar_caso(self, dados_caso):
+        """Registra os exames informados num caso salvo, na data da avaliação."""
+        data = pd.to_datetime(dados_caso["data_avaliacao"], format=FORMATO_DATA)
+        for campo in campos_informados(dados_caso):
+            if campo in ANALITOS:
+                self.registrar(campo, data, float(dados_caso["entradas"][campo]))
+
+    def aplicar_edicoes(self, base, editado):
+        """Aplica a estas séries as diferenças entre ``base`` e ``editado``.
+
+        Medidas removidas no editor saem, as incluídas ou alteradas entram (ou
+        substituem a da mesma data); as demais ficam como estão.
+        """
+        for analito in ANALITOS:
+            antes = dict(zip(*base.series[analito]))
+            depois = dict(zip(*editado.series[analito]))
+            if antes == depois:
+                continue
+            atuais = dict(zip(*self.series[analito]))
+            for data in antes.keys() - depois.keys():
+                atuais.pop(data, None)
+            atuais.update({data: valor for data, valor in depois.items() if antes.get(data) != valor})
+            datas = np.array(sorted(atuais), dtype="datetime64[D]")
+            self.series[analito] = (datas, np.array([atuais[data] for data in datas], dtype=np.float64))
+        for nome in MARCOS:
+            if base.marcos.get(nome) != editado.marcos.get(nome):
+                self.definir_marco(nome, editado.marcos.get(nome))
+
+    def marco(self, nome):
+        """Data (``datetime.date``) do marco, ou None."""
+        data = self.marcos.get(nome)
+        return None if data is None else pd.Timestamp(data).date()
+
+    def definir_marco(self, nome, data):
+        if data is None:
+            self.marcos.pop(nome, None)
+        else:
+            self.marcos[nome] = _data(data)
+
+    # ---------- consultas ----------
+    def __len__(self):
+        return sum(len(datas) for datas, _ in self.series.values())
+
+    def janela(self, analito, inicio=None, fim=None):
+        """(datas, valores) com inicio <= data <= fim (fatias, sem cópia)."""
+        datas, valores = self.series[analito]
+        a = 0 if inicio is None else np.searchsorted(datas, _data(inicio), side="left")
+        b = len(datas) if fim is None else np.searchsorted(datas, _data(fim), side="right")
+        return datas[a:b], valores[a:b]
+
+    def positivos_persistentes(self, analito, limiar=LIMIAR_SAF, semanas=SEMANAS_PERSISTENCIA):
+        """Primeiro par (data, data) de resultados > limiar com ≥``semanas`` de intervalo, ou None."""
+        datas, valores = self.series[analito]
+        positivas = datas[valores > limiar]
+        # para cada positivo, o primeiro positivo pelo menos ``semanas`` depois
+        seguintes = np.searchsorted(positivas, positivas + np.timedelta64(7 * semanas, "D"))
+        validos = np.flatnonzero(seguintes < len(positivas))
+        if not len(validos):
+            return None
+        i = validos[0]
+        return positivas[i], positivas[seguintes[i]]
+
+    def tendencia(self, analito, inicio=None, fim=None):
+        """Resumo da janela: nº de medidas, primeira e última, variação e inclinação por mês."""
+        datas, valores = self.janela(analito, inicio, fim)
+        if len(datas) < 2:
+            return None
+        dias = (datas - datas[0]).astype(np.float64)
+        inclinacao = np.polyfit(dias, valores, 1)[0] if dias[-1] > 0 else 0.0
+        return {
+            "medidas": len(datas),
+            "primeira": (datas[0], float(valores[0])),
+            "ultima": (datas[-1], float(valores[-1])),
+            "variacao": float(valores[-1] - valores[0]),
+            "por_mes": float(inclinacao * 30.44),
+        }
+
+    def reduzir(self, analito, pontos=PONTOS_GRAFICO, inicio=None, fim=None):
+        """Série da janela com no máximo ~``pontos`` pontos para gráfico.
+
+        Divide a janela em blocos consecutivos e mantém o mínimo e o máximo de
+        cada um (além da primeira e da última medida), preservando picos.
+        """
+        datas, valores = self.janela(analito, inicio, fim)
+        n = len(datas)
+        if n <= pontos:
+            return datas, valores
+        tamanho = -(-n // max(pontos // 2, 1))
+        blocos = -(-n // tamanho)
+        grade = np.full(blocos * tamanho, np.nan)
+        grade[:n] = valores
+        grade = grade.reshape(blocos, tamanho)
+        base = np.arange(blocos) * tamanho
+        indices = np.unique(np.concatenate([
+            base + np.nanargmin(grade, axis=1), base + np.nanargmax(grade, axis=1), [0, n - 1]]))
+        return datas[indices], valores[indices]
+
+    # ---------- editor ----------
+    def para_dataframe(self):
+        """Todas as medidas em formato longo (Data, Exame, Valor), da mais recente para a mais antiga."""
+        partes = [pd.DataFrame({"Data": datas, "Exame": ANALITOS[analito][0], "Valor": valores})
+                  for analito, (datas, valores) in self.series.items() if len(datas)]
+        if not partes:
+            return pd.DataFrame({"Data": pd.Series(dtype="datetime64[ns]"),
+                                 "Exame": pd.Series(dtype=str), "Valor": pd.Series(dtype=np.float64)})
+        df = pd.concat(partes, ignore_index=True).sort_values("Data", ascending=False, kind="stable")
+        df["Data"] = pd.to_datetime(df["Data"]).dt.date
+        return df.reset_index(drop=True)
+
+    @classmethod
+    def de_dataframe(cls, df, marcos=None):
+        """DataFrame do editor -> séries (linhas sem data, exame ou valor são descartadas)."""
+        df = df.dropna(subset=["Data", "Exame", "Valor"])
+        df = df[df["Exame"].isin(list(ROTULO_ANALITO))]
+        series = {}
+        for rotulo, grupo in df.groupby("Exame"):
+            datas = pd.to_datetime(grupo["Data"]).to_numpy().astype("datetime64[D]")
+            valores = grupo["Valor"].to_numpy(dtype=np.float64)
+            # ordenadas por data; na mesma data vale a última linha
+            datas, ultimas = np.unique(datas[::-1], return_index=True)
+            series[ROTULO_ANALITO[rotulo]] = (datas, valores[::-1][ultimas])
+        return cls(series, marcos)
+
+
+def carregar(id_paciente):
+    caminho = caminho_exames(id_paciente)
+    if not caminho.exists():
+        return SeriesExames()
+    with np.load(caminho) as dados:
+        series = {analito: (dados[f"{analito}__datas"], dados[f"{analito}__valores"])
+                  for analito in ANALITOS if f"{analito}__datas" in dados}
+        marcos = {nome: dados[f"marco__{nome}"][()] for nome in MARCOS if f"marco__{nome}" in dados}
+    return SeriesExames(series, marcos)
+
+
+def salvar(id_paciente, exames):
+    colunas = {}
+    for analito, (datas, valores) in exames.series.items():
+        colunas[f"{analito}__datas"] = datas
+        colunas[f"{analito}__valores"] = valores
+    for nome, data in exames.marcos.items():
+        colunas[f"marco__{nome}"] = np.datetime64(data, "D")
+    gravar_npz(caminho_exames(id_paciente), colunas)
+
+
+def registrar_no_historico(id_paciente, base, editado, dados_caso):
+    """Grava as edições da sessão e os exames do caso no histórico da paciente.
+
+    ``base`` é o histórico carregado no editor e ``editado`` o resultado das
+    edições. O arquivo é relido sob a trava, de modo que medidas gravadas por
+    outro processo depois da leitura não se perdem. Devolve o histórico gravado.
+    """
+    with bloqueio("exames"):
+        exames = carregar(id_paciente)
+        exames.aplicar_edicoes(base, editado)
+        exames.registrar_caso(dados_caso)
+        salvar(id_paciente, exames)
+    return exames
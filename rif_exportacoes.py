@@ -0,0 +1,274 @@
+"""Fila de exportações em segundo plano com cache dos artefatos em disco.
+
+Os pedidos de exportação (JSON do caso, pacote zip da paciente, FHIR NDJSON de
+toda a clínica) entram numa fila atendida por ``TRABALHADORES`` threads. Cada
+tarefa informa o progresso (0 a 1) enquanto roda, e a página apenas consulta o
+estado, sem travar o botão que fez o pedido.
+
+Os artefatos prontos ficam em ``<RIF_DADOS_DIR>/exportacoes/<chave><extensão>``.
+A chave é o hash do tipo, dos parâmetros e da versão dos dados de origem (os
+casos salvos e o histórico de transferências), de modo que um pedido repetido
+sobre os mesmos dados é servido direto do disco, sem nova tarefa. O mtime de
+cada arquivo marca o último acesso. Quando o total passa de ``LIMITE_CACHE``
+bytes, os artefatos usados há mais tempo são apagados.
+
+Para um tipo novo (ex.: o relatório em PDF), basta acrescentar um
+``Exportador`` a ``EXPORTADORES``.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from rif_casos import DIRETORIO_CASOS, DIRETORIO_DADOS, bloqueio, versao_arquivo
+from rif_fhir import exportar as exportar_fhir
+from rif_transferencias import DIRETORIO_TRANSFERENCIAS, carregar as carregar_transferencias, para_dataframe
+
+DIRETORIO_EXPORTACOES = DIRETORIO_DADOS / "exportacoes"
+LIMITE_CACHE = 512 * 1024 * 1024  # bytes
+TRABALHADORES = 2
+MAXIMO_TAREFAS = 500  # tarefas lembradas em memória (as mais antigas são esquecidas)
+
+NA_FILA = "na fila"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluída"
+FALHOU = "falhou"
+
+
+# ---------------------------------------------------------------------------
+# Exportadores: (parâmetros, destino, progresso) -> grava o artefato em destino
+# ---------------------------------------------------------------------------
+
+def _caminhos_casos(id_paciente=None):
+    if not id_paciente:
+        return sorted(DIRETORIO_CASOS.glob("*/*/*.json"))
+    # "hc_12_<data>" também casaria com o padrão de "hc_1"
+    return sorted(c for c in DIRETORIO_CASOS.glob(f"*/*/{id_paciente}_*.json")
+                  if c.stem.rsplit("_", 1)[0] == id_paciente)
+
+
+def _ler_casos(caminhos, progresso, inicio=0.0, fim=1.0):
+    """Lê os casos um a um, avançando o progresso de ``inicio`` até ``fim``."""
+    for i, caminho in enumerate(caminhos, 1):
+        with open(caminho, encoding="utf-8") as f:
+            yield json.load(f)
+        progresso(inicio + (fim - inicio) * i / len(caminhos))
+
+
+def _gravar_fhir_no_zip(pacote, caminhos, progresso, inicio=0.0, fim=1.0, pasta=""):
+    """Exporta os casos em FHIR NDJSON (gzip) e acrescenta os arquivos ao zip."""
+    with tempfile.TemporaryDirectory() as temporario:
+        exportar_fhir(temporario, _ler_casos(caminhos, progresso, inicio, fim))
+        for arquivo in sorted(Path(temporario).iterdir()):
+            # já comprimidos com gzip
+            pacote.write(arquivo, pasta + arquivo.name, compress_type=zipfile.ZIP_STORED)
+
+
+def _exportar_caso_json(parametros, destino, progresso):
+    with open(destino, "w", encoding="utf-8") as f:
+        json.dump(parametros["dados_caso"], f, indent=2, ensure_ascii=False)
+    progresso(1.0)
+
+
+def _exportar_pacote_paciente(parametros, destino, progresso):
+    """Zip com os casos salvos da paciente, as transferências (CSV) e o FHIR."""
+    id_paciente = parametros["id_paciente"]
+    caminhos = _caminhos_casos(id_paciente)
+    with zipfile.ZipFile(destino, "w", zipfile.ZIP_DEFLATED) as pacote:
+        for i, caminho in enumerate(caminhos, 1):
+            pacote.write(caminho, f"casos/{caminho.name}")
+            progresso(0.4 * i / len(caminhos))
+        transferencias = para_dataframe(carregar_transferencias(id_paciente))
+        pacote.writestr("transferencias.csv", transferencias.to_csv(index=False))
+        _gravar_fhir_no_zip(pacote, caminhos, progresso, 0.4, 1.0, pasta="fhir/")
+    progresso(1.0)
+
+
+def _exportar_fhir_clinica(parametros, destino, progresso):
+    with zipfile.ZipFile(destino, "w") as pacote:
+        _gravar_fhir_no_zip(pacote, _caminhos_casos(), progresso)
+    progresso(1.0)
+
+
+def _versao_casos(id_paciente=None):
+    """Resumo dos arquivos de caso existentes (cada gravação cria um arquivo novo)."""
+    nomes = "\n".join(str(c.relative_to(DIRETORIO_CASOS)) for c in _caminhos_casos(id_paciente))
+    return hashlib.sha256(nomes.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class Exportador:
+    descricao: str
+    extensao: str
+    mime: str
+    gerar: object  # (parametros, destino, progresso) -> None
+    versao: object = None  # parametros -> versão dos dados de origem, ou None
+
+
+EXPORTADORES = {
+    "caso_json": Exportador(
+        "JSON do caso", ".json", "application/json", _exportar_caso_json),
+    "pacote_paciente": Exportador(
+        "Pacote da paciente (casos, transferências e FHIR)", ".zip", "application/zip",
+        _exportar_pacote_paciente,
+        lambda p: [_versao_casos(p["id_paciente"]),
+                   versao_arquivo(DIRETORIO_TRANSFERENCIAS / f"{p['id_paciente']}.npz")]),
+    "fhir_clinica": Exportador(
+        "FHIR NDJSON de todos os casos", ".zip", "application/zip",
+        _exportar_fhir_clinica, lambda p: _versao_casos()),
+}
+
+
+def chave_exportacao(tipo, parametros):
+    exportador = EXPORTADORES[tipo]
+    origem = exportador.versao(parametros) if exportador.versao else None
+    texto = json.dumps([tipo, parametros, origem], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:32]
+
+
+# ---------------------------------------------------------------------------
+# Cache em disco com remoção LRU por tamanho total
+# ---------------------------------------------------------------------------
+
+class CacheExportacoes:
+    def __init__(self, diretorio=DIRETORIO_EXPORTACOES, limite=LIMITE_CACHE):
+        self.diretorio = Path(diretorio)
+        self.limite = limite
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+
+    def caminho(self, chave, extensao):
+        return self.diretorio / f"{chave}{extensao}"
+
+    def obter(self, chave, extensao):
+        """Caminho do artefato (marcando o acesso) ou None se não estiver no cache."""
+        caminho = self.caminho(chave, extensao)
+        try:
+            os.utime(caminho)
+        except FileNotFoundError:
+            return None
+        return caminho
+
+    def temporario(self, extensao):
+        return self.diretorio / f"{uuid.uuid4().hex}{extensao}.{os.getpid()}.tmp"
+
+    def guardar(self, chave, extensao, temporario):
+        """Move o artefato pronto para o cache e remove os menos usados se passar do limite."""
+        caminho = self.caminho(chave, extensao)
+        # Vários processos podem gravar e remover no mesmo diretório
+        with bloqueio("exportacoes"):
+            os.replace(temporario, caminho)
+            self._remover_excedente(manter=caminho)
+        return caminho
+
+    def _remover_excedente(self, manter):
+        arquivos = []
+        for item in self.diretorio.iterdir():
+            if item.is_file() and not item.name.endswith(".tmp"):
+                estado = item.stat()
+                arquivos.append((estado.st_mtime_ns, estado.st_size, item))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, item in sorted(arquivos):
+            if total <= self.limite:
+                break
+            if item != manter:
+                item.unlink(missing_ok=True)
+                total -= tamanho
+
+    def tamanho_total(self):
+        return sum(item.stat().st_size for item in self.diretorio.iterdir()
+                   if item.is_file() and not item.name.endswith(".tmp"))
+
+
+# ---------------------------------------------------------------------------
+# Fila de tarefas
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Tarefa:
+    id: str
+    tipo: str
+    chave: str
+    nome_arquivo: str
+    estado: str = NA_FILA
+    progresso: float = 0.0
+    caminho: Path = None
+    erro: str = None
+
+    @property
+    def terminada(self):
+        return self.estado in (CONCLUIDA, FALHOU)
+
+    @property
+    def exportador(self):
+        return EXPORTADORES[self.tipo]
+
+
+class FilaExportacoes:
+    def __init__(self, cache=None, trabalhadores=TRABALHADORES):
+        self.cache = cache or CacheExportacoes()
+        self._lock = threading.Lock()
+        self._tarefas = OrderedDict()  # id -> Tarefa
+        self._em_andamento = {}  # chave -> Tarefa (o mesmo pedido não roda duas vezes)
+        self._executor = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="exportacao")
+
+    def pedir(self, tipo, parametros, nome_arquivo):
+        """Enfileira uma exportação e devolve a Tarefa (já concluída se estiver no cache)."""
+        exportador = EXPORTADORES[tipo]
+        chave = chave_exportacao(tipo, parametros)
+        with self._lock:
+            if chave in self._em_andamento:
+                return self._em_andamento[chave]
+            tarefa = Tarefa(uuid.uuid4().hex, tipo, chave, nome_arquivo)
+            self._tarefas[tarefa.id] = tarefa
+            while len(self._tarefas) > MAXIMO_TAREFAS:
+                self._tarefas.popitem(last=False)
+            caminho = self.cache.obter(chave, exportador.extensao)
+            if caminho:
+                tarefa.estado, tarefa.progresso, tarefa.caminho = CONCLUIDA, 1.0, caminho
+                return tarefa
+            self._em_andamento[chave] = tarefa
+        self._executor.submit(self._executar, tarefa, parametros)
+        return tarefa
+
+    def tarefa(self, id_tarefa):
+        with self._lock:
+            return self._tarefas.get(id_tarefa)
+
+    def ler(self, tarefa):
+        """Conteúdo do artefato de uma tarefa concluída, ou None se já saiu do cache."""
+        caminho = self.cache.obter(tarefa.chave, tarefa.exportador.extensao)
+        if caminho is None:
+            return None
+        try:
+            return caminho.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _executar(self, tarefa, parametros):
+        exportador = tarefa.exportador
+        temporario = self.cache.temporario(exportador.extensao)
+        tarefa.estado = EXECUTANDO
+
+        def progresso(fracao):
+            tarefa.progresso = min(max(fracao, 0.0), 1.0)
+
+        try:
+            exportador.gerar(parametros, temporario, progresso)
+            tarefa.caminho = self.cache.guardar(tarefa.chave, exportador.extensao, temporario)
+            tarefa.progresso = 1.0
+            tarefa.estado = CONCLUIDA
+        except Exception as erro:
+            temporario.unlink(missing_ok=True)
+            tarefa.erro = f"{type(erro).__name__}: {erro}"
+            tarefa.estado = FALHOU
+        finally:
+            with self._lock:
+                self._em_andamento.pop(tarefa.chave, None)
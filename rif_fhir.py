@@ -0,0 +1,245 @@
+"""Exportação dos casos para FHIR R4 no formato bulk data (NDJSON + gzip).
+
+Cada caso salvo vira:
+- ``Patient`` (uma vez por paciente) com os dados da barra lateral;
+- ``Observation`` para idade, IMC e os exames das abas 3 e 5;
+- ``Condition`` para cada alerta crítico;
+- ``CarePlan`` com as fases do protocolo da aba 6 (cronograma, investigações
+  pendentes e recomendações).
+
+Os recursos são gerados um a um e gravados direto em
+``<destino>/<Tipo>.ndjson.gz``, sem montar o arquivo inteiro em memória.
+
+Os ids têm tamanho fixo: o do ``Patient`` é um hash do ``id_paciente`` e os
+demais recursos do caso usam esse hash, a data da avaliação e um contador.
+Só viram ``Observation`` numérica os exames informados na avaliação (ver
+``campos_informados``), não os valores que o formulário traz por padrão.
+
+Uso:
+    python rif_fhir.py [destino]
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+
+from rif_campos import CAMPOS
+from rif_casos import DIRETORIO_DADOS, FORMATO_DATA, iterar_casos
+from rif_cronograma import intervencoes_do_caso, planejar
+from rif_pendencias import INVESTIGACOES, investigacoes_pendentes
+
+DIRETORIO_FHIR = DIRETORIO_DADOS / "fhir"
+SISTEMA_LOCAL = "http://rif-protocol.app/fhir/CodeSystem/observacao"
+SISTEMA_PRONTUARIO = "http://rif-protocol.app/fhir/NamingSystem/prontuario"
+LOINC = "http://loinc.org"
+UCUM = "http://unitsofmeasure.org"
+TIPOS = ["Patient", "Observation", "Condition", "CarePlan"]
+
+# campo -> (código LOINC ou None, descrição, unidade UCUM)
+OBSERVACOES_NUMERICAS = {
+    "idade": ("30525-0", "Idade", "a"),
+    "imc": ("39156-5", "Índice de massa corporal", "kg/m2"),
+    "anticardiolipina_igg": ("3181-3", "Anticardiolipina IgG", "[GPL'U]"),
+    "anticardiolipina_igm": ("3182-1", "Anticardiolipina IgM", "[MPL'U]"),
+    "anti_b2gp1_igg": (None, "Anti-β2-glicoproteína I IgG", "U/mL"),
+    "anti_b2gp1_igm": (None, "Anti-β2-glicoproteína I IgM", "U/mL"),
+    "nk_cells": (None, "Células NK periféricas (CD56+CD16+)", "%"),
+    "tsh": ("3016-3", "TSH", "m[IU]/L"),
+    "t4_livre": ("3024-7", "T4 livre", "ng/dL"),
+    "vitamina_d": ("1989-3", "25-hidroxivitamina D", "ng/mL"),
+    "prolactina": ("2842-3", "Prolactina", "ng/mL"),
+    "progesterona": ("2839-9", "Progesterona", "ng/mL"),
+    "estradiol": ("2243-4", "Estradiol", "pg/mL"),
+    "glicemia": ("1558-6", "Glicemia de jejum", "mg/dL"),
+    "hba1c": ("4548-4", "Hemoglobina glicada", "%"),
+    "insulina": ("20448-7", "Insulina de jejum", "u[IU]/mL"),
+    "pcr": ("1988-5", "Proteína C reativa", "mg/L"),
+    "vhs": ("30341-2", "VHS", "mm/h"),
+    "homocisteina": ("13965-9", "Homocisteína", "umol/L"),
+}
+
+OBSERVACOES_CATEGORICAS = {
+    "anticoagulante_lupico": "Anticoagulante lúpico",
+    "fan": "FAN (fator antinuclear)",
+    "anti_dna": "Anti-DNA dupla hélice",
+    "nk_endometrial": "NK endometriais (CD56+)",
+    "anti_tpo": "Anti-TPO",
+    "anti_tg": "Anti-tireoglobulina",
+    "espermograma": "Espermograma",
+    "fragmentacao_dna": "Fragmentação de DNA espermático",
+}
+NAO_REALIZADO = ["Não testado", "Não realizado", "Não realizada"]
+
+# Campos numéricos cujo padrão do formulário (0) significa "não informado"
+CAMPOS_ZERO_AUSENTE = ["anticardiolipina_igg", "anticardiolipina_igm",
+                       "anti_b2gp1_igg", "anti_b2gp1_igm", "glicemia", "insulina"]
+
+
+def id_fhir(id_paciente):
+    """Id do ``Patient``: 20 caracteres base32 do SHA-1 do ``id_paciente``.
+
+    Ids FHIR aceitam só [A-Za-z0-9-.] e até 64 caracteres; cortar o
+    ``id_paciente`` juntaria pacientes com o mesmo começo.
+    """
+    resumo = hashlib.sha1(id_paciente.encode("utf-8")).digest()
+    return base64.b32encode(resumo).decode("ascii")[:20].lower()
+
+
+def campos_informados(caso):
+    """Campos de ``OBSERVACOES_NUMERICAS`` medidos nesta avaliação.
+
+    Casos salvos com ``exames_informados`` (campos preenchidos ou alterados no
+    formulário desde o último caso salvo) usam essa lista; nos mais antigos,
+    vale o valor diferente do padrão do formulário. Zero nos
+    ``CAMPOS_ZERO_AUSENTE`` nunca é medida.
+    """
+    e = caso["entradas"]
+    if "exames_informados" in caso:
+        campos = set(caso["exames_informados"])
+    else:
+        campos = {campo for campo in OBSERVACOES_NUMERICAS if e[campo] != CAMPOS[campo].valor_padrao()}
+    return [campo for campo in OBSERVACOES_NUMERICAS
+            if campo in campos and not (campo in CAMPOS_ZERO_AUSENTE and not e[campo])]
+
+
+def _codigo(campo, loinc, descricao):
+    codificacoes = [{"system": SISTEMA_LOCAL, "code": campo, "display": descricao}]
+    if loinc:
+        codificacoes.insert(0, {"system": LOINC, "code": loinc, "display": descricao})
+    return {"coding": codificacoes, "text": descricao}
+
+
+def recursos_do_caso(caso, pacientes_emitidos=None):
+    """Gera os recursos FHIR de um caso salvo, um de cada vez."""
+    pid = id_fhir(caso["id_paciente"])
+    e = caso["entradas"]
+    data = datetime.strptime(caso["data_avaliacao"], FORMATO_DATA)
+    momento = data.isoformat()
+    # Até 20 + 1 + 14 + 1 + 4 caracteres, bem abaixo do limite de 64
+    sufixo = f"{pid}-{data:%Y%m%d%H%M%S}"
+    paciente = {"reference": f"Patient/{pid}"}
+
+    if pacientes_emitidos is None or pid not in pacientes_emitidos:
+        if pacientes_emitidos is not None:
+            pacientes_emitidos.add(pid)
+        recurso = {
+            "resourceType": "Patient",
+            "id": pid,
+            "name": [{"text": caso["nome"] or "Não informado"}],
+            "gender": "female",
+        }
+        if caso.get("prontuario"):
+            recurso["identifier"] = [{"system": SISTEMA_PRONTUARIO, "value": caso["prontuario"]}]
+        yield recurso
+
+    observacoes = 0
+    for campo in campos_informados(caso):
+        loinc, descricao, unidade = OBSERVACOES_NUMERICAS[campo]
+        observacoes += 1
+        yield {
+            "resourceType": "Observation",
+            "id": f"{sufixo}-o{observacoes}",
+            "status": "final",
+            "code": _codigo(campo, loinc, descricao),
+            "subject": paciente,
+            "effectiveDateTime": momento,
+            "valueQuantity": {"value": e[campo], "unit": unidade, "system": UCUM, "code": unidade},
+        }
+
+    for campo, descricao in OBSERVACOES_CATEGORICAS.items():
+        if e[campo] in NAO_REALIZADO:
+            continue
+        observacoes += 1
+        yield {
+            "resourceType": "Observation",
+            "id": f"{sufixo}-o{observacoes}",
+            "status": "final",
+            "code": _codigo(campo, None, descricao),
+            "subject": paciente,
+            "effectiveDateTime": momento,
+            "valueString": e[campo],
+        }
+
+    for i, alerta in enumerate(caso["alertas_criticos"], 1):
+        yield {
+            "resourceType": "Condition",
+            "id": f"{sufixo}-c{i}",
+            "clinicalStatus": {"coding": [{
+                "system": "http://terminology.hl7.org/CodeSystem/condition-clinical",
+                "code": "active"}]},
+            "category": [{"coding": [{
+                "system": "http://terminology.hl7.org/CodeSystem/condition-category",
+                "code": "problem-list-item"}]}],
+            "code": {"text": alerta},
+            "subject": paciente,
+            "recordedDate": momento,
+        }
+
+    yield _plano_de_cuidado(caso, sufixo, paciente, data)
+
+
+def _plano_de_cuidado(caso, sufixo, paciente, data):
+    e = caso["entradas"]
+    atividades = []
+    for chave in investigacoes_pendentes(e):
+        atividades.append({"detail": {
+            "status": "not-started",
+            "description": f"Fase 1 (pré-ciclo) - Investigação pendente: {INVESTIGACOES[chave]}",
+        }})
+    for agendada in planejar(intervencoes_do_caso(e), data.date()).etapas:
+        atividades.append({"detail": {
+            "status": "scheduled",
+            "description": agendada.etapa.descricao,
+            "scheduledPeriod": {"start": agendada.inicio.isoformat(), "end": agendada.fim.isoformat()},
+        }})
+    for recomendacao in caso["recomendacoes"]:
+        atividades.append({"detail": {"status": "not-started", "description": recomendacao}})
+    return {
+        "resourceType": "CarePlan",
+        "id": f"{sufixo}-p",
+        "status": "active",
+        "intent": "plan",
+        "title": "Protocolo personalizado RIF",
+        "subject": paciente,
+        "created": data.isoformat(),
+        "activity": atividades,
+    }
+
+
+def exportar(destino=DIRETORIO_FHIR, casos=None, nivel_compressao=3):
+    """Grava ``<Tipo>.ndjson.gz`` em ``destino``; devolve a contagem por tipo."""
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    casos = iterar_casos() if casos is None else casos
+    arquivos = {tipo: gzip.open(destino / f"{tipo}.ndjson.gz", "wt", encoding="utf-8",
+                                compresslevel=nivel_compressao)
+                for tipo in TIPOS}
+    contagem = dict.fromkeys(TIPOS, 0)
+    pacientes_emitidos = set()
+    try:
+        for caso in casos:
+            for recurso in recursos_do_caso(caso, pacientes_emitidos):
+                tipo = recurso["resourceType"]
+                arquivos[tipo].write(json.dumps(recurso, ensure_ascii=False, separators=(",", ":")))
+                arquivos[tipo].write("\n")
+                contagem[tipo] += 1
+    finally:
+        for arquivo in arquivos.values():
+            arquivo.close()
+    return contagem
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportação FHIR NDJSON dos casos RIF")
+    parser.add_argument("destino", nargs="?", default=str(DIRETORIO_FHIR))
+    args = parser.parse_args()
+    for tipo, total in exportar(args.destino).items():
+        print(f"{tipo}: {total}")
+
+
+if __name__ == "__main__":
+    main()
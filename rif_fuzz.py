@@ -0,0 +1,314 @@
+"""Fuzzing combinatório das regras do protocolo.
+
+Gera combinações de entradas a partir do esquema em ``rif_campos`` (limites de
+cada widget, os limiares usados pelas regras e seus vizinhos, todas as opções
+dos selectbox e subconjuntos das alterações anatômicas), avalia em lotes num
+pool de processos e confere invariantes:
+
+- ``avaliar_caso`` não levanta exceção;
+- as listas são de textos e não têm itens repetidos;
+- cada alerta crítico vem com a recomendação correspondente (e vice-versa);
+- recomendações mutuamente exclusivas não aparecem juntas;
+- os indicadores devolvidos batem com as listas (HOMA-IR, cirurgias...);
+- o traço atribui cada alerta e recomendação a exatamente uma regra.
+
+Cada bloco é gerado dentro do próprio processo a partir de uma semente derivada
+de ``--semente``; o relatório imprime a semente do bloco de cada falha, e
+``--bloco-semente S`` roda só aquele bloco (com o mesmo ``--bloco``) para
+reproduzi-la. ``--app N`` roda ainda N casos pelo script completo
+(``AppTest``), que pega erros da interface como leituras de variáveis não
+definidas; com ``--bloco-semente``, roda só o caso daquela semente.
+
+Uso:
+    python rif_fuzz.py [-n 1000000] [-p PROCESSOS] [--semente 0] [--app 0]
+    python rif_fuzz.py --bloco-semente S [--bloco 20000] [--app 1]
+"""
+
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from rif_achados import CATALOGO, achados_de
+from rif_campos import BOOLEANO, CAMPOS, DECIMAL, INTEIRO, MULTIPLO, OPCAO, TEXTO
+from rif_regras import REGRAS, avaliar_lote
+
+TAMANHO_BLOCO = 20000
+MAXIMO_EXEMPLOS = 5
+PROBABILIDADE_UNIFORME = 0.1  # sorteio livre no intervalo, além dos valores representativos
+
+# Limiares usados em rif_regras; cada um é testado no valor exato e nos vizinhos
+LIMIARES = {
+    "idade": [37],
+    "hla_compartilhado": [2],
+    "anticardiolipina_igg": [40],
+    "anticardiolipina_igm": [40],
+    "anti_b2gp1_igg": [40],
+    "anti_b2gp1_igm": [40],
+    "nk_cells": [18],
+    "tsh": [0.5, 2.5],
+    "espessura_endometrial": [7, 9],
+    "vitamina_d": [20, 30],
+    "prolactina": [25],
+    "progesterona": [10],
+    "glicemia": [1, 126],
+    "insulina": [0.1, 4.05, 5.0, 6.3],
+    "pcr": [3, 10],
+    "homocisteina": [15],
+}
+
+TEXTOS = ["", "Maria", "Ana Lúcia Conceição", "  ", "José/Ç'\"<>", "x" * 200]
+
+# (prefixo do alerta crítico, prefixo da recomendação): um aparece se e só se o outro aparece
+PARES_ALERTA_RECOMENDACAO = [
+    ("TROMBOFILIA DETECTADA", "Anticoagulação profilática"),
+    ("ENDOMETRITE CRÔNICA", "Antibioticoterapia completa"),
+    ("Infecção detectada", "Tratamento antimicrobiano"),
+    ("SÍNDROME ANTIFOSFOLÍPIDE", "Protocolo SAF"),
+    ("Disfunção tireoidiana", "Otimização tireoidiana"),
+    ("HIDROSSALPINGE", "Cirurgia: Salpingectomia"),
+    ("Endométrio fino", "Endométrio fino"),
+    ("ERA: Janela pré-receptiva", "ERA Test: Ajustar timing da transferência (+"),
+    ("ERA: Janela pós-receptiva", "ERA Test: Ajustar timing da transferência (-"),
+    ("Hiperprolactinemia", "Hiperprolactinemia"),
+    ("Resistência insulínica", "Resistência insulínica"),
+    ("Fragmentação DNA", "Fator masculino"),
+]
+
+# Prefixos (em alertas ou recomendações) que não podem aparecer juntos
+EXCLUSIVOS = [
+    ("Endométrio fino", "Endométrio limítrofe"),
+    ("Vitamina D baixa", "Vitamina D insuficiente"),
+    ("ERA: Janela pré-receptiva", "ERA: Janela pós-receptiva"),
+    ("PCR elevada - Investigar", "PCR elevada: Investigar"),
+    ("Resistência insulínica", "HOMA-IR limítrofe"),
+    ("ENDOMETRITE CRÔNICA", "Realizar biópsia endometrial"),
+]
+
+
+def _vizinhos(campo, limiar):
+    passo = campo.passo or (1 if campo.tipo == INTEIRO else 0.1)
+    valores = [limiar - passo, limiar, limiar + passo]
+    if campo.tipo == INTEIRO:
+        valores = [int(v) for v in valores]
+    else:
+        valores = [round(v, 2) for v in valores]
+    return [v for v in valores if campo.minimo <= v <= campo.maximo]
+
+
+def valores_representativos(nome, campo):
+    """Valores testados com prioridade para o campo ``nome``."""
+    if campo.tipo == OPCAO:
+        return list(campo.opcoes)
+    if campo.tipo == BOOLEANO:
+        return [False, True]
+    if campo.tipo == TEXTO:
+        return TEXTOS
+    if campo.tipo == MULTIPLO:
+        return [[]] + [[opcao] for opcao in campo.opcoes]
+    valores = {campo.minimo, campo.maximo, campo.padrao}
+    for limiar in LIMIARES.get(nome, []):
+        valores.update(_vizinhos(campo, limiar))
+    return sorted(valores)
+
+
+REPRESENTATIVOS = {nome: valores_representativos(nome, campo) for nome, campo in CAMPOS.items()}
+
+
+def _sortear(rng, nome, campo):
+    if campo.tipo == MULTIPLO:
+        return rng.sample(campo.opcoes, rng.choice([0, 1, 1, 2, 2, 3, 4]))
+    if campo.tipo in (INTEIRO, DECIMAL) and rng.random() < PROBABILIDADE_UNIFORME:
+        if campo.tipo == INTEIRO:
+            return rng.randint(campo.minimo, campo.maximo)
+        return round(rng.uniform(campo.minimo, campo.maximo), 2)
+    return rng.choice(REPRESENTATIVOS[nome])
+
+
+def gerar_caso(rng):
+    return {nome: _sortear(rng, nome, campo) for nome, campo in CAMPOS.items()}
+
+
+def _juntar(itens):
+    # Um texto por lista: "algum item começa com X" vira uma busca de substring
+    return "\n" + "\n".join(itens)
+
+
+def _tem(texto, prefixo):
+    return "\n" + prefixo in texto
+
+
+def verificar(e, r):
+    """Lista de invariantes violados por ``r = avaliar_caso(e)``."""
+    violacoes = []
+    alertas, recomendacoes = r["alertas_criticos"], r["recomendacoes"]
+    for nome, itens in (("alertas_criticos", alertas), ("recomendacoes", recomendacoes)):
+        if not all(isinstance(item, str) and item for item in itens):
+            violacoes.append(f"{nome}: item vazio ou não textual")
+        if len(set(itens)) != len(itens):
+            violacoes.append(f"{nome}: itens repetidos")
+
+    texto_alertas, texto_recomendacoes = _juntar(alertas), _juntar(recomendacoes)
+    for alerta, recomendacao in PARES_ALERTA_RECOMENDACAO:
+        if _tem(texto_alertas, alerta) != _tem(texto_recomendacoes, recomendacao):
+            violacoes.append(f"alerta '{alerta}' sem recomendação '{recomendacao}' (ou o contrário)")
+    todos = texto_alertas + texto_recomendacoes
+    for a, b in EXCLUSIVOS:
+        if _tem(todos, a) and _tem(todos, b):
+            violacoes.append(f"'{a}' e '{b}' ao mesmo tempo")
+
+    informado = e["glicemia"] > 0 and e["insulina"] > 0
+    if (r["homa_ir"] is not None) != informado:
+        violacoes.append("homa_ir deveria ser None só quando glicemia ou insulina = 0")
+    if r["trombofilia_presente"] != _tem(texto_alertas, "TROMBOFILIA"):
+        violacoes.append("trombofilia_presente não bate com os alertas")
+    if bool(r["saf_criteria"]) != _tem(texto_alertas, "SÍNDROME ANTIFOSFOLÍPIDE"):
+        violacoes.append("saf_criteria não bate com os alertas")
+    esperadas = {CATALOGO[a].cirurgia for a in achados_de(e["alteracoes"])} - {None}
+    if set(r["cirurgia_necessaria"]) != esperadas:
+        violacoes.append("cirurgia_necessaria diferente do catálogo")
+    if any(f"Cirurgia: {c}" not in recomendacoes for c in r["cirurgia_necessaria"]):
+        violacoes.append("cirurgia sem recomendação correspondente")
+    if any(regra not in REGRAS for regra, _, _, _ in r["traco"]):
+        violacoes.append("traço com regra fora de REGRAS")
+    for posicao, chave in ((1, "alertas_criticos"), (2, "recomendacoes")):
+        if sorted(item for passo in r["traco"] for item in passo[posicao]) != sorted(r[chave]):
+            violacoes.append(f"traço não explica exatamente os itens de {chave}")
+    return violacoes
+
+
+def rodar_bloco(semente, quantidade):
+    """Gera e avalia ``quantidade`` casos; devolve (casos, falhas, exemplos)."""
+    rng = random.Random(semente)
+    casos = [gerar_caso(rng) for _ in range(quantidade)]
+    falhas = 0
+    exemplos = []
+    try:
+        resultados = avaliar_lote(casos)
+    except Exception:
+        # Reavalia um a um para isolar os casos que quebram
+        resultados = []
+        for e in casos:
+            try:
+                resultados.extend(avaliar_lote([e]))
+            except Exception as erro:
+                resultados.append(erro)
+    for e, r in zip(casos, resultados):
+        violacoes = [f"exceção: {r!r}"] if isinstance(r, Exception) else verificar(e, r)
+        if violacoes:
+            falhas += 1
+            if len(exemplos) < MAXIMO_EXEMPLOS:
+                exemplos.append((semente, e, violacoes))
+    return quantidade, falhas, exemplos
+
+
+def semente_do_bloco(semente, i):
+    return semente * 1_000_003 + i
+
+
+def executar(total, processos=None, tamanho_bloco=TAMANHO_BLOCO, semente=0, bloco_semente=None):
+    """Roda ``total`` casos em blocos no pool; devolve o relatório.
+
+    Com ``bloco_semente``, roda só o bloco dessa semente (como impressa no
+    relatório), com até ``tamanho_bloco`` casos.
+    """
+    if bloco_semente is not None:
+        blocos, sementes = [min(tamanho_bloco, total)], [bloco_semente]
+    else:
+        blocos = []
+        restante = total
+        while restante > 0:
+            blocos.append(min(tamanho_bloco, restante))
+            restante -= blocos[-1]
+        sementes = [semente_do_bloco(semente, i) for i in range(len(blocos))]
+
+    inicio = time.perf_counter()
+    casos = falhas = 0
+    exemplos = []
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        for n, f, ex in pool.map(rodar_bloco, sementes, blocos):
+            casos += n
+            falhas += f
+            exemplos += ex[:MAXIMO_EXEMPLOS - len(exemplos)]
+    segundos = time.perf_counter() - inicio
+    return {
+        "casos": casos,
+        "falhas": falhas,
+        "segundos": segundos,
+        "casos_por_segundo": casos / segundos if segundos else 0.0,
+        "exemplos": exemplos,
+    }
+
+
+# ---------- modo interface ----------
+def _rodar_app(semente):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(semente)
+    e = gerar_caso(rng)
+    # O rótulo sozinho não basta ("Histeroscopia diagnóstica" é selectbox e checkbox)
+    por_rotulo = {(campo.tipo, campo.rotulo): nome for nome, campo in CAMPOS.items()}
+    at = AppTest.from_file(str(Path(__file__).with_name("rif_app.py")), default_timeout=60)
+    at.run()
+    # Duas passadas: widgets condicionais só aparecem depois da primeira
+    for _ in range(2):
+        for tipo, widgets in ((TEXTO, at.text_input), (OPCAO, at.selectbox), (BOOLEANO, at.checkbox),
+                              (MULTIPLO, at.multiselect), (None, at.number_input)):
+            for widget in widgets:
+                chave = (tipo or (INTEIRO if isinstance(widget.value, int) else DECIMAL), widget.label)
+                nome = por_rotulo.get(chave)
+                if nome is not None:
+                    widget.set_value(e[nome])
+        at.run()
+    return semente, [str(erro.value) for erro in at.exception]
+
+
+def executar_app(total, semente=0, bloco_semente=None):
+    """Roda ``total`` casos pelo script, em sequência (só o de ``bloco_semente``, se dada).
+
+    Fica fora do pool: o ``AppTest`` troca o ``__main__`` do processo, o que
+    quebra o envio de tarefas seguintes para o mesmo trabalhador.
+    """
+    inicio = time.perf_counter()
+    sementes = ([bloco_semente] if bloco_semente is not None
+                else [semente_do_bloco(semente, i) for i in range(total)])
+    resultados = [_rodar_app(s) for s in sementes]
+    segundos = time.perf_counter() - inicio
+    falhas = [(s, erros) for s, erros in resultados if erros]
+    return {"casos": len(sementes), "falhas": len(falhas), "segundos": segundos, "exemplos": falhas[:MAXIMO_EXEMPLOS]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzzing das regras do protocolo RIF")
+    parser.add_argument("-n", "--casos", type=int, default=1_000_000)
+    parser.add_argument("-p", "--processos", type=int, default=os.cpu_count())
+    parser.add_argument("--bloco", type=int, default=TAMANHO_BLOCO)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--app", type=int, default=0, help="casos a rodar pelo script completo")
+    parser.add_argument("--bloco-semente", type=int,
+                        help="reproduz só o bloco (e o caso de interface) desta semente do relatório")
+    args = parser.parse_args()
+
+    relatorio = executar(args.casos, args.processos, args.bloco, args.semente, args.bloco_semente)
+    print(f"Regras: {relatorio['casos']} casos em {relatorio['segundos']:.1f} s "
+          f"({relatorio['casos_por_segundo']:,.0f} casos/s, {args.processos} processos), "
+          f"{relatorio['falhas']} falhas")
+    for semente, e, violacoes in relatorio["exemplos"]:
+        print(f"  --bloco-semente {semente}: {'; '.join(violacoes)}")
+        print(f"    {e}")
+    falhas = relatorio["falhas"]
+
+    if args.app:
+        relatorio_app = executar_app(args.app, args.semente, args.bloco_semente)
+        print(f"Interface: {relatorio_app['casos']} casos em {relatorio_app['segundos']:.1f} s, "
+              f"{relatorio_app['falhas']} falhas")
+        for semente, erros in relatorio_app["exemplos"]:
+            print(f"  --bloco-semente {semente}: {erros[0]}")
+        falhas += relatorio_app["falhas"]
+    raise SystemExit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
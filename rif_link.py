@@ -0,0 +1,104 @@
+"""Estado completo do formulário num token curto para a URL (``?caso=...``).
+
+Formato: ``<versão>.<base64url(zlib(json))>``. O JSON guarda só os campos
+diferentes do padrão, em forma compacta: opções de selectbox e alterações do
+multiselect viram índices em ``rif_campos.CAMPOS`` e booleanos viram 0/1.
+Como os índices dependem das listas de opções, ``VERSAO_TOKEN`` deve mudar
+sempre que uma lista de opções mudar de ordem ou perder itens; tokens de outra
+versão são recusados.
+"""
+
+import base64
+import binascii
+import json
+import zlib
+
+from rif_campos import BOOLEANO, CAMPOS, DECIMAL, INTEIRO, MULTIPLO, OPCAO, TEXTO
+
+VERSAO_TOKEN = "1"
+TAMANHO_MAXIMO_TOKEN = 4096
+TAMANHO_MAXIMO_JSON = 64 * 1024
+
+
+def _compactar(campo, valor):
+    if campo.tipo == OPCAO:
+        return campo.opcoes.index(valor)
+    if campo.tipo == MULTIPLO:
+        return [campo.opcoes.index(item) for item in valor]
+    if campo.tipo == BOOLEANO:
+        return int(valor)
+    return valor
+
+
+def _expandir(nome, campo, valor):
+    """Valor compacto -> valor do widget; ValueError se estiver fora do esquema."""
+    if campo.tipo == OPCAO:
+        if not isinstance(valor, int) or not 0 <= valor < len(campo.opcoes):
+            raise ValueError(f"{nome}: opção inválida")
+        return campo.opcoes[valor]
+    if campo.tipo == MULTIPLO:
+        if (not isinstance(valor, list)
+                or not all(isinstance(i, int) and 0 <= i < len(campo.opcoes) for i in valor)):
+            raise ValueError(f"{nome}: alterações inválidas")
+        return [campo.opcoes[i] for i in dict.fromkeys(valor)]
+    if campo.tipo == BOOLEANO:
+        if valor not in (0, 1):
+            raise ValueError(f"{nome}: booleano inválido")
+        return bool(valor)
+    if campo.tipo == TEXTO:
+        if not isinstance(valor, str):
+            raise ValueError(f"{nome}: texto inválido")
+        return valor
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        raise ValueError(f"{nome}: número inválido")
+    if not campo.minimo <= valor <= campo.maximo:
+        raise ValueError(f"{nome}: fora do intervalo {campo.minimo}-{campo.maximo}")
+    if campo.tipo == INTEIRO:
+        if valor != int(valor):
+            raise ValueError(f"{nome}: deveria ser inteiro")
+        return int(valor)
+    return float(valor)
+
+
+def codificar(entradas, incluir_nome=False):
+    """Entradas da aba 6 -> token para a URL."""
+    compacto = {}
+    for nome, campo in CAMPOS.items():
+        if nome == "nome_paciente" and not incluir_nome:
+            continue
+        valor = entradas[nome]
+        if valor != campo.valor_padrao():
+            compacto[nome] = _compactar(campo, valor)
+    texto = json.dumps(compacto, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    dados = base64.urlsafe_b64encode(zlib.compress(texto, 9)).rstrip(b"=").decode("ascii")
+    return f"{VERSAO_TOKEN}.{dados}"
+
+
+def decodificar(token):
+    """Token -> {campo: valor} com todos os campos do formulário.
+
+    Campos ausentes do token voltam ao padrão. Levanta ValueError para token
+    malformado, de outra versão ou com valores fora do esquema.
+    """
+    if len(token) > TAMANHO_MAXIMO_TOKEN:
+        raise ValueError("token longo demais")
+    versao, _, dados = token.partition(".")
+    if versao != VERSAO_TOKEN:
+        raise ValueError(f"versão de token não suportada: {versao!r}")
+    try:
+        comprimido = base64.urlsafe_b64decode(dados + "=" * (-len(dados) % 4))
+        descompressor = zlib.decompressobj()
+        texto = descompressor.decompress(comprimido, TAMANHO_MAXIMO_JSON)
+        if descompressor.unconsumed_tail:
+            raise ValueError("conteúdo do token grande demais")
+        compacto = json.loads(texto)
+    except (binascii.Error, zlib.error, UnicodeDecodeError, json.JSONDecodeError) as erro:
+        raise ValueError(f"token malformado: {erro}") from erro
+    if not isinstance(compacto, dict):
+        raise ValueError("token malformado")
+
+    desconhecidos = set(compacto) - set(CAMPOS)
+    if desconhecidos:
+        raise ValueError(f"campos desconhecidos: {', '.join(sorted(desconhecidos))}")
+    return {nome: _expandir(nome, campo, compacto[nome]) if nome in compacto else campo.valor_padrao()
+            for nome, campo in CAMPOS.items()}
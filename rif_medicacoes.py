@@ -0,0 +1,411 @@
+"""Regime medicamentoso estruturado do protocolo (aba 6).
+
+Cada indicação do protocolo (SAF, trombofilia, endométrio fino, MTHFR, ...)
+gera ``Prescricao`` tipadas: medicamento, dose, via, fase de início e
+condição de suspensão. Várias indicações podem prescrever o mesmo medicamento
+pela mesma via (AAS na trombofilia, na SAF e no endométrio fino); a fusão é
+determinística e não depende da ordem em que as indicações dispararam:
+
+- início: a fase mais precoce;
+- suspensão: a mais tardia (``Suspensao`` é ordenada pela duração);
+- dose e observação: da primeira indicação em ``INDICACOES`` (as mais
+  específicas vêm antes da suplementação básica);
+- indicações: todas, na ordem de ``INDICACOES``.
+
+Uma indicação também pode oferecer ``Alternativas``: prescrições mutuamente
+exclusivas (ex.: prednisona ou Intralipid nas NK elevadas), das quais só uma
+é usada. Se uma das opções já está no regime por outra indicação, ela cobre
+a indicação e o grupo some; senão o grupo fica em ``Regime.alternativas``. As
+interações nunca são verificadas entre opções do mesmo grupo, só entre
+medicamentos que podem ser tomados juntos.
+
+Interações entre medicamentos e contraindicações por condição clínica ficam em
+matrizes montadas uma vez na importação do módulo, indexadas pela posição do
+medicamento/condição, de modo que cada verificação é uma consulta direta. O
+regime fundido de cada combinação de indicações e condições é calculado uma
+vez e reaproveitado (as ``Prescricao`` e o ``Regime`` são imutáveis).
+"""
+
+from dataclasses import dataclass
+from enum import Enum, IntEnum
+from functools import lru_cache
+from itertools import combinations
+
+from rif_achados import MASCARA_ADENOMIOSE
+from rif_regras import avaliar_lote
+
+
+class Medicamento(Enum):
+    AAS = "AAS"
+    ENOXAPARINA = "Enoxaparina"
+    HIDROXICLOROQUINA = "Hidroxicloroquina"
+    PREDNISONA = "Prednisona"
+    INTRALIPIDE = "Intralipid 20%"
+    ACIDO_FOLICO = "Ácido fólico"
+    VITAMINA_B12 = "Vitamina B12"
+    VITAMINA_B6 = "Vitamina B6"
+    VITAMINA_D = "Vitamina D"
+    OMEGA_3 = "Ômega-3 (DHA)"
+    MULTIVITAMINICO = "Multivitamínico pré-natal"
+    COQ10 = "CoQ10"
+    MELATONINA = "Melatonina"
+    DHEA = "DHEA"
+    METFORMINA = "Metformina"
+    INOSITOL = "Myo-inositol + D-chiro-inositol"
+    LEVOTIROXINA = "Levotiroxina"
+    GNRH = "Análogo de GnRH (leuprorrelina)"
+    ESTRADIOL = "Estradiol"
+    PROGESTERONA = "Progesterona micronizada"
+    VITAMINA_E = "Vitamina E"
+    L_ARGININA = "L-arginina"
+    PENTOXIFILINA = "Pentoxifilina"
+
+
+class Fase(IntEnum):
+    PRE_CICLO = 1
+    PREPARO_ENDOMETRIAL = 2
+    TRANSFERENCIA = 3
+    POS_TRANSFERENCIA = 4
+
+    @property
+    def descricao(self):
+        return _DESCRICAO_FASE[self]
+
+
+_DESCRICAO_FASE = {
+    Fase.PRE_CICLO: "Pré-ciclo",
+    Fase.PREPARO_ENDOMETRIAL: "Preparo endometrial",
+    Fase.TRANSFERENCIA: "Transferência",
+    Fase.POS_TRANSFERENCIA: "Pós-transferência",
+}
+
+
+class Suspensao(IntEnum):
+    """Condição de suspensão, da mais precoce à mais tardia."""
+    TRANSFERENCIA = 1
+    BETA_HCG = 2
+    DOZE_SEMANAS = 3
+    TRINTA_E_SEIS_SEMANAS = 4
+    POS_PARTO = 5
+    CONTINUO = 6
+
+    @property
+    def descricao(self):
+        return _DESCRICAO_SUSPENSAO[self]
+
+
+_DESCRICAO_SUSPENSAO = {
+    Suspensao.TRANSFERENCIA: "até a transferência",
+    Suspensao.BETA_HCG: "até o beta-hCG (suspender se negativo)",
+    Suspensao.DOZE_SEMANAS: "até 12 semanas de gestação",
+    Suspensao.TRINTA_E_SEIS_SEMANAS: "até 34-36 semanas de gestação",
+    Suspensao.POS_PARTO: "até 6 semanas pós-parto",
+    Suspensao.CONTINUO: "uso contínuo, ajustar por exames",
+}
+
+VIA_ORAL = "oral"
+VIA_SUBCUTANEA = "subcutânea"
+VIA_INTRAVENOSA = "intravenosa"
+VIA_INTRAMUSCULAR = "intramuscular"
+VIA_VAGINAL = "vaginal"
+
+# Gravidade de interações e contraindicações
+ATENCAO = "atenção"
+EVITAR = "evitar"
+
+
+@dataclass(frozen=True)
+class Prescricao:
+    medicamento: Medicamento
+    dose: str
+    via: str
+    inicio: Fase
+    suspensao: Suspensao
+    observacao: str = ""
+    indicacoes: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class Alternativas:
+    """Prescrições mutuamente exclusivas: usar uma das ``opcoes``."""
+    opcoes: tuple[Prescricao, ...]
+    indicacoes: tuple[str, ...] = ()
+
+    @property
+    def inicio(self):
+        return min(p.inicio for p in self.opcoes)
+
+
+@dataclass(frozen=True)
+class AlertaMedicamentoso:
+    gravidade: str
+    medicamentos: tuple[Medicamento, ...]
+    texto: str
+
+
+@dataclass(frozen=True)
+class Regime:
+    prescricoes: tuple[Prescricao, ...]
+    alertas: tuple[AlertaMedicamentoso, ...]
+    alternativas: tuple[Alternativas, ...] = ()
+
+    def da_fase(self, fase):
+        """Prescrições que começam na ``fase``."""
+        return [p for p in self.prescricoes if p.inicio == fase]
+
+    def alternativas_da_fase(self, fase):
+        return [a for a in self.alternativas if a.inicio == fase]
+
+    def como_linhas(self):
+        linhas = [
+            {"Medicamento": p.medicamento.value, "Dose": p.dose, "Via": p.via,
+             "Início": p.inicio.descricao, "Suspensão": p.suspensao.descricao,
+             "Indicações": ", ".join(DESCRICAO_INDICACAO[i] for i in p.indicacoes),
+             "Observação": p.observacao}
+            for p in self.prescricoes
+        ]
+        for grupo in self.alternativas:
+            for p in grupo.opcoes:
+                outras = " ou ".join(o.medicamento.value for o in grupo.opcoes if o is not p)
+                linhas.append(
+                    {"Medicamento": p.medicamento.value, "Dose": p.dose, "Via": p.via,
+                     "Início": p.inicio.descricao, "Suspensão": p.suspensao.descricao,
+                     "Indicações": ", ".join(DESCRICAO_INDICACAO[i] for i in grupo.indicacoes),
+                     "Observação": "; ".join(filter(None, [f"alternativa a {outras} (usar só uma)",
+                                                           p.observacao]))})
+        return linhas
+
+
+def _p(medicamento, dose, via, inicio, suspensao, observacao=""):
+    return Prescricao(medicamento, dose, via, inicio, suspensao, observacao)
+
+
+def _ou(*opcoes):
+    return Alternativas(opcoes)
+
+
+M, F, S = Medicamento, Fase, Suspensao
+
+# (chave, descrição, condição(e, resultado), prescrições ou ``Alternativas``), da
+# mais específica à mais geral: a dose da prescrição fundida vem da primeira
+# indicação da lista
+INDICACOES = [
+    ("saf", "Síndrome antifosfolípide",
+     lambda e, r: bool(r["saf_criteria"]), [
+         _p(M.AAS, "100mg/dia", VIA_ORAL, F.PREPARO_ENDOMETRIAL, S.TRINTA_E_SEIS_SEMANAS),
+         _p(M.ENOXAPARINA, "40mg/dia", VIA_SUBCUTANEA, F.TRANSFERENCIA, S.POS_PARTO),
+     ]),
+    ("saf_lupico", "SAF com anticoagulante lúpico",
+     lambda e, r: bool(r["saf_criteria"]) and e["anticoagulante_lupico"] == "Positivo", [
+         _p(M.HIDROXICLOROQUINA, "400mg/dia", VIA_ORAL, F.TRANSFERENCIA, S.CONTINUO,
+            "se não iniciada antes; acompanhar com reumatologista"),
+     ]),
+    ("saf_multiplos", "SAF com múltiplos critérios",
+     lambda e, r: len(r["saf_criteria"]) >= 2, [
+         _p(M.PREDNISONA, "5-10mg/dia", VIA_ORAL, F.TRANSFERENCIA, S.DOZE_SEMANAS),
+     ]),
+    ("trombofilia", "Trombofilia hereditária",
+     lambda e, r: r["trombofilia_presente"], [
+         _p(M.AAS, "100mg/dia", VIA_ORAL, F.PREPARO_ENDOMETRIAL, S.TRINTA_E_SEIS_SEMANAS),
+         _p(M.ENOXAPARINA, "40mg/dia", VIA_SUBCUTANEA, F.TRANSFERENCIA, S.DOZE_SEMANAS),
+     ]),
+    ("nk_elevado", "NK elevadas após ≥4 falhas",
+     lambda e, r: r["nk_elevado"] and e["num_falhas"] >= 4, [
+         _ou(_p(M.PREDNISONA, "5-10mg/dia", VIA_ORAL, F.TRANSFERENCIA, S.DOZE_SEMANAS,
+                "controverso - discutir riscos/benefícios"),
+             _p(M.INTRALIPIDE, "100mL antes da transferência", VIA_INTRAVENOSA, F.TRANSFERENCIA,
+                S.TRANSFERENCIA, "controverso")),
+     ]),
+    ("endometrio_fino", "Endométrio fino (<7mm)",
+     lambda e, r: e["espessura_endometrial"] < 7, [
+         _p(M.ESTRADIOL, "6-8mg/dia (dose alta)", VIA_ORAL, F.PREPARO_ENDOMETRIAL, S.DOZE_SEMANAS),
+         _p(M.ESTRADIOL, "2mg 12/12h", VIA_VAGINAL, F.PREPARO_ENDOMETRIAL, S.DOZE_SEMANAS),
+         _p(M.VITAMINA_E, "800 UI/dia", VIA_ORAL, F.PREPARO_ENDOMETRIAL, S.BETA_HCG),
+         _p(M.L_ARGININA, "6g/dia", VIA_ORAL, F.PREPARO_ENDOMETRIAL, S.BETA_HCG),
+         _p(M.PENTOXIFILINA, "800mg/dia", VIA_ORAL, F.PREPARO_ENDOMETRIAL, S.BETA_HCG),
+         _p(M.AAS, "100mg/dia", VIA_ORAL, F.PREPARO_ENDOMETRIAL, S.BETA_HCG),
+     ]),
+    ("mthfr", "MTHFR homozigoto",
+     lambda e, r: e["mthfr"] == "Homozigoto", [
+         _p(M.ACIDO_FOLICO, "5mg/dia (preferir metilfolato)", VIA_ORAL, F.PRE_CICLO, S.DOZE_SEMANAS),
+     ]),
+    ("homocisteina", "Homocisteína >15 µmol/L",
+     lambda e, r: e["homocisteina"] > 15, [
+         _p(M.ACIDO_FOLICO, "5mg/dia", VIA_ORAL, F.PRE_CICLO, S.DOZE_SEMANAS),
+         _p(M.VITAMINA_B12, "1000mcg/dia", VIA_ORAL, F.PRE_CICLO, S.DOZE_SEMANAS,
+            "reavaliar homocisteína em 2-3 meses"),
+         _p(M.VITAMINA_B6, "50mg/dia", VIA_ORAL, F.PRE_CICLO, S.DOZE_SEMANAS),
+     ]),
+    ("hipotireoidismo", "TSH >2.5 mUI/L",
+     lambda e, r: e["tsh"] > 2.5, [
+         _p(M.LEVOTIROXINA, "dose para TSH <2.5 mUI/L", VIA_ORAL, F.PRE_CICLO, S.CONTINUO,
+            "controle de TSH a cada 4 semanas"),
+     ]),
+    ("resistencia_insulinica", "HOMA-IR >2.5",
+     lambda e, r: r["homa_ir"] is not None and r["homa_ir"] > 2.5, [
+         _p(M.METFORMINA, "1500-2000mg/dia em 2-3 tomadas", VIA_ORAL, F.PRE_CICLO, S.DOZE_SEMANAS,
+            "iniciar pelo menos 2 meses antes do ciclo"),
+         _p(M.INOSITOL, "2g + 50mg 2x/dia", VIA_ORAL, F.PRE_CICLO, S.DOZE_SEMANAS),
+     ]),
+    ("vitamina_d_baixa", "Vitamina D <30 ng/mL",
+     lambda e, r: e["vitamina_d"] < 30, [
+         _p(M.VITAMINA_D, "2000-4000 UI/dia (dose terapêutica até normalizar)", VIA_ORAL,
+            F.PRE_CICLO, S.CONTINUO),
+     ]),
+    ("idade_35", "Idade ≥35 anos",
+     lambda e, r: e["idade"] >= 35, [
+         _p(M.COQ10, "200-600mg/dia", VIA_ORAL, F.PRE_CICLO, S.BETA_HCG),
+         _p(M.MELATONINA, "3mg à noite", VIA_ORAL, F.PRE_CICLO, S.BETA_HCG),
+         _p(M.DHEA, "25-75mg/dia", VIA_ORAL, F.PRE_CICLO, S.TRANSFERENCIA, "avaliar com médico"),
+     ]),
+    ("adenomiose", "Adenomiose",
+     lambda e, r: bool(r["mascara_achados"] & MASCARA_ADENOMIOSE), [
+         _p(M.GNRH, "3,75mg/mês por 2-3 meses", VIA_INTRAMUSCULAR, F.PRE_CICLO, S.TRANSFERENCIA,
+            "considerar"),
+     ]),
+    ("progesterona_baixa", "Progesterona lútea <10 ng/mL",
+     lambda e, r: e["progesterona"] < 10, [
+         _p(M.PROGESTERONA, "800mg/dia (dose máxima) ou associar via IM", VIA_VAGINAL,
+            F.TRANSFERENCIA, S.DOZE_SEMANAS),
+     ]),
+    ("basico", "Protocolo básico",
+     lambda e, r: True, [
+         _p(M.ACIDO_FOLICO, "5mg/dia", VIA_ORAL, F.PRE_CICLO, S.DOZE_SEMANAS),
+         _p(M.OMEGA_3, "1-2g/dia", VIA_ORAL, F.PRE_CICLO, S.DOZE_SEMANAS),
+         _p(M.MULTIVITAMINICO, "1 dose/dia", VIA_ORAL, F.PRE_CICLO, S.DOZE_SEMANAS),
+         _p(M.ESTRADIOL, "2-6mg/dia (ajustar para endométrio ≥8mm)", VIA_ORAL,
+            F.PREPARO_ENDOMETRIAL, S.DOZE_SEMANAS),
+         _p(M.PROGESTERONA, "600-800mg/dia", VIA_VAGINAL, F.TRANSFERENCIA, S.DOZE_SEMANAS,
+            "ou progesterona IM 50-100mg/dia"),
+     ]),
+]
+DESCRICAO_INDICACAO = {chave: descricao for chave, descricao, _, _ in INDICACOES}
+
+# Interações entre medicamentos: (a, b, gravidade, texto)
+INTERACOES = [
+    (M.AAS, M.ENOXAPARINA, ATENCAO,
+     "Associação intencional, mas com risco aditivo de sangramento: monitorar plaquetas e sangramentos"),
+    (M.ENOXAPARINA, M.PENTOXIFILINA, EVITAR,
+     "Pentoxifilina com heparina aumenta o risco de sangramento: suspender a pentoxifilina na transferência"),
+    (M.AAS, M.PENTOXIFILINA, ATENCAO, "Dois antiagregantes: risco aditivo de sangramento"),
+    (M.ENOXAPARINA, M.VITAMINA_E, ATENCAO, "Vitamina E em dose alta potencializa o efeito anticoagulante"),
+    (M.AAS, M.VITAMINA_E, ATENCAO, "Vitamina E em dose alta potencializa o efeito antiagregante"),
+    (M.AAS, M.PREDNISONA, ATENCAO, "Corticoide + AAS: risco de lesão gastrointestinal, considerar protetor gástrico"),
+    (M.PREDNISONA, M.METFORMINA, ATENCAO, "Corticoide eleva a glicemia: monitorar o controle glicêmico"),
+    (M.HIDROXICLOROQUINA, M.METFORMINA, ATENCAO, "Hidroxicloroquina pode potencializar hipoglicemia"),
+    (M.LEVOTIROXINA, M.MULTIVITAMINICO, ATENCAO,
+     "Ferro e cálcio reduzem a absorção da levotiroxina: tomar com 4h de intervalo"),
+    # Nas NK elevadas são alternativas (não geram este alerta); vale para uma
+    # eventual prescrição conjunta por indicações diferentes
+    (M.PREDNISONA, M.INTRALIPIDE, EVITAR,
+     "Imunomoduladores alternativos e controversos: não associar sem indicação do especialista"),
+]
+
+# Contraindicações por condição clínica: (condição, medicamento, via ou None, gravidade, texto)
+CONDICOES = {
+    "trombose": lambda e, r: r["trombofilia_presente"] or bool(r["saf_criteria"]),
+    "resistencia_insulinica": lambda e, r: r["homa_ir"] is not None and r["homa_ir"] > 2.5,
+    "infeccao_ativa": lambda e, r: r["endometrite_detectada"] or bool(r["tratamento_necessario"]),
+}
+CONTRAINDICACOES = [
+    ("trombose", M.ESTRADIOL, VIA_ORAL, ATENCAO,
+     "Estrogênio oral aumenta o risco trombótico em trombofilia/SAF: preferir via transdérmica ou vaginal"),
+    ("resistencia_insulinica", M.PREDNISONA, None, ATENCAO, "Corticoide piora a resistência insulínica"),
+    ("infeccao_ativa", M.PREDNISONA, None, EVITAR,
+     "Corticoide com infecção/endometrite ativa: tratar a infecção antes de iniciar"),
+]
+
+# Matrizes pré-compiladas: posição do medicamento/condição -> registro ou None
+_POSICAO = {medicamento: i for i, medicamento in enumerate(Medicamento)}
+_POSICAO_CONDICAO = {condicao: i for i, condicao in enumerate(CONDICOES)}
+
+
+def _compilar_interacoes():
+    matriz = [[None] * len(Medicamento) for _ in Medicamento]
+    for a, b, gravidade, texto in INTERACOES:
+        alerta = AlertaMedicamentoso(gravidade, tuple(sorted((a, b), key=_POSICAO.get)), texto)
+        matriz[_POSICAO[a]][_POSICAO[b]] = matriz[_POSICAO[b]][_POSICAO[a]] = alerta
+    return matriz
+
+
+def _compilar_contraindicacoes():
+    matriz = [[None] * len(Medicamento) for _ in CONDICOES]
+    for condicao, medicamento, via, gravidade, texto in CONTRAINDICACOES:
+        matriz[_POSICAO_CONDICAO[condicao]][_POSICAO[medicamento]] = (
+            via, AlertaMedicamentoso(gravidade, (medicamento,), texto))
+    return matriz
+
+
+_MATRIZ_INTERACOES = _compilar_interacoes()
+_MATRIZ_CONTRAINDICACOES = _compilar_contraindicacoes()
+_PRESCRICOES = {chave: prescricoes for chave, _, _, prescricoes in INDICACOES}
+
+
+def _fundir(grupo):
+    """Prescrições do mesmo medicamento e via, já na ordem de INDICACOES."""
+    (primeira, _), *_ = grupo
+    return Prescricao(
+        primeira.medicamento, primeira.dose, primeira.via,
+        inicio=min(p.inicio for p, _ in grupo),
+        suspensao=max(p.suspensao for p, _ in grupo),
+        observacao="; ".join(dict.fromkeys(p.observacao for p, _ in grupo if p.observacao)),
+        indicacoes=tuple(dict.fromkeys(indicacao for _, indicacao in grupo)),
+    )
+
+
+@lru_cache(maxsize=4096)
+def _regime(indicacoes, condicoes):
+    """Regime para as chaves de indicação e de condição presentes (tuplas, na ordem do catálogo).
+
+    O regime depende só de quais indicações e condições dispararam; há poucas
+    combinações distintas, e cada uma é fundida e verificada uma vez.
+    """
+    grupos, opcionais = {}, {}
+    for chave in indicacoes:
+        for item in _PRESCRICOES[chave]:
+            if isinstance(item, Alternativas):
+                opcionais.setdefault(item.opcoes, []).append(chave)
+            else:
+                grupos.setdefault((item.medicamento, item.via), []).append((item, chave))
+    alternativas = []
+    for opcoes, chaves in opcionais.items():
+        prescrita = next((p for p in opcoes if (p.medicamento, p.via) in grupos), None)
+        if prescrita:
+            # A opção já prescrita por outra indicação também cobre esta
+            grupos[(prescrita.medicamento, prescrita.via)].extend((prescrita, chave) for chave in chaves)
+        else:
+            alternativas.append(Alternativas(opcoes, tuple(chaves)))
+    prescricoes = sorted((_fundir(grupo) for grupo in grupos.values()),
+                         key=lambda p: (p.inicio, _POSICAO[p.medicamento], p.via))
+
+    alertas = []
+    exclusivas = [{_POSICAO[p.medicamento] for p in grupo.opcoes} for grupo in alternativas]
+    posicoes = sorted({_POSICAO[p.medicamento] for p in prescricoes}.union(*exclusivas))
+    for i, j in combinations(posicoes, 2):
+        alerta = _MATRIZ_INTERACOES[i][j]
+        # Opções do mesmo grupo nunca são tomadas juntas
+        if alerta and not any(i in grupo and j in grupo for grupo in exclusivas):
+            alertas.append(alerta)
+    vias = {(p.medicamento, p.via) for p in prescricoes}
+    vias.update((p.medicamento, p.via) for grupo in alternativas for p in grupo.opcoes)
+    for condicao in condicoes:
+        linha = _MATRIZ_CONTRAINDICACOES[_POSICAO_CONDICAO[condicao]]
+        for i in posicoes:
+            registro = linha[i]
+            if registro:
+                via, alerta = registro
+                if via is None or (alerta.medicamentos[0], via) in vias:
+                    alertas.append(alerta)
+    return Regime(tuple(prescricoes), tuple(alertas), tuple(alternativas))
+
+
+def montar_regime(e, resultado):
+    """Regime fundido e alertas para um caso; ``resultado`` é o de ``avaliar_caso(e)``."""
+    indicacoes = tuple(chave for chave, _, condicao, _ in INDICACOES if condicao(e, resultado))
+    condicoes = tuple(chave for chave, presente in CONDICOES.items() if presente(e, resultado))
+    return _regime(indicacoes, condicoes)
+
+
+def montar_regimes_lote(lista_entradas):
+    """Regimes de muitos casos (arquivo, cenários) com uma avaliação em lote."""
+    return [montar_regime(e, r) for e, r in zip(lista_entradas, avaliar_lote(lista_entradas))]
@@ -0,0 +1,141 @@
+"""Investigações pendentes por paciente e worklist da clínica.
+
+``investigacoes_pendentes`` reproduz a lista da aba 6 para um caso.
+``IndicePendencias`` mantém o índice invertido investigação -> pacientes,
+atualizado de forma incremental a cada caso salvo (só a paciente salva é
+recalculada), de modo que consultas como "quem ainda não fez biópsia CD138"
+não precisam varrer o arquivo. O índice também guarda as entradas usadas pela
+pontuação de prognóstico (``rif_prognostico``), para que ``priorizar`` reordene
+a worklist inteira com uma única chamada vetorial.
+"""
+
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from rif_casos import DIRETORIO_INDICES, gravar_json
+from rif_prognostico import CARACTERISTICAS, matriz_caracteristicas, pontuar
+
+CAMINHO_INDICE = DIRETORIO_INDICES / "pendencias.json"
+
+INVESTIGACOES = {
+    "cariotipo": "Cariótipo do casal",
+    "pgt_a": "Considerar PGT-A nos próximos embriões",
+    "trombofilia": "Painel completo de trombofilia",
+    "biopsia_cd138": "Biópsia endometrial com CD138 (endometrite crônica)",
+    "histeroscopia": "Histeroscopia diagnóstica",
+    "era": "Considerar ERA Test (janela de implantação)",
+    "ureaplasma_mycoplasma": "Pesquisa Ureaplasma/Mycoplasma (casal)",
+    "fragmentacao_dna": "Fragmentação de DNA espermático",
+}
+
+
+def investigacoes_pendentes(entradas):
+    """Chaves de ``INVESTIGACOES`` ainda pendentes para o caso."""
+    pendentes = []
+    if not entradas["cariotipo_casal"]:
+        pendentes.append("cariotipo")
+    if not entradas["pgt_a"] and entradas["idade"] >= 37:
+        pendentes.append("pgt_a")
+    if not entradas["trombofilia"]:
+        pendentes.append("trombofilia")
+    if entradas["biopsia_endometrial"] == "Não realizada":
+        pendentes.append("biopsia_cd138")
+    if entradas["histeroscopia"] == "Não realizada":
+        pendentes.append("histeroscopia")
+    if entradas["era_test"] == "Não realizado" and entradas["num_falhas"] >= 3:
+        pendentes.append("era")
+    if entradas["ureaplasma"] == "Não testado":
+        pendentes.append("ureaplasma_mycoplasma")
+    if entradas["fragmentacao_dna"] == "Não realizado":
+        pendentes.append("fragmentacao_dna")
+    return pendentes
+
+
+class IndicePendencias:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.por_investigacao = {chave: set() for chave in INVESTIGACOES}
+        self.por_paciente = {}
+        self.nomes = {}
+        self.caracteristicas = {}  # id -> {campo: valor} das CARACTERISTICAS do prognóstico
+
+    def atualizar(self, id_paciente, nome, entradas):
+        """Substitui as pendências da paciente pelas do caso recém-salvo."""
+        novas = investigacoes_pendentes(entradas)
+        with self._lock:
+            for chave in self.por_paciente.get(id_paciente, []):
+                self.por_investigacao[chave].discard(id_paciente)
+            for chave in novas:
+                self.por_investigacao[chave].add(id_paciente)
+            self.por_paciente[id_paciente] = novas
+            self.nomes[id_paciente] = nome
+            self.caracteristicas[id_paciente] = {campo: entradas[campo] for campo in CARACTERISTICAS}
+        return novas
+
+    def remover(self, id_paciente):
+        """Retira a paciente da worklist (alta, desistência)."""
+        with self._lock:
+            for chave in self.por_paciente.pop(id_paciente, []):
+                self.por_investigacao[chave].discard(id_paciente)
+            self.nomes.pop(id_paciente, None)
+            self.caracteristicas.pop(id_paciente, None)
+
+    def pacientes_pendentes(self, chave):
+        """Pacientes ativas com a investigação ``chave`` pendente, ordenadas por nome."""
+        with self._lock:
+            ids = list(self.por_investigacao[chave])
+            return sorted(((pid, self.nomes.get(pid, pid)) for pid in ids), key=lambda p: p[1])
+
+    def priorizar(self, chave):
+        """[(id, nome, pontuação)] das pacientes com ``chave`` pendente, maior pontuação primeiro.
+
+        Pacientes gravadas antes da pontuação existir (sem características) vão
+        para o fim, com pontuação None.
+        """
+        with self._lock:
+            ids = sorted(self.por_investigacao[chave], key=lambda pid: self.nomes.get(pid, pid))
+            com_dados = [pid for pid in ids if pid in self.caracteristicas]
+            sem_dados = [pid for pid in ids if pid not in self.caracteristicas]
+            linhas = [self.caracteristicas[pid] for pid in com_dados]
+            nomes = dict(self.nomes)
+        pontuacoes = pontuar(matriz_caracteristicas(linhas))
+        ordem = np.argsort(-pontuacoes, kind="stable")
+        return ([(com_dados[i], nomes.get(com_dados[i], com_dados[i]), float(pontuacoes[i])) for i in ordem]
+                + [(pid, nomes.get(pid, pid), None) for pid in sem_dados])
+
+    def contagens(self):
+        with self._lock:
+            return {chave: len(ids) for chave, ids in self.por_investigacao.items()}
+
+    def salvar(self, caminho=CAMINHO_INDICE):
+        with self._lock:
+            dados = {"por_paciente": self.por_paciente, "nomes": self.nomes,
+                     "caracteristicas": self.caracteristicas}
+            gravar_json(caminho, dados)
+
+    @classmethod
+    def carregar(cls, caminho=CAMINHO_INDICE):
+        indice = cls()
+        caminho = Path(caminho)
+        if not caminho.exists():
+            return indice
+        with open(caminho, encoding="utf-8") as f:
+            dados = json.load(f)
+        indice.nomes = dados["nomes"]
+        indice.por_paciente = dados["por_paciente"]
+        indice.caracteristicas = dados.get("caracteristicas", {})
+        for pid, chaves in indice.por_paciente.items():
+            for chave in chaves:
+                indice.por_investigacao[chave].add(pid)
+        return indice
+
+    @classmethod
+    def reconstruir(cls, casos):
+        """Reconstrói o índice a partir de {id_paciente: dados_caso} (ex.: ``ultimos_casos()``)."""
+        indice = cls()
+        for pid, caso in casos.items():
+            indice.atualizar(pid, caso["nome"], caso["entradas"])
+        return indice
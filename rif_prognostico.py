@@ -0,0 +1,214 @@
+"""Pontuação composta de prognóstico/prioridade do caso RIF.
+
+Cada componente (idade, falhas, IMC, qualidade embrionária, critérios de SAF,
+trombofilia, endometrite, NK, tireoide, HOMA-IR, espessura endometrial e
+fragmentação de DNA espermático) vira uma penalidade em [0, 1]; a pontuação é
+a média ponderada das penalidades em escala 0-100 (maior = prognóstico mais
+reservado = mais prioridade na fila). Os limiares são os mesmos de
+``rif_regras``. A pontuação ordena casos; não é uma probabilidade de gestação.
+
+O cálculo é todo vetorial: os casos viram uma matriz (uma linha por caso, uma
+coluna por ``CARACTERISTICAS``, opções de selectbox como índices em
+``rif_campos.CAMPOS``) e ``pontuar`` avalia a coorte inteira de uma vez. Um
+caso isolado é uma coorte de uma linha.
+
+Uso (calibração e desempenho):
+    python rif_prognostico.py -n 1000000
+    python rif_prognostico.py --arquivo
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from rif_campos import CAMPOS, OPCAO
+from rif_regras import (
+    ANTI_TPO_POSITIVO,
+    BIOPSIA_POSITIVA,
+    GENOTIPO_ALTERADO,
+    NK_ENDOMETRIAL_ELEVADO,
+)
+
+# Colunas da matriz, na ordem
+CARACTERISTICAS = [
+    "idade", "num_falhas", "imc", "qualidade_embrionaria",
+    "anticardiolipina_igg", "anticardiolipina_igm", "anticoagulante_lupico",
+    "anti_b2gp1_igg", "anti_b2gp1_igm",
+    "fator_v", "protrombina", "biopsia_endometrial",
+    "nk_cells", "nk_endometrial", "tsh", "anti_tpo",
+    "glicemia", "insulina", "espessura_endometrial", "fragmentacao_dna",
+]
+_COLUNA = {nome: i for i, nome in enumerate(CARACTERISTICAS)}
+
+# (chave, rótulo, peso), na ordem das colunas de ``penalidades``
+COMPONENTES = [
+    ("idade", "Idade materna", 3.0),
+    ("falhas", "Número de falhas", 2.0),
+    ("imc", "IMC fora de 18,5-30", 1.0),
+    ("embrioes", "Qualidade embrionária", 2.0),
+    ("saf", "Critérios de SAF", 2.0),
+    ("trombofilia", "Trombofilia hereditária", 1.0),
+    ("endometrite", "Endometrite crônica", 1.5),
+    ("nk", "NK elevadas", 1.0),
+    ("tireoide", "Tireoide", 1.0),
+    ("homa_ir", "Resistência insulínica (HOMA-IR)", 1.0),
+    ("endometrio", "Endométrio fino", 1.5),
+    ("fragmentacao_dna", "Fragmentação de DNA espermático", 1.5),
+]
+PESOS = np.array([peso for _, _, peso in COMPONENTES], dtype=np.float32)
+_ESCALA = np.float32(100.0) / PESOS.sum()
+
+# Faixas da pontuação (limite superior exclusivo, rótulo)
+FAIXAS = [(25.0, "Favorável"), (50.0, "Intermediário"), (float("inf"), "Reservado")]
+
+
+def _tabela(campo, valores):
+    """Vetor indexado pelo código da opção: valor de cada opção (0 se ausente)."""
+    return np.array([valores.get(opcao, 0.0) for opcao in CAMPOS[campo].opcoes], dtype=np.float32)
+
+
+def _indicadora(campo, opcoes):
+    return _tabela(campo, dict.fromkeys(opcoes, 1.0))
+
+
+_QUALIDADE = _tabela("qualidade_embrionaria", {"Boa (BA/BB)": 0.5, "Regular": 1.0})
+_LUPICO_POSITIVO = _indicadora("anticoagulante_lupico", ["Positivo"])
+_FATOR_V_ALTERADO = _indicadora("fator_v", GENOTIPO_ALTERADO)
+_PROTROMBINA_ALTERADA = _indicadora("protrombina", GENOTIPO_ALTERADO)
+_BIOPSIA_POSITIVA = _indicadora("biopsia_endometrial", BIOPSIA_POSITIVA)
+_NK_ENDOMETRIAL_ELEVADO = _indicadora("nk_endometrial", NK_ENDOMETRIAL_ELEVADO)
+_TPO_POSITIVO = _indicadora("anti_tpo", ANTI_TPO_POSITIVO)
+_FRAGMENTACAO = _tabela("fragmentacao_dna", {"15-25% (bom)": 0.25, "25-30% (limítrofe)": 0.6,
+                                              ">30% (alto)": 1.0})
+
+
+def caracteristicas(e):
+    """Linha da matriz para um dicionário de entradas."""
+    return [CAMPOS[nome].opcoes.index(e[nome]) if CAMPOS[nome].tipo == OPCAO else e[nome]
+            for nome in CARACTERISTICAS]
+
+
+def matriz_caracteristicas(lista_entradas):
+    """Matriz (n, len(CARACTERISTICAS)) de uma lista de dicionários de entradas."""
+    linhas = [caracteristicas(e) for e in lista_entradas]
+    return np.array(linhas, dtype=np.float32).reshape(len(linhas), len(CARACTERISTICAS))
+
+
+def penalidades(matriz):
+    """Matriz (n, len(COMPONENTES)) com a penalidade de cada componente em [0, 1]."""
+    x = np.asarray(matriz, dtype=np.float32)
+
+    def col(nome):
+        return x[:, _COLUNA[nome]]
+
+    def codigo(nome):
+        return x[:, _COLUNA[nome]].astype(np.intp)
+
+    saf = ((col("anticardiolipina_igg") > 40).astype(np.float32)
+           + (col("anticardiolipina_igm") > 40)
+           + _LUPICO_POSITIVO[codigo("anticoagulante_lupico")]
+           + (col("anti_b2gp1_igg") > 40)
+           + (col("anti_b2gp1_igm") > 40))
+    glicemia, insulina = col("glicemia"), col("insulina")
+    homa_ir = np.where((glicemia > 0) & (insulina > 0), glicemia * insulina / 405, 0)
+    tsh = col("tsh")
+
+    resultado = np.empty((len(x), len(COMPONENTES)), dtype=np.float32)
+    resultado[:, 0] = (col("idade") - 35) / 10
+    resultado[:, 1] = (col("num_falhas") - 3) / 7
+    resultado[:, 2] = np.maximum(18.5 - col("imc"), col("imc") - 30) / 10
+    resultado[:, 3] = _QUALIDADE[codigo("qualidade_embrionaria")]
+    resultado[:, 4] = saf / 3
+    resultado[:, 5] = np.maximum(_FATOR_V_ALTERADO[codigo("fator_v")],
+                                 _PROTROMBINA_ALTERADA[codigo("protrombina")])
+    resultado[:, 6] = _BIOPSIA_POSITIVA[codigo("biopsia_endometrial")]
+    resultado[:, 7] = np.maximum(col("nk_cells") > 18, _NK_ENDOMETRIAL_ELEVADO[codigo("nk_endometrial")])
+    resultado[:, 8] = np.maximum((tsh > 2.5) | (tsh < 0.5), _TPO_POSITIVO[codigo("anti_tpo")])
+    resultado[:, 9] = (homa_ir - 2.5) / 2.5
+    resultado[:, 10] = (9 - col("espessura_endometrial")) / 3
+    resultado[:, 11] = _FRAGMENTACAO[codigo("fragmentacao_dna")]
+    return np.clip(resultado, 0, 1, out=resultado)
+
+
+def pontuar(matriz):
+    """Pontuação 0-100 de cada linha da matriz (vetor float32)."""
+    return penalidades(matriz) @ PESOS * _ESCALA
+
+
+def faixa(pontuacao):
+    for limite, rotulo in FAIXAS:
+        if pontuacao < limite:
+            return rotulo
+
+
+def avaliar_prognostico(e):
+    """Pontuação, faixa e pontos de cada componente para um caso (aba 6)."""
+    pontos = penalidades(matriz_caracteristicas([e]))[0] * PESOS * _ESCALA
+    pontuacao = float(pontos.sum())
+    return {
+        "pontuacao": pontuacao,
+        "faixa": faixa(pontuacao),
+        "componentes": {rotulo: float(p) for (_, rotulo, _), p in zip(COMPONENTES, pontos)},
+    }
+
+
+def matriz_sintetica(n, semente=0):
+    """Coorte sintética: cada coluna uniforme no intervalo/opções do formulário."""
+    rng = np.random.default_rng(semente)
+    matriz = np.empty((n, len(CARACTERISTICAS)), dtype=np.float32)
+    for i, nome in enumerate(CARACTERISTICAS):
+        campo = CAMPOS[nome]
+        if campo.tipo == OPCAO:
+            matriz[:, i] = rng.integers(0, len(campo.opcoes), n)
+        elif isinstance(campo.minimo, int):
+            matriz[:, i] = rng.integers(campo.minimo, campo.maximo + 1, n)
+        else:
+            matriz[:, i] = rng.uniform(campo.minimo, campo.maximo, n)
+    return matriz
+
+
+def _relatorio(pontuacoes):
+    percentis = np.percentile(pontuacoes, [5, 25, 50, 75, 95])
+    print("percentis 5/25/50/75/95: " + " / ".join(f"{p:.1f}" for p in percentis))
+    inicio = 0.0
+    for limite, rotulo in FAIXAS:
+        fracao = np.mean((pontuacoes >= inicio) & (pontuacoes < limite))
+        print(f"{rotulo}: {fracao:.1%}")
+        inicio = limite
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibração e desempenho da pontuação de prognóstico RIF")
+    parser.add_argument("-n", type=int, default=1_000_000, help="casos sintéticos")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--arquivo", action="store_true",
+                        help="calibrar sobre o último caso de cada paciente do arquivo")
+    args = parser.parse_args()
+
+    if args.arquivo:
+        from rif_casos import ultimos_casos
+        casos = list(ultimos_casos().values())
+        inicio = time.perf_counter()
+        matriz = matriz_caracteristicas([c["entradas"] for c in casos])
+        montagem = time.perf_counter() - inicio
+        print(f"{len(casos)} pacientes no arquivo (matriz montada em {1000 * montagem:.1f} ms)")
+    else:
+        matriz = matriz_sintetica(args.n, args.semente)
+        print(f"{args.n} casos sintéticos")
+    if not len(matriz):
+        return
+
+    tempos = []
+    for _ in range(args.repeticoes):
+        inicio = time.perf_counter()
+        pontuacoes = pontuar(matriz)
+        tempos.append(time.perf_counter() - inicio)
+    melhor = min(tempos)
+    print(f"pontuação: {1000 * melhor:.1f} ms ({len(matriz) / melhor / 1e6:.1f} milhões de casos/s)")
+    _relatorio(pontuacoes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""Regras clínicas do protocolo RIF, independentes da interface.
+
+``avaliar_caso`` recebe o dicionário de entradas montado na aba 6 e devolve os
+``alertas_criticos`` e ``recomendacoes`` (na mesma ordem em que as abas os
+exibem) junto com os achados intermediários usados no protocolo. As abas 1-5
+continuam mostrando as explicações; a aba 6, o arquivo e os modos em lote usam
+este módulo como fonte única das listas.
+"""
+
+import gc
+
+from rif_achados import CATALOGO, Achado, achados_de, mascara
+from rif_diagrama import compilar
+
+VERSAO_REGRAS = "2025.10"
+
+GENOTIPO_ALTERADO = ["Heterozigoto", "Homozigoto"]
+BIOPSIA_POSITIVA = ["Positiva (5-10 células)", "Positiva (>10 células)"]
+HISTEROSCOPIA_SUGESTIVA = ["Micropolipos", "Hiperemia focal", "Edema estromal"]
+FAN_REAGENTE = ["1:160", "1:320", ">1:320"]
+NK_ENDOMETRIAL_ELEVADO = ["Moderadamente elevado (10-15%)", "Muito elevado (>15%)"]
+ANTI_TPO_POSITIVO = ["Positivo (35-100)", "Muito elevado (>100)"]
+FRAGMENTACAO_ELEVADA = ["25-30% (limítrofe)", ">30% (alto)"]
+ESPERMOGRAMA_SEM_ALTERACAO = ["Não realizado", "Normal (OMS 2021)"]
+
+# Condições que só leem selectbox, compiladas num diagrama de decisão
+# (``rif_diagrama``) compartilhado por todas as avaliações do processo:
+# nome -> (campos lidos, predicado sobre os valores)
+CONDICOES_CATEGORICAS = {
+    "aneuploidia": (("pgt_a_resultado",), lambda r: r in ["Todos aneuploides", "Maioria aneuploides"]),
+    "trombofilia": (("fator_v", "protrombina"),
+                    lambda fv, pt: fv in GENOTIPO_ALTERADO or pt in GENOTIPO_ALTERADO),
+    "endometrite": (("biopsia_endometrial",), lambda b: b in BIOPSIA_POSITIVA),
+    "histeroscopia_sugestiva": (("histeroscopia",), lambda h: h in HISTEROSCOPIA_SUGESTIVA),
+    "ureaplasma": (("ureaplasma",), lambda u: u == "Positivo"),
+    "mycoplasma": (("mycoplasma",), lambda m: m == "Positivo"),
+    "chlamydia": (("chlamydia",), lambda c: c == "Positivo"),
+    "microbioma": (("microbioma",), lambda m: m == "Lactobacillus <50%"),
+    "autoimunidade": (("fan", "anti_dna"), lambda f, d: f in FAN_REAGENTE or d == "Positivo"),
+    "nk_endometrial": (("nk_endometrial",), lambda n: n in NK_ENDOMETRIAL_ELEVADO),
+    "anti_tpo": (("anti_tpo",), lambda t: t in ANTI_TPO_POSITIVO),
+    "era_pre_receptivo": (("era_test",), lambda r: r == "Pré-receptivo"),
+    "era_pos_receptivo": (("era_test",), lambda r: r == "Pós-receptivo"),
+    "espermograma": (("espermograma",), lambda s: s not in ESPERMOGRAMA_SEM_ALTERACAO),
+    "fragmentacao_dna": (("fragmentacao_dna",), lambda f: f in FRAGMENTACAO_ELEVADA),
+}
+# Ordem das variáveis do diagrama (campos da mesma condição ficam juntos)
+CAMPOS_CATEGORICOS = [
+    "pgt_a_resultado", "fator_v", "protrombina",
+    "histeroscopia", "biopsia_endometrial", "ureaplasma", "mycoplasma", "chlamydia",
+    "microbioma", "fan", "anti_dna", "nk_endometrial",
+    "anti_tpo", "era_test", "espermograma", "fragmentacao_dna",
+]
+DIAGRAMA_CATEGORICO = compilar(CONDICOES_CATEGORICAS, CAMPOS_CATEGORICOS)
+_C = DIAGRAMA_CATEGORICO.bit
+INFECCOES = [("ureaplasma", "Ureaplasma"), ("mycoplasma", "Mycoplasma"), ("chlamydia", "Chlamydia")]
+
+# Regra -> (descrição exibida no painel "por quê?" e na telemetria, entradas que ela lê)
+REGRAS = {
+    "pgt_a_idade": ("Idade ≥37 anos sem PGT-A", ("idade", "pgt_a")),
+    "aneuploidia": ("PGT-A com todos ou a maioria aneuploides", ("pgt_a_resultado",)),
+    "trombofilia": ("Fator V Leiden ou protrombina alterados", ("fator_v", "protrombina")),
+    "hla_compartilhado": ("≥2 alelos HLA-DQ compartilhados", ("hla", "hla_compartilhado")),
+    "endometrite": ("Biópsia endometrial CD138 positiva", ("biopsia_endometrial",)),
+    "histeroscopia_sugestiva": ("Histeroscopia sugestiva de endometrite sem biópsia positiva",
+                                ("histeroscopia", "biopsia_endometrial")),
+    "infeccao": ("Ureaplasma, Mycoplasma ou Chlamydia positivos", ("ureaplasma", "mycoplasma", "chlamydia")),
+    "microbioma": ("Microbioma com Lactobacillus <50%", ("microbioma",)),
+    "saf": ("Critério laboratorial de SAF", ("anticardiolipina_igg", "anticardiolipina_igm",
+                                             "anticoagulante_lupico", "anti_b2gp1_igg", "anti_b2gp1_igm")),
+    "autoimunidade": ("FAN ≥1:160 ou anti-DNA positivo", ("fan", "anti_dna")),
+    "nk_elevado": ("NK periféricas >18% ou NK endometriais elevadas", ("nk_cells", "nk_endometrial")),
+    "tireoide": ("TSH >2.5 ou <0.5, ou anti-TPO positivo", ("tsh", "anti_tpo")),
+    **{f"achado_{achado.name.lower()}": (f"Achado anatômico: {achado.value}", ("alteracoes",))
+       for achado in Achado},
+    "endometrio_fino": ("Endométrio <7 mm", ("espessura_endometrial",)),
+    "endometrio_limitrofe": ("Endométrio entre 7 e 9 mm", ("espessura_endometrial",)),
+    "era_pre_receptivo": ("ERA pré-receptivo", ("era_test",)),
+    "era_pos_receptivo": ("ERA pós-receptivo", ("era_test",)),
+    "vitamina_d_baixa": ("Vitamina D <20 ng/mL", ("vitamina_d",)),
+    "vitamina_d_insuficiente": ("Vitamina D entre 20 e 30 ng/mL", ("vitamina_d",)),
+    "hiperprolactinemia": ("Prolactina >25 ng/mL", ("prolactina",)),
+    "progesterona_baixa": ("Progesterona lútea <10 ng/mL", ("progesterona",)),
+    "resistencia_insulinica": ("HOMA-IR >2.5", ("glicemia", "insulina")),
+    "homa_ir_limitrofe": ("HOMA-IR entre 1.9 e 2.5", ("glicemia", "insulina")),
+    "diabetes": ("Glicemia de jejum ≥126 mg/dL", ("glicemia",)),
+    "pcr_muito_elevada": ("PCR >10 mg/L", ("pcr",)),
+    "pcr_elevada": ("PCR entre 3 e 10 mg/L", ("pcr",)),
+    "homocisteina": ("Homocisteína >15 µmol/L", ("homocisteina",)),
+    "antioxidantes_idade": ("Idade ≥37 anos", ("idade",)),
+    "fragmentacao_dna": ("Fragmentação de DNA espermático ≥25%", ("fragmentacao_dna",)),
+    "espermograma": ("Espermograma alterado", ("espermograma",)),
+}
+
+
+def calcular_homa_ir(e):
+    """HOMA-IR, ou None quando glicemia ou insulina não foram informadas."""
+    if e["glicemia"] > 0 and e["insulina"] > 0:
+        return (e["glicemia"] * e["insulina"]) / 405
+    return None
+
+
+def criterios_saf(e):
+    criterios = []
+    if e["anticardiolipina_igg"] > 40:
+        criterios.append("Anticardiolipina IgG >40")
+    if e["anticardiolipina_igm"] > 40:
+        criterios.append("Anticardiolipina IgM >40")
+    if e["anticoagulante_lupico"] == "Positivo":
+        criterios.append("Anticoagulante lúpico positivo")
+    if e["anti_b2gp1_igg"] > 40:
+        criterios.append("Anti-β2GP1 IgG >40")
+    if e["anti_b2gp1_igm"] > 40:
+        criterios.append("Anti-β2GP1 IgM >40")
+    return criterios
+
+
+def avaliar_caso(e, categoricas=None):
+    """Avalia um caso completo; ``e`` é o dicionário de entradas da aba 6.
+
+    Além das listas, devolve em ``traco`` uma tupla (regra, alertas,
+    recomendações, detalhe) por regra disparada, na ordem de disparo; o custo é
+    um append por regra, e ``explicar`` monta a explicação a partir dele.
+    ``categoricas`` são os bits de ``DIAGRAMA_CATEGORICO`` já calculados (lote).
+    """
+    alertas_criticos = []
+    recomendacoes = []
+    traco = []
+    if categoricas is None:
+        # Todas as condições categóricas numa caminhada pelo diagrama
+        categoricas = DIAGRAMA_CATEGORICO.avaliar(e)
+
+    def disparar(regra, alertas=(), recs=(), detalhe=None):
+        alertas_criticos.extend(alertas)
+        recomendacoes.extend(recs)
+        traco.append((regra, alertas, recs, detalhe))
+
+    # ---------- Aba 1: genética ----------
+    if e["idade"] >= 37 and not e["pgt_a"]:
+        disparar("pgt_a_idade",
+                 recs=["PGT-A: Fortemente recomendado devido à idade materna ≥37 anos"])
+    if categoricas & _C["aneuploidia"]:
+        disparar("aneuploidia",
+                 alertas=["Alta taxa de aneuploidias - investigar causas e considerar uso de DHEA/CoQ10"])
+
+    trombofilia_presente = bool(categoricas & _C["trombofilia"])
+    if trombofilia_presente:
+        disparar("trombofilia",
+                 alertas=["TROMBOFILIA DETECTADA - Anticoagulação obrigatória"],
+                 recs=["Anticoagulação profilática: Enoxaparina 40mg/dia + AAS 100mg/dia"])
+
+    if e["hla"] and e["hla_compartilhado"] >= 2:
+        disparar("hla_compartilhado",
+                 recs=["Considerar imunoterapia (controverso - discutir com especialista)"])
+
+    # ---------- Aba 2: fatores infecciosos ----------
+    endometrite_detectada = bool(categoricas & _C["endometrite"])
+    if endometrite_detectada:
+        disparar("endometrite",
+                 alertas=["ENDOMETRITE CRÔNICA - Tratamento obrigatório antes de novo ciclo"],
+                 recs=["Antibioticoterapia completa + repetir biópsia antes de transferência"])
+    elif categoricas & _C["histeroscopia_sugestiva"]:
+        disparar("histeroscopia_sugestiva",
+                 recs=["Realizar biópsia endometrial com imuno-histoquímica CD138"])
+
+    tratamento_necessario = [nome for condicao, nome in INFECCOES if categoricas & _C[condicao]]
+    if tratamento_necessario:
+        disparar("infeccao",
+                 alertas=[f"Infecção detectada: {', '.join(tratamento_necessario)} - Tratar casal"],
+                 recs=["Tratamento antimicrobiano completo + teste de cura"])
+
+    if categoricas & _C["microbioma"]:
+        disparar("microbioma", recs=["Probióticos vaginais (Lactobacillus) por 30-60 dias"])
+
+    # ---------- Aba 3: imunológicos ----------
+    saf_criteria = criterios_saf(e)
+    if saf_criteria:
+        disparar("saf",
+                 alertas=["SÍNDROME ANTIFOSFOLÍPIDE - Anticoagulação + hidroxicloroquina"],
+                 recs=["Protocolo SAF: AAS + Enoxaparina + Hidroxicloroquina"],
+                 detalhe="; ".join(saf_criteria))
+
+    if categoricas & _C["autoimunidade"]:
+        disparar("autoimunidade",
+                 recs=["Avaliação reumatológica - possível doença autoimune sistêmica"])
+
+    nk_elevado = e["nk_cells"] > 18 or bool(categoricas & _C["nk_endometrial"])
+    if nk_elevado:
+        disparar("nk_elevado",
+                 recs=["NK elevadas: Discutir prednisona (controverso) - Considerar apenas após múltiplas falhas"])
+
+    problema_tireoide = e["tsh"] > 2.5 or e["tsh"] < 0.5 or bool(categoricas & _C["anti_tpo"])
+    if problema_tireoide:
+        disparar("tireoide",
+                 alertas=["Disfunção tireoidiana - Otimizar antes do ciclo (TSH <2.5)"],
+                 recs=["Otimização tireoidiana: TSH alvo <2.5 mUI/L antes da transferência"])
+
+    # ---------- Aba 4: anatômicos ----------
+    # Achados que compartilham o registro (hidrossalpinge uni/bilateral, adenomiose
+    # focal/difusa) geram a conduta uma vez só. As recomendações entram depois de
+    # todos os alertas dos achados, mas o traço já as atribui ao achado de origem.
+    cirurgia_necessaria = []
+    tratamento_clinico = []
+    for achado in achados_de(e["alteracoes"]):
+        registro = CATALOGO[achado]
+        novas = []
+        if registro.cirurgia and registro.cirurgia not in cirurgia_necessaria:
+            cirurgia_necessaria.append(registro.cirurgia)
+            novas.append(f"Cirurgia: {registro.cirurgia}")
+        if registro.tratamento_clinico and registro.tratamento_clinico not in tratamento_clinico:
+            tratamento_clinico.append(registro.tratamento_clinico)
+            novas.append(f"Tratamento: {registro.tratamento_clinico}")
+        alerta = []
+        if registro.alerta_critico and registro.alerta_critico not in alertas_criticos:
+            alerta = [registro.alerta_critico]
+            alertas_criticos.append(registro.alerta_critico)
+        if novas or alerta:
+            traco.append((f"achado_{achado.name.lower()}", alerta, novas, achado.value))
+    recomendacoes += [f"Cirurgia: {cirurgia}" for cirurgia in cirurgia_necessaria]
+    recomendacoes += [f"Tratamento: {tratamento}" for tratamento in tratamento_clinico]
+
+    if e["espessura_endometrial"] < 7:
+        disparar("endometrio_fino",
+                 alertas=["Endométrio fino - Protocolo de otimização necessário"],
+                 recs=["Endométrio fino: Aumentar estradiol + suplementos vasodilatadores"])
+    elif e["espessura_endometrial"] < 9:
+        disparar("endometrio_limitrofe", recs=["Endométrio limítrofe: Adicionar estradiol vaginal"])
+
+    if categoricas & _C["era_pre_receptivo"]:
+        disparar("era_pre_receptivo",
+                 alertas=["ERA: Janela pré-receptiva - Transferir 12-24h mais tarde"],
+                 recs=["ERA Test: Ajustar timing da transferência (+12-24h)"])
+    elif categoricas & _C["era_pos_receptivo"]:
+        disparar("era_pos_receptivo",
+                 alertas=["ERA: Janela pós-receptiva - Transferir 12-24h mais cedo"],
+                 recs=["ERA Test: Ajustar timing da transferência (-12-24h)"])
+
+    # ---------- Aba 5: laboratoriais ----------
+    vitamina_d = e["vitamina_d"]
+    if vitamina_d < 20:
+        disparar("vitamina_d_baixa",
+                 recs=[f"Vitamina D baixa ({vitamina_d}): Suplementar 4000-6000 UI/dia"])
+    elif vitamina_d < 30:
+        disparar("vitamina_d_insuficiente",
+                 recs=[f"Vitamina D insuficiente ({vitamina_d}): Suplementar 2000-4000 UI/dia"])
+
+    if e["prolactina"] > 25:
+        disparar("hiperprolactinemia",
+                 alertas=["Hiperprolactinemia - Investigar e tratar antes do ciclo"],
+                 recs=["Hiperprolactinemia: Cabergolina + investigação"])
+
+    if e["progesterona"] < 10:
+        disparar("progesterona_baixa",
+                 recs=["Suporte de progesterona: Considerar dose mais alta ou via adicional"])
+
+    homa_ir = calcular_homa_ir(e)
+    if homa_ir is not None:
+        if homa_ir > 2.5:
+            disparar("resistencia_insulinica",
+                     alertas=["Resistência insulínica - Metformina + modificação estilo de vida"],
+                     recs=["Resistência insulínica: Metformina 1500-2000mg/dia + inositol"],
+                     detalhe=f"HOMA-IR = {homa_ir:.2f}")
+        elif homa_ir > 1.9:
+            disparar("homa_ir_limitrofe",
+                     recs=["HOMA-IR limítrofe: Considerar metformina + inositol"],
+                     detalhe=f"HOMA-IR = {homa_ir:.2f}")
+
+    if e["glicemia"] >= 126:
+        disparar("diabetes", alertas=["DIABETES - Controle glicêmico obrigatório antes do ciclo"])
+
+    if e["pcr"] > 10:
+        disparar("pcr_muito_elevada",
+                 alertas=["PCR elevada - Investigar processo inflamatório antes do ciclo"])
+    elif e["pcr"] > 3:
+        disparar("pcr_elevada", recs=["PCR elevada: Investigar causas de inflamação"])
+
+    if e["homocisteina"] > 15:
+        disparar("homocisteina", recs=["Homocisteína elevada: Vitaminas B (folato, B12, B6)"])
+
+    if e["idade"] >= 37:
+        disparar("antioxidantes_idade",
+                 recs=["Idade ≥37 anos: Protocolo antioxidante completo (CoQ10, melatonina, DHEA)"])
+
+    if categoricas & _C["fragmentacao_dna"]:
+        disparar("fragmentacao_dna",
+                 alertas=["Fragmentação DNA espermático elevada - Antioxidantes 3 meses"],
+                 recs=["Fator masculino: Antioxidantes + técnicas de seleção espermática avançada"])
+
+    if categoricas & _C["espermograma"]:
+        disparar("espermograma", recs=["Espermograma alterado: Avaliação urológica completa"])
+
+    return {
+        "alertas_criticos": alertas_criticos,
+        "recomendacoes": recomendacoes,
+        "trombofilia_presente": trombofilia_presente,
+        "endometrite_detectada": endometrite_detectada,
+        "tratamento_necessario": tratamento_necessario,
+        "saf_criteria": saf_criteria,
+        "nk_elevado": nk_elevado,
+        "problema_tireoide": problema_tireoide,
+        "homa_ir": homa_ir,
+        "cirurgia_necessaria": cirurgia_necessaria,
+        "tratamento_clinico": tratamento_clinico,
+        "mascara_achados": mascara(e["alteracoes"]),
+        "traco": traco,
+    }
+
+
+def avaliar_lote(lista_entradas):
+    """Avalia vários casos numa única chamada (cenários, arquivo, testes).
+
+    As condições categóricas da coorte inteira saem de uma avaliação vetorial
+    do diagrama. O coletor de ciclos fica desligado durante o lote: os
+    resultados não têm ciclos, e com milhares deles (e seus traços) vivos cada
+    coleta automática varreria todos de novo.
+    """
+    lista_entradas = list(lista_entradas)
+    bits = DIAGRAMA_CATEGORICO.avaliar_coorte(DIAGRAMA_CATEGORICO.matriz_codigos(lista_entradas))
+    coletor_ativo = gc.isenabled()
+    gc.disable()
+    try:
+        return [avaliar_caso(e, categoricas) for e, categoricas in zip(lista_entradas, bits.tolist())]
+    finally:
+        if coletor_ativo:
+            gc.enable()
+
+
+def explicar(e, traco):
+    """Passos do traço com a descrição da regra e os valores de entrada que ela leu."""
+    passos = []
+    for regra, alertas, recs, detalhe in traco:
+        descricao, campos = REGRAS[regra]
+        passos.append({
+            "regra": regra,
+            "descricao": descricao,
+            "entradas": {campo: e[campo] for campo in campos},
+            "detalhe": detalhe,
+            "alertas_criticos": list(alertas),
+            "recomendacoes": list(recs),
+        })
+    return passos
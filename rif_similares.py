@@ -0,0 +1,149 @@
+"""Busca de pacientes com perfil semelhante no arquivo de casos.
+
+Cada caso vira um vetor numérico de tamanho fixo (``vetor_caso``), com as
+variáveis normalizadas para [0, 1] e ponderadas. ``IndiceSimilares`` guarda os
+vetores numa matriz NumPy contígua (uma linha por paciente) e responde top-k
+por distância euclidiana com ``argpartition``; dezenas de milhares de linhas
+são varridas em poucos milissegundos. O índice é construído em lote a partir
+do arquivo e atualizado linha a linha a cada caso salvo.
+"""
+
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from rif_achados import Achado, BIT, mascara
+from rif_casos import DIRETORIO_INDICES, gravar_json, gravar_npz
+from rif_regras import GENOTIPO_ALTERADO, criterios_saf
+
+CAMINHO_MATRIZ = DIRETORIO_INDICES / "similares.npz"
+CAMINHO_RESUMOS = DIRETORIO_INDICES / "similares_resumos.json"
+
+NK_ENDOMETRIAL = ["Não testado", "Normal (<5%)", "Levemente elevado (5-10%)",
+                  "Moderadamente elevado (10-15%)", "Muito elevado (>15%)"]
+
+# (nome, peso) das variáveis contínuas, na ordem do vetor
+VARIAVEIS = [
+    ("idade", 2.0),
+    ("num_falhas", 1.5),
+    ("imc", 1.0),
+    ("criterios_saf", 1.5),
+    ("trombofilia", 1.5),
+    ("nk_cells", 1.0),
+    ("nk_endometrial", 1.0),
+    ("espessura_endometrial", 1.0),
+]
+PESO_ACHADO = 0.75
+DIMENSAO = len(VARIAVEIS) + len(Achado)
+
+_PESOS = np.array([p for _, p in VARIAVEIS] + [PESO_ACHADO] * len(Achado), dtype=np.float32)
+
+
+def vetor_caso(e):
+    """Vetor de características (já ponderado) de um dicionário de entradas."""
+    trombofilia = e["fator_v"] in GENOTIPO_ALTERADO or e["protrombina"] in GENOTIPO_ALTERADO
+    continuas = [
+        (e["idade"] - 18) / 32,
+        (e["num_falhas"] - 3) / 17,
+        (e["imc"] - 15) / 35,
+        len(criterios_saf(e)) / 5,
+        float(trombofilia),
+        e["nk_cells"] / 50,
+        NK_ENDOMETRIAL.index(e["nk_endometrial"]) / (len(NK_ENDOMETRIAL) - 1),
+        e["espessura_endometrial"] / 20,
+    ]
+    bits = mascara(e["alteracoes"])
+    achados = [1.0 if bits & BIT[a] else 0.0 for a in Achado]
+    return np.asarray(continuas + achados, dtype=np.float32) * _PESOS
+
+
+def resumo_caso(caso):
+    """Dados exibidos ao lado de cada paciente semelhante."""
+    return {
+        "nome": caso["nome"] or "Não informado",
+        "idade": caso["idade"],
+        "num_falhas": caso["num_falhas"],
+        "imc": caso["imc"],
+        "data_avaliacao": caso["data_avaliacao"],
+        "alertas_criticos": len(caso["alertas_criticos"]),
+    }
+
+
+class IndiceSimilares:
+    def __init__(self, capacidade=1024):
+        self._lock = threading.Lock()
+        self.matriz = np.zeros((capacidade, DIMENSAO), dtype=np.float32)
+        self.ids = []
+        self.linha = {}
+        self.resumos = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def adicionar(self, id_paciente, vetor, resumo=None):
+        """Insere ou substitui a linha da paciente."""
+        with self._lock:
+            linha = self.linha.get(id_paciente)
+            if linha is None:
+                linha = len(self.ids)
+                if linha == len(self.matriz):
+                    self.matriz = np.concatenate([self.matriz, np.zeros_like(self.matriz)])
+                self.ids.append(id_paciente)
+                self.linha[id_paciente] = linha
+            self.matriz[linha] = vetor
+            if resumo is not None:
+                self.resumos[id_paciente] = resumo
+
+    def adicionar_caso(self, caso):
+        self.adicionar(caso["id_paciente"], vetor_caso(caso["entradas"]), resumo_caso(caso))
+
+    def buscar(self, vetor, k=5, excluir=None):
+        """Lista [(id_paciente, distância)] das ``k`` pacientes mais próximas."""
+        with self._lock:
+            n = len(self.ids)
+            if n == 0:
+                return []
+            distancias = np.sqrt(((self.matriz[:n] - vetor) ** 2).sum(axis=1))
+            if excluir is not None and excluir in self.linha:
+                distancias[self.linha[excluir]] = np.inf
+            k = min(k, n)
+            candidatos = np.argpartition(distancias, k - 1)[:k]
+            candidatos = candidatos[np.argsort(distancias[candidatos])]
+            return [(self.ids[i], float(distancias[i])) for i in candidatos
+                    if np.isfinite(distancias[i])]
+
+    def salvar(self, caminho_matriz=CAMINHO_MATRIZ, caminho_resumos=CAMINHO_RESUMOS):
+        with self._lock:
+            gravar_npz(caminho_matriz, {"ids": np.array(self.ids, dtype=str),
+                                        "matriz": self.matriz[:len(self.ids)]})
+            gravar_json(caminho_resumos, self.resumos)
+
+    @classmethod
+    def carregar(cls, caminho_matriz=CAMINHO_MATRIZ, caminho_resumos=CAMINHO_RESUMOS):
+        if not Path(caminho_matriz).exists():
+            return cls()
+        with np.load(caminho_matriz) as dados:
+            ids = [str(i) for i in dados["ids"]]
+            matriz = dados["matriz"]
+        indice = cls(capacidade=max(1024, 2 * len(ids)))
+        indice.matriz[:len(ids)] = matriz
+        indice.ids = ids
+        indice.linha = {pid: i for i, pid in enumerate(ids)}
+        if Path(caminho_resumos).exists():
+            with open(caminho_resumos, encoding="utf-8") as f:
+                indice.resumos = json.load(f)
+        return indice
+
+    @classmethod
+    def construir(cls, casos):
+        """Construção em lote a partir de {id_paciente: dados_caso}."""
+        casos = list(casos.values())
+        indice = cls(capacidade=max(1024, 2 * len(casos)))
+        if casos:
+            indice.matriz[:len(casos)] = np.stack([vetor_caso(c["entradas"]) for c in casos])
+        indice.ids = [c["id_paciente"] for c in casos]
+        indice.linha = {pid: i for i, pid in enumerate(indice.ids)}
+        indice.resumos = {c["id_paciente"]: resumo_caso(c) for c in casos}
+        return indice
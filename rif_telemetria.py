@@ -0,0 +1,104 @@
+"""Telemetria de disparo das regras do protocolo.
+
+``registrar`` recebe o resultado de ``avaliar_caso`` e só soma contadores em
+memória (um por regra do traço); uma fração ``TAXA_AMOSTRAGEM`` das avaliações
+também guarda o traço explicado (regra, entradas lidas, itens produzidos). Uma
+thread de fundo grava a cada ``INTERVALO_GRAVACAO`` segundos:
+
+- ``<RIF_DADOS_DIR>/telemetria/contagens.json``: totais acumulados por regra;
+- ``<RIF_DADOS_DIR>/telemetria/amostras.jsonl``: traços amostrados.
+
+O nome da paciente não entra nas amostras.
+"""
+
+import atexit
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from rif_casos import DIRETORIO_DADOS, bloqueio, gravar_json
+from rif_regras import VERSAO_REGRAS, explicar
+
+DIRETORIO_TELEMETRIA = DIRETORIO_DADOS / "telemetria"
+INTERVALO_GRAVACAO = 60.0
+TAXA_AMOSTRAGEM = 0.05
+MAXIMO_AMOSTRAS = 1000  # amostras pendentes em memória entre duas gravações
+
+
+def ler_totais(diretorio=DIRETORIO_TELEMETRIA):
+    """Totais gravados: {"avaliacoes": n, "regras": {regra: n}}."""
+    caminho = diretorio / "contagens.json"
+    if not caminho.exists():
+        return {"avaliacoes": 0, "regras": {}}
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class TelemetriaRegras:
+    def __init__(self, diretorio=DIRETORIO_TELEMETRIA, intervalo=INTERVALO_GRAVACAO,
+                 taxa_amostragem=TAXA_AMOSTRAGEM):
+        self.diretorio = diretorio
+        self.taxa_amostragem = taxa_amostragem
+        self._lock = threading.Lock()
+        self._avaliacoes = 0
+        self._contagens = Counter()
+        self._amostras = deque(maxlen=MAXIMO_AMOSTRAS)
+
+        self._intervalo = intervalo
+        self._thread = threading.Thread(target=self._gravar_periodicamente, daemon=True)
+        self._thread.start()
+        atexit.register(self.gravar)
+
+    def registrar(self, entradas, resultado):
+        traco = resultado["traco"]
+        with self._lock:
+            self._avaliacoes += 1
+            self._contagens.update(regra for regra, _, _, _ in traco)
+        if random.random() < self.taxa_amostragem:
+            amostra = {
+                "data": datetime.now().isoformat(timespec="seconds"),
+                "versao_regras": VERSAO_REGRAS,
+                "passos": explicar(entradas, traco),
+            }
+            with self._lock:
+                self._amostras.append(amostra)
+
+    def _gravar_periodicamente(self):
+        while True:
+            time.sleep(self._intervalo)
+            self.gravar()
+
+    def gravar(self):
+        """Soma os contadores pendentes aos totais em disco e anexa as amostras."""
+        with self._lock:
+            avaliacoes, self._avaliacoes = self._avaliacoes, 0
+            contagens, self._contagens = self._contagens, Counter()
+            amostras = list(self._amostras)
+            self._amostras.clear()
+        if not avaliacoes:
+            return
+
+        # Vários processos podem gravar nos mesmos totais
+        with bloqueio("telemetria"):
+            totais = ler_totais(self.diretorio)
+            regras = Counter(totais["regras"])
+            regras.update(contagens)
+            gravar_json(self.diretorio / "contagens.json", {
+                "avaliacoes": totais["avaliacoes"] + avaliacoes,
+                "regras": dict(regras),
+                "atualizado_em": datetime.now().isoformat(timespec="seconds"),
+            })
+            if amostras:
+                with open(self.diretorio / "amostras.jsonl", "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(a, ensure_ascii=False) + "\n" for a in amostras)
+
+    def totais(self):
+        """Totais em disco somados aos contadores ainda não gravados."""
+        totais = ler_totais(self.diretorio)
+        with self._lock:
+            regras = Counter(totais["regras"])
+            regras.update(self._contagens)
+            return {"avaliacoes": totais["avaliacoes"] + self._avaliacoes, "regras": dict(regras)}
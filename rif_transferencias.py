@@ -0,0 +1,106 @@
+"""Histórico de transferências embrionárias por paciente, em colunas.
+
+Cada paciente tem um arquivo ``<RIF_DADOS_DIR>/transferencias/<id>.npz`` com
+uma matriz NumPy por coluna (data, dia do embrião, nº de embriões, grau, PGT,
+espessura endometrial, protocolo, desfecho). Os resumos (embriões
+transferidos, falhas euploides, critério RIF, indicações de PGT-A/ERA) são
+calculados com operações vetoriais sobre essas colunas.
+"""
+
+import numpy as np
+import pandas as pd
+
+from rif_casos import DIRETORIO_DADOS, gravar_npz
+
+DIRETORIO_TRANSFERENCIAS = DIRETORIO_DADOS / "transferencias"
+
+DIAS_EMBRIAO = ["D3", "D5", "D6"]
+GRAUS = ["AA", "AB", "BA", "BB", "BC", "CB", "CC", "D3 grau 1", "D3 grau 2", "D3 grau 3"]
+GRAUS_BOA_QUALIDADE = ["AA", "AB", "BA", "BB", "D3 grau 1"]
+PGT = ["Não testado", "Euploide", "Mosaico", "Aneuploide"]
+PROTOCOLOS = ["Ciclo natural", "TRH (estradiol + progesterona)", "Ciclo estimulado", "Fresco"]
+DESFECHOS = ["Negativo", "Gestação bioquímica", "Abortamento", "Gestação em curso", "Nascido vivo"]
+DESFECHOS_FALHA = ["Negativo", "Gestação bioquímica"]
+
+# coluna -> (rótulo, dtype NumPy)
+COLUNAS = {
+    "data": ("Data", "datetime64[D]"),
+    "dia_embriao": ("Dia do embrião", "U2"),
+    "num_embrioes": ("Nº de embriões", "int16"),
+    "grau": ("Grau", "U10"),
+    "pgt": ("PGT", "U12"),
+    "espessura_endometrial": ("Endométrio (mm)", "float32"),
+    "protocolo": ("Protocolo", "U32"),
+    "desfecho": ("Desfecho", "U20"),
+}
+
+
+def vazio():
+    return {coluna: np.array([], dtype=dtype) for coluna, (_, dtype) in COLUNAS.items()}
+
+
+def carregar(id_paciente):
+    caminho = DIRETORIO_TRANSFERENCIAS / f"{id_paciente}.npz"
+    if not caminho.exists():
+        return vazio()
+    with np.load(caminho) as dados:
+        return {coluna: dados[coluna] for coluna in COLUNAS}
+
+
+def salvar(id_paciente, colunas):
+    gravar_npz(DIRETORIO_TRANSFERENCIAS / f"{id_paciente}.npz", colunas)
+
+
+def para_dataframe(colunas):
+    """Colunas -> DataFrame com os rótulos exibidos no editor."""
+    df = pd.DataFrame({rotulo: colunas[coluna] for coluna, (rotulo, _) in COLUNAS.items()})
+    df["Data"] = pd.to_datetime(df["Data"]).dt.date
+    return df
+
+
+def de_dataframe(df):
+    """DataFrame do editor -> colunas tipadas.
+
+    Linhas sem data ou sem nº de embriões são descartadas (zero embriões
+    mudaria o critério de ≥10 embriões); endométrio em branco fica NaN.
+    """
+    df = df.dropna(subset=["Data", COLUNAS["num_embrioes"][0]])
+    colunas = {}
+    for coluna, (rotulo, dtype) in COLUNAS.items():
+        serie = df[rotulo]
+        if dtype.startswith("datetime"):
+            colunas[coluna] = pd.to_datetime(serie).to_numpy().astype(dtype)
+        elif dtype.startswith(("int", "float")):
+            colunas[coluna] = pd.to_numeric(serie).to_numpy(dtype=np.float64).astype(dtype)
+        else:
+            colunas[coluna] = serie.fillna("").astype(str).to_numpy().astype(dtype)
+    ordem = np.argsort(colunas["data"], kind="stable")
+    return {coluna: valores[ordem] for coluna, valores in colunas.items()}
+
+
+def resumo(colunas):
+    """Indicadores do histórico calculados sobre as colunas."""
+    falha = np.isin(colunas["desfecho"], DESFECHOS_FALHA)
+    boa_qualidade = np.isin(colunas["grau"], GRAUS_BOA_QUALIDADE)
+    euploide = colunas["pgt"] == "Euploide"
+    nao_testado = colunas["pgt"] == "Não testado"
+    embrioes = colunas["num_embrioes"].astype(np.int64)
+
+    falhas = int(falha.sum())
+    falhas_boa_qualidade = int((falha & boa_qualidade).sum())
+    embrioes_em_falhas = int(embrioes[falha].sum())
+    falhas_euploides = int((falha & euploide).sum())
+    falhas_nao_testados = int((falha & nao_testado).sum())
+    return {
+        "transferencias": int(len(falha)),
+        "embrioes_transferidos": int(embrioes.sum()),
+        "falhas": falhas,
+        "falhas_boa_qualidade": falhas_boa_qualidade,
+        "embrioes_em_falhas": embrioes_em_falhas,
+        "falhas_euploides": falhas_euploides,
+        "falhas_nao_testados": falhas_nao_testados,
+        # Definição RIF: ≥3 transferências de boa qualidade ou ≥10 embriões transferidos
+        "criterio_rif": falhas_boa_qualidade >= 3 or embrioes_em_falhas >= 10,
+        "indicacao_pgt_a": falhas_nao_testados >= 2,
+        "indicacao_era": falhas_euploides >= 3,
+    }
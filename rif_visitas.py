@@ -0,0 +1,195 @@
+"""Histórico longitudinal de visitas por paciente, em snapshots delta.
+
+Cada caso salvo é uma visita. A cadeia da paciente fica em
+``<RIF_DADOS_DIR>/visitas/<id_paciente>.jsonl``, uma linha por visita, só
+anexada:
+
+- ``delta``: entradas que mudaram em relação à visita anterior;
+- ``alertas_criticos``/``recomendacoes``: presentes só quando mudaram;
+- na primeira visita e a cada ``INTERVALO_CHECKPOINT`` visitas, a linha traz
+  também ``completo`` (todas as entradas e as duas listas).
+
+Reconstruir uma visita parte do último checkpoint anterior a ela e aplica no
+máximo ``INTERVALO_CHECKPOINT - 1`` deltas, qualquer que seja o tamanho da
+cadeia. Comparar duas visitas só olha os campos citados nos deltas entre elas.
+
+Uso:
+    python rif_visitas.py reconstruir            # refaz as cadeias a partir de casos/
+    python rif_visitas.py resumo <id_paciente>
+"""
+
+import argparse
+import json
+import os
+from bisect import bisect_right
+
+from rif_casos import DIRETORIO_DADOS, bloqueio, iterar_casos
+
+DIRETORIO_VISITAS = DIRETORIO_DADOS / "visitas"
+INTERVALO_CHECKPOINT = 10
+LISTAS = ("alertas_criticos", "recomendacoes")
+
+
+def caminho_visitas(id_paciente, diretorio=DIRETORIO_VISITAS):
+    return diretorio / f"{id_paciente}.jsonl"
+
+
+def diferencas_visitas(anterior, atual, campos=None):
+    """Entradas alteradas {campo: (antes, depois)} e itens novos/resolvidos das listas.
+
+    ``anterior``/``atual`` têm ``entradas``, ``alertas_criticos`` e
+    ``recomendacoes``; ``campos`` restringe os campos comparados.
+    """
+    antes, depois = anterior["entradas"], atual["entradas"]
+    if campos is None:
+        campos = list(dict.fromkeys([*antes, *depois]))
+    diferencas = {"entradas": {campo: (antes.get(campo), depois.get(campo)) for campo in campos
+                               if antes.get(campo) != depois.get(campo)}}
+    for lista in LISTAS:
+        vistos_antes, vistos_depois = set(anterior[lista]), set(atual[lista])
+        diferencas[f"{lista}_novos"] = [item for item in atual[lista] if item not in vistos_antes]
+        diferencas[f"{lista}_resolvidos"] = [item for item in anterior[lista] if item not in vistos_depois]
+    return diferencas
+
+
+class HistoricoVisitas:
+    def __init__(self, id_paciente, linhas=(), tamanho_valido=0):
+        self.id_paciente = id_paciente
+        self.linhas = list(linhas)
+        self.tamanho_valido = tamanho_valido  # bytes do arquivo até a última linha íntegra
+        self._checkpoints = [i for i, linha in enumerate(self.linhas) if "completo" in linha]
+
+    @classmethod
+    def carregar(cls, id_paciente, diretorio=DIRETORIO_VISITAS):
+        """Lê a cadeia; uma última linha incompleta (queda no meio da escrita) é ignorada."""
+        try:
+            with open(caminho_visitas(id_paciente, diretorio), "rb") as f:
+                conteudo = f.read()
+        except FileNotFoundError:
+            return cls(id_paciente)
+        linhas, posicao = [], 0
+        while True:
+            fim = conteudo.find(b"\n", posicao)
+            if fim < 0:
+                break
+            try:
+                linhas.append(json.loads(conteudo[posicao:fim]))
+            except json.JSONDecodeError:
+                break
+            posicao = fim + 1
+        return cls(id_paciente, linhas, posicao)
+
+    def __len__(self):
+        return len(self.linhas)
+
+    def datas(self):
+        return [linha["data"] for linha in self.linhas]
+
+    def visita(self, i):
+        """Visita ``i`` (aceita índices negativos): data, entradas e as duas listas."""
+        i = range(len(self))[i]
+        base = self._checkpoints[bisect_right(self._checkpoints, i) - 1]
+        completo = self.linhas[base]["completo"]
+        entradas = dict(completo["entradas"])
+        listas = {lista: completo[lista] for lista in LISTAS}
+        for linha in self.linhas[base + 1:i + 1]:
+            entradas.update(linha["delta"])
+            for lista in LISTAS:
+                if lista in linha:
+                    listas[lista] = linha[lista]
+        return {"data_avaliacao": self.linhas[i]["data"], "entradas": entradas,
+                **{lista: list(itens) for lista, itens in listas.items()}}
+
+    def comparar(self, i, j):
+        """Diferenças da visita ``i`` para a visita ``j`` (ver ``diferencas_visitas``)."""
+        i, j = range(len(self))[i], range(len(self))[j]
+        inicio, fim = sorted((i, j))
+        # Um campo que mudou entre as duas visitas aparece em algum delta entre elas
+        campos = {}
+        for linha in self.linhas[inicio + 1:fim + 1]:
+            campos.update(dict.fromkeys(linha["delta"]))
+        return diferencas_visitas(self.visita(i), self.visita(j), list(campos))
+
+    def proxima_linha(self, dados_caso):
+        """Linha da cadeia para um novo caso salvo, em relação à última visita."""
+        linha = {"data": dados_caso["data_avaliacao"]}
+        if not self.linhas:
+            linha["delta"] = {}
+        else:
+            anterior = self.visita(-1)
+            linha["delta"] = {campo: valor for campo, valor in dados_caso["entradas"].items()
+                              if campo not in anterior["entradas"] or anterior["entradas"][campo] != valor}
+            for lista in LISTAS:
+                if dados_caso[lista] != anterior[lista]:
+                    linha[lista] = dados_caso[lista]
+        if len(self.linhas) % INTERVALO_CHECKPOINT == 0:
+            linha["completo"] = {"entradas": dados_caso["entradas"],
+                                 **{lista: dados_caso[lista] for lista in LISTAS}}
+        return linha
+
+    def acrescentar(self, linha):
+        if "completo" in linha:
+            self._checkpoints.append(len(self.linhas))
+        self.linhas.append(linha)
+
+
+def registrar_visita(dados_caso, diretorio=DIRETORIO_VISITAS):
+    """Anexa o caso salvo à cadeia da paciente e devolve a linha gravada."""
+    caminho = caminho_visitas(dados_caso["id_paciente"], diretorio)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    # Relê sob a trava: outro processo pode ter anexado uma visita
+    with bloqueio("visitas"):
+        historico = HistoricoVisitas.carregar(dados_caso["id_paciente"], diretorio)
+        # Um ``reconstruir`` entre salvar o caso e chegar aqui já incluiu a visita
+        if historico.linhas and historico.linhas[-1]["data"] == dados_caso["data_avaliacao"]:
+            return historico.linhas[-1]
+        linha = historico.proxima_linha(dados_caso)
+        with open(caminho, "ab") as f:
+            f.truncate(historico.tamanho_valido)
+            f.write((json.dumps(linha, ensure_ascii=False) + "\n").encode("utf-8"))
+    return linha
+
+
+def reconstruir(diretorio=DIRETORIO_VISITAS):
+    """Refaz todas as cadeias a partir do arquivo de casos; devolve o nº de pacientes."""
+    diretorio.mkdir(parents=True, exist_ok=True)
+    # A trava vem antes da leitura dos casos: uma visita anexada por
+    # ``registrar_visita`` entre a leitura e o ``os.replace`` seria perdida
+    with bloqueio("visitas"):
+        historicos = {}
+        for caso in iterar_casos():
+            pid = caso["id_paciente"]
+            if pid not in historicos:
+                historicos[pid] = HistoricoVisitas(pid)
+            historicos[pid].acrescentar(historicos[pid].proxima_linha(caso))
+        for pid, historico in historicos.items():
+            caminho = caminho_visitas(pid, diretorio)
+            temporario = caminho.with_name(f"{caminho.name}.{os.getpid()}.tmp")
+            with open(temporario, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(linha, ensure_ascii=False) + "\n" for linha in historico.linhas)
+            os.replace(temporario, caminho)
+    return len(historicos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Histórico de visitas por paciente (snapshots delta)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("reconstruir", help="refazer as cadeias a partir dos casos salvos")
+    p_resumo = sub.add_parser("resumo", help="visitas de uma paciente e o que mudou em cada uma")
+    p_resumo.add_argument("id_paciente")
+    args = parser.parse_args()
+
+    if args.comando == "reconstruir":
+        print(f"{reconstruir()} pacientes")
+        return
+    historico = HistoricoVisitas.carregar(args.id_paciente)
+    for i, linha in enumerate(historico.linhas):
+        marca = " (checkpoint)" if "completo" in linha else ""
+        print(f"{i:3d}  {linha['data']}  {len(linha['delta'])} campos alterados{marca}")
+    completos = sum(len(json.dumps(historico.visita(i), ensure_ascii=False).encode("utf-8"))
+                    for i in range(len(historico)))
+    print(f"cadeia: {historico.tamanho_valido} bytes; snapshots completos: {completos} bytes")
+
+
+if __name__ == "__main__":
+    main()